@@ -0,0 +1,298 @@
+"""
+Adaptive Concurrency
+AIMD concurrency limit for calls to an external API: the number of calls
+allowed in flight grows slowly while responses are fast and healthy and is
+cut sharply on rate limiting (429), server errors or slow responses.
+Rejected calls are retried with jittered exponential backoff, and a circuit
+breaker fails calls fast while the API is down.
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from config import (
+    CONCURRENCY_BACKOFF_FACTOR,
+    CONCURRENCY_ACQUIRE_TIMEOUT,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+)
+
+# Outcomes of a call, as seen by the controller
+OK = "ok"
+THROTTLED = "throttled"   # 429: the API is up but wants fewer requests
+FAILED = "failed"         # 5xx, timeout, connection error: counts towards the circuit breaker
+
+# Outcome and optional server-requested delay (Retry-After) of a finished call
+Classification = Tuple[str, Optional[float]]
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+def classify_http(response, error: Optional[BaseException]) -> Classification:
+    """Outcome of an HTTP call made with requests"""
+    if error is not None:
+        return FAILED, None
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After")
+        try:
+            return THROTTLED, float(retry_after) if retry_after else None
+        except ValueError:
+            return THROTTLED, None
+    if response.status_code >= 500:
+        return FAILED, None
+    return OK, None
+
+
+def classify_error(error: BaseException) -> Classification:
+    """Outcome of an SDK call from the exception it raised (e.g. google.api_core errors)"""
+    code = getattr(error, "code", None)
+    code = code if isinstance(code, int) else None
+    text = str(error).lower()
+    if code == 429 or text.startswith("429") or "quota" in text or "rate limit" in text \
+            or "resource has been exhausted" in text:
+        return THROTTLED, None
+    server_error = code >= 500 if code is not None else (text[:1] == "5" and text[:3].isdigit())
+    if server_error or "timeout" in text or "timed out" in text or "unavailable" in text:
+        return FAILED, None
+    # Client errors (bad request, safety blocks...) say nothing about API health
+    return OK, None
+
+
+class AdaptiveConcurrency:
+    def __init__(self,
+                 name: str,
+                 initial_limit: int,
+                 min_limit: int,
+                 max_limit: int,
+                 latency_target: float,
+                 backoff_factor: float = CONCURRENCY_BACKOFF_FACTOR,
+                 acquire_timeout: float = CONCURRENCY_ACQUIRE_TIMEOUT,
+                 max_retries: int = RETRY_MAX_ATTEMPTS,
+                 retry_base_delay: float = RETRY_BASE_DELAY,
+                 retry_max_delay: float = RETRY_MAX_DELAY,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS):
+        """
+        Initialize controller
+
+        Args:
+            name: API name shown in messages and the usage panel
+            initial_limit: Calls allowed in flight at start
+            min_limit: Lowest limit after backing off
+            max_limit: Highest limit reached by growing
+            latency_target: Seconds above which a successful call counts as congestion
+            backoff_factor: Multiplier applied to the limit on congestion
+            acquire_timeout: Default seconds a call may wait for a free slot
+            max_retries: Retries of a throttled (or retryable failed) call
+            retry_base_delay: Backoff before the first retry (seconds, doubled per retry)
+            retry_max_delay: Upper bound of one backoff (seconds)
+            failure_threshold: Consecutive failures that open the circuit
+            open_seconds: Seconds the circuit stays open before a probe call is let through
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_factor = backoff_factor
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+
+        self._changed = threading.Condition()
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+
+        # Circuit breaker
+        self._state = "closed"          # closed, open, half_open
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self._counts = {"ok": 0, "throttled": 0, "failed": 0, "retries": 0, "rejected": 0}
+
+    @property
+    def limit(self) -> int:
+        """Calls currently allowed in flight"""
+        return max(self.min_limit, int(self._limit))
+
+    # ---------- Slots ----------
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a free slot
+
+        Args:
+            timeout: Seconds to wait (default: acquire_timeout)
+
+        Returns:
+            True if this call is the circuit breaker's probe
+
+        Raises:
+            CircuitOpenError if the circuit is open
+            Exception if no slot frees up in time
+        """
+        deadline = time.time() + (self.acquire_timeout if timeout is None else timeout)
+        with self._changed:
+            while True:
+                probe = self._check_circuit()
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    if probe:
+                        self._probing = True
+                    return probe
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._counts["rejected"] += 1
+                    raise Exception(f"⏳ {self.name} đang quá tải ({self._in_flight} request đang chạy). "
+                                    f"Vui lòng thử lại sau.")
+                self._changed.wait(remaining)
+
+    def _check_circuit(self) -> bool:
+        """Raise while open; True if the caller becomes the half-open probe (caller holds the lock)"""
+        if self._state == "closed":
+            return False
+        if self._state == "open" and time.time() - self._opened_at >= self.open_seconds:
+            self._state = "half_open"
+        if self._state == "half_open" and not self._probing:
+            return True
+        self._counts["rejected"] += 1
+        wait = max(1, int(self.open_seconds - (time.time() - self._opened_at)) + 1)
+        raise CircuitOpenError(f"🔌 {self.name} đang gián đoạn, tạm ngừng gửi request. "
+                               f"Vui lòng thử lại sau khoảng {wait} giây.")
+
+    def release(self, outcome: str, latency: Optional[float] = None, probe: bool = False):
+        """
+        Return a slot and adapt the limit to how the call went
+
+        Args:
+            outcome: OK, THROTTLED or FAILED
+            latency: Seconds the call took (or until its first chunk); None if unknown
+            probe: The value acquire returned for this call
+        """
+        now = time.time()
+        with self._changed:
+            self._in_flight -= 1
+            self._counts[outcome] += 1
+            if probe:
+                self._probing = False
+
+            if outcome == FAILED:
+                self._consecutive_failures += 1
+                if probe or self._consecutive_failures >= self.failure_threshold:
+                    self._state = "open"
+                    self._opened_at = now
+            else:
+                self._consecutive_failures = 0
+                if self._state != "closed":
+                    # Any answer (even a 429) shows the API is reachable again
+                    self._state = "closed"
+
+            congested = outcome != OK or (latency is not None and latency > self.latency_target)
+            if congested:
+                # Calls of the same burst fail together: back off once per latency window
+                if now - self._last_decrease >= self.latency_target:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff_factor)
+                    self._last_decrease = now
+            elif self._in_flight + 1 >= self.limit:
+                # Additive increase: about +1 per limit's worth of healthy calls at full use
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+            self._changed.notify_all()
+
+    def cancel(self, probe: bool = False):
+        """
+        Return a slot without a call outcome (the call never reached the API, or was
+        interrupted), leaving the limit and the circuit as they were
+
+        Args:
+            probe: The value acquire returned for this call
+        """
+        with self._changed:
+            self._in_flight -= 1
+            if probe:
+                self._probing = False
+            self._changed.notify_all()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number attempt (0-based), with full jitter
+
+        A Retry-After from the server is honoured as the minimum.
+        """
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.retry_max_delay))
+        return delay
+
+    def wait_before_retry(self, attempt: int, retry_after: Optional[float] = None):
+        """Count a retry and sleep for its backoff"""
+        with self._changed:
+            self._counts["retries"] += 1
+        time.sleep(self.backoff(attempt, retry_after))
+
+    # ---------- Calls ----------
+
+    def call(self,
+             function: Callable[[], Any],
+             classify: Callable[[Any, Optional[BaseException]], Classification] = classify_http,
+             retry_failures: bool = False,
+             timeout: Optional[float] = None) -> Any:
+        """
+        Run a call within the limit, retrying when the API pushes back
+
+        Args:
+            function: The API call
+            classify: Maps (result, exception) to an outcome
+            retry_failures: Also retry FAILED calls (only for idempotent calls not retried elsewhere)
+            timeout: Seconds to wait for a free slot (default: acquire_timeout)
+
+        Returns:
+            The result of the last attempt (e.g. a 429 response once retries are exhausted)
+
+        Raises:
+            CircuitOpenError, a slot timeout, or the exception of the last attempt
+        """
+        attempt = 0
+        while True:
+            probe = self.acquire(timeout)
+            start = time.perf_counter()
+            result, error = None, None
+            released = False
+            try:
+                try:
+                    result = function()
+                except Exception as e:
+                    error = e
+                outcome, retry_after = classify(result, error)
+                self.release(outcome, time.perf_counter() - start, probe)
+                released = True
+            finally:
+                if not released:
+                    # Interrupted (KeyboardInterrupt, GeneratorExit...): the slot must not leak
+                    self.cancel(probe)
+
+            retryable = outcome == THROTTLED or (outcome == FAILED and retry_failures)
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return result
+
+            self.wait_before_retry(attempt, retry_after)
+            attempt += 1
+
+    def snapshot(self) -> Dict:
+        """Current limit, calls in flight, circuit state and outcome counters"""
+        with self._changed:
+            state = self._state
+            if state == "open" and time.time() - self._opened_at >= self.open_seconds:
+                state = "half_open"
+            return dict(self._counts, name=self.name, limit=self.limit, in_flight=self._in_flight,
+                        max_limit=self.max_limit, state=state)
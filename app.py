@@ -4,13 +4,17 @@ Educational Video Creator with AI and Avatar
 """
 import streamlit as st
 import os
+import re
+import shutil
 import time
+import uuid
 from datetime import datetime
+from config import VIDEO_POLL_INTERVAL, WEBHOOK_ENABLED, METRICS_HOST, METRICS_PORT, AVATAR_PAGE_SIZE, VOICE_OPTIONS_LIMIT, RENDER_PRIORITIES, PIPELINE_OUTPUT_FOLDER
+from metrics import registry, new_trace_id
 
-# Import services
-from gemini_service import GeminiService
-from heygen_service import HeyGenService
-from file_service import FileService
+rerun_started = time.perf_counter()
+
+PRIORITY_LABELS = {"urgent": "⚡ Khẩn cấp", "normal": "Bình thường", "bulk": "📦 Hàng loạt"}
 
 # Page configuration
 st.set_page_config(
@@ -31,22 +35,79 @@ if 'selected_avatar' not in st.session_state:
     st.session_state.selected_avatar = None
 if 'script_filename' not in st.session_state:
     st.session_state.script_filename = None
+if 'avatar_cursors' not in st.session_state:
+    st.session_state.avatar_cursors = [None]
+    st.session_state.avatar_search = None
+if 'trace_id' not in st.session_state:
+    st.session_state.trace_id = new_trace_id()
+if 'render_ticket' not in st.session_state:
+    st.session_state.render_ticket = None
+    # Sessions take turns in the render queue
+    st.session_state.user_id = uuid.uuid4().hex
+if 'scene_job' not in st.session_state:
+    st.session_state.scene_job = None
+    st.session_state.scene_video_path = None
+
+# Every span recorded during this run joins the session's current video journey
+registry.set_trace(st.session_state.trace_id)
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Prometheus /metrics endpoint, started once per process"""
+    return registry.start_server(METRICS_HOST, METRICS_PORT)
+
+if METRICS_PORT:
+    start_metrics_endpoint()
+
+# Services are built on first use and shared by all sessions; the service
+# modules (and the SDKs they load) are only imported at that point
+@st.cache_resource
+def get_gemini_service():
+    """Gemini service (first call imports the Gemini SDK lazily)"""
+    from gemini_service import GeminiService
+    return GeminiService()
+
+@st.cache_resource
+def get_heygen_service():
+    """HeyGen service, with the webhook receiver started if enabled"""
+    from heygen_service import HeyGenService
+    heygen = HeyGenService()
+    if WEBHOOK_ENABLED:
+        heygen.start_webhook_receiver()
+    return heygen
+
+@st.cache_resource
+def get_file_service():
+    """File service"""
+    from file_service import FileService
+    return FileService()
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """Avatar thumbnails, downloaded through the HeyGen service's connection pool"""
+    from thumbnail_cache import ThumbnailCache
+    return ThumbnailCache(get_heygen_service().transport)
+
+@st.cache_resource
+def get_render_scheduler():
+    """Render queue shared by all sessions, feeding the HeyGen service"""
+    from render_scheduler import RenderScheduler
+    return RenderScheduler(get_heygen_service())
 
-# Initialize services
 @st.cache_resource
-def init_services():
-    """Initialize all services"""
+def get_scene_cache():
+    """Rendered scene clips, plus earlier renders found in the HeyGen job store"""
+    from scene_cache import SceneCache
+    return SceneCache(get_heygen_service().job_store)
+
+def require_service(get_service):
+    """Return a service, stopping the page with an error if it cannot be initialized"""
     try:
-        gemini = GeminiService()
-        heygen = HeyGenService()
-        file_svc = FileService()
-        return gemini, heygen, file_svc
+        return get_service()
     except Exception as e:
         st.error(f"❌ Lỗi khởi tạo services: {str(e)}")
         st.stop()
 
-gemini_service, heygen_service, file_service = init_services()
-
 # Header
 st.title("🎓 AI Video Education Creator")
 st.markdown("**Tạo video giáo dục tự động với AI và Avatar**")
@@ -67,7 +128,7 @@ with st.sidebar:
     # API Usage Stats
     st.header("📊 API Usage")
     try:
-        usage = gemini_service.get_usage_stats()
+        usage = get_gemini_service().get_usage_stats()
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Còn lại/phút", f"{usage['remaining']}/{usage['max_per_minute']}")
@@ -78,24 +139,83 @@ with st.sidebar:
         progress = usage['calls_this_minute'] / usage['max_per_minute']
         st.progress(progress, text=f"Rate limit: {usage['calls_this_minute']}/{usage['max_per_minute']}")
         
+        st.caption(f"⚡ Lấy từ cache: {usage['cache_hits']} lần · 🔗 Dùng chung lượt gọi: {usage['shared_calls']} lần")
+        
         if usage['remaining'] == 0:
-            st.warning("⏳ Đợi 1 phút để reset")
-    except:
-        pass
+            st.warning(f"⏳ Lượt tiếp theo sau khoảng {int(usage['wait_seconds']) + 1} giây")
+        
+        # Adaptive concurrency limits (grow while healthy, halve on 429/5xx)
+        limiters = [usage['concurrency']]
+        try:
+            limiters.append(get_heygen_service().concurrency.snapshot())
+        except Exception:
+            pass
+        for limiter in limiters:
+            state = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}[limiter['state']]
+            st.caption(
+                f"{state} {limiter['name']}: {limiter['in_flight']}/{limiter['limit']} request song song "
+                f"(tối đa {limiter['max_limit']}) · 429: {limiter['throttled']} · lỗi: {limiter['failed']}"
+            )
+        
+        renders = get_render_scheduler().snapshot()
+        st.caption(
+            f"🎞️ Render: {renders['rendering']}/{renders['max_renders']} video đang render · "
+            f"{sum(renders['queued'].values())} video đang chờ"
+        )
+    except Exception as e:
+        st.caption(f"⚠️ Không đọc được thống kê API: {str(e)}")
     
     st.divider()
     
     st.header("📁 Scripts đã lưu")
+    file_service = require_service(get_file_service)
+    search_query = st.text_input("🔍 Tìm trong scripts", placeholder="Ví dụ: giao duc")
+    if search_query:
+        try:
+            results = file_service.search_scripts(search_query, limit=10)
+            if results:
+                for result in results:
+                    st.text(f"📄 {result['name']}")
+                    st.caption(result['snippet'])
+            else:
+                st.info("Không tìm thấy script phù hợp")
+        except Exception as e:
+            st.error(f"Lỗi: {str(e)}")
+        st.divider()
+    
     try:
-        scripts = file_service.list_scripts()
+        scripts = file_service.list_scripts(limit=5)  # Show last 5 scripts
         if scripts:
-            for script in scripts[:5]:  # Show last 5 scripts
+            for script in scripts:
                 st.text(f"📄 {script['name']}")
                 st.caption(f"   {script['modified'].strftime('%Y-%m-%d %H:%M')}")
         else:
             st.info("Chưa có script nào")
     except Exception as e:
         st.error(f"Lỗi: {str(e)}")
+    
+    st.divider()
+    
+    # Admin panel: where time goes (values up to the previous rerun)
+    with st.expander("🛠️ Admin: Metrics"):
+        operations = registry.snapshot()
+        if operations:
+            st.dataframe(
+                [{"operation": name, **stats} for name, stats in operations.items()],
+                hide_index=True,
+                use_container_width=True,
+            )
+        else:
+            st.info("Chưa có số liệu")
+        
+        st.caption(f"Trace của phiên này: {st.session_state.trace_id}")
+        for span in registry.get_trace(st.session_state.trace_id)[-15:]:
+            mark = "❌" if span['error'] else "•"
+            video = f" [{span['attributes']['video_id'][:8]}]" if span['attributes'].get('video_id') else ""
+            st.text(f"{mark} {span['name']}{video} {span['ms']:.0f}ms")
+        
+        if METRICS_PORT:
+            st.caption(f"Prometheus: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
 
 # Main content - Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["📤 Bước 1: Upload Script", "🤖 Bước 2: AI Processing", "🎬 Bước 3: Tạo Video", "📺 Bước 4: Preview & Download"])
@@ -159,34 +279,53 @@ with tab2:
         
         # AI Processing options
         st.subheader("Chọn phương thức xử lý:")
+        fresh_variant = st.checkbox(
+            "🔁 Tạo phiên bản mới (bỏ qua cache)",
+            help="Mặc định kết quả của cùng một script được lấy lại từ cache để tiết kiệm quota"
+        )
         
         col1, col2 = st.columns(2)
         
+        ai_action = None
         with col1:
             if st.button("✨ Tạo Nội Dung Mới từ Prompt"):
-                with st.spinner("🤖 AI đang tạo nội dung..."):
-                    try:
-                        generated_content = gemini_service.generate_educational_content(
-                            st.session_state.processed_script
-                        )
-                        st.session_state.processed_script = generated_content
-                        st.success("✅ Đã tạo nội dung mới!")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Lỗi: {str(e)}")
+                ai_action = "generate"
         
         with col2:
             if st.button("🎨 Cải Thiện Script Hiện Tại"):
-                with st.spinner("🤖 AI đang cải thiện script..."):
-                    try:
-                        enhanced_content = gemini_service.enhance_script(
-                            st.session_state.processed_script
-                        )
-                        st.session_state.processed_script = enhanced_content
-                        st.success("✅ Đã cải thiện script!")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Lỗi: {str(e)}")
+                ai_action = "enhance"
+        
+        if ai_action:
+            gemini_service = require_service(get_gemini_service)
+            
+            # Render the script progressively as chunks arrive
+            stream_placeholder = st.empty()
+            try:
+                if ai_action == "generate":
+                    stream_placeholder.info("🤖 AI đang tạo nội dung...")
+                    stream = gemini_service.generate_educational_content_stream(
+                        st.session_state.processed_script,
+                        use_cache=not fresh_variant
+                    )
+                else:
+                    stream_placeholder.info("🤖 AI đang cải thiện script...")
+                    stream = gemini_service.enhance_script_stream(
+                        st.session_state.processed_script,
+                        use_cache=not fresh_variant
+                    )
+                
+                streamed_content = ""
+                for chunk in stream:
+                    streamed_content += chunk
+                    stream_placeholder.markdown(streamed_content + "▌")
+                stream_placeholder.markdown(streamed_content)
+                
+                st.session_state.processed_script = streamed_content
+                st.success("✅ Đã tạo nội dung mới!" if ai_action == "generate" else "✅ Đã cải thiện script!")
+                st.rerun()
+            except Exception as e:
+                stream_placeholder.empty()
+                st.error(f"❌ Lỗi: {str(e)}")
         
         st.divider()
         
@@ -234,6 +373,8 @@ with tab3:
     if not st.session_state.processed_script:
         st.warning("⚠️ Vui lòng hoàn thành Bước 1 và 2 trước!")
     else:
+        heygen_service = require_service(get_heygen_service)
+        
         # Show script summary
         with st.expander("📄 Script sẽ được dùng cho video", expanded=False):
             st.text_area("", st.session_state.processed_script, height=200, disabled=True)
@@ -241,18 +382,66 @@ with tab3:
         st.divider()
         
         # Get avatars
-        st.subheader("👤 Chọn Avatar")
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.subheader("👤 Chọn Avatar")
+        with col2:
+            if st.button("🔄 Làm mới danh sách"):
+                try:
+                    heygen_service.get_avatars(force_refresh=True)
+                except Exception as e:
+                    st.error(f"❌ Lỗi khi làm mới avatars: {str(e)}")
         
         with st.spinner("Đang tải danh sách avatars..."):
             try:
-                avatars = heygen_service.get_avatars()
+                avatar_index = heygen_service.get_avatar_index()
                 
-                if avatars:
+                if len(avatar_index):
+                    thumbnails = get_thumbnail_cache()
+                    
+                    # Search and filters
+                    col_search, col_gender, col_style = st.columns([2, 1, 1])
+                    with col_search:
+                        avatar_query = st.text_input("🔎 Tìm avatar theo tên", key="avatar_query")
+                    with col_gender:
+                        genders = [value for value, _ in avatar_index.facet_values("gender")]
+                        avatar_gender = st.selectbox("Giới tính", ["Tất cả"] + genders, key="avatar_gender")
+                    with col_style:
+                        styles = [value for value, _ in avatar_index.facet_values("style")]
+                        avatar_style = st.selectbox("Phong cách", ["Tất cả"] + styles, key="avatar_style")
+                    avatar_filters = {
+                        "gender": None if avatar_gender == "Tất cả" else avatar_gender,
+                        "style": None if avatar_style == "Tất cả" else avatar_style,
+                    }
+                    
+                    # Cursors of the pages visited so far; a new search starts again at page 1
+                    search_key = (avatar_query, avatar_gender, avatar_style)
+                    if st.session_state.avatar_search != search_key:
+                        st.session_state.avatar_search = search_key
+                        st.session_state.avatar_cursors = [None]
+                    
+                    # Only the current page of the grid is fetched and rendered
+                    page = avatar_index.page(avatar_query, avatar_filters,
+                                             st.session_state.avatar_cursors[-1], AVATAR_PAGE_SIZE)
+                    images = thumbnails.get_many(avatar['preview_url'] for avatar in page['items'])
+                    if page['next_cursor']:
+                        # Warm the next page while the user looks at this one
+                        next_page = avatar_index.page(avatar_query, avatar_filters,
+                                                      page['next_cursor'], AVATAR_PAGE_SIZE)
+                        thumbnails.prefetch(avatar['preview_url'] for avatar in next_page['items'])
+                    
+                    if not page['items']:
+                        st.info("Không có avatar nào khớp bộ lọc")
+                    
                     # Display avatars in grid
                     cols = st.columns(4)
-                    for idx, avatar in enumerate(avatars[:20]):  # Show first 20
+                    for idx, avatar in enumerate(page['items']):
                         with cols[idx % 4]:
-                            st.image(avatar['preview_url'], use_column_width=True)
+                            image = images.get(avatar['preview_url'])
+                            if image:
+                                st.image(image, use_column_width=True)
+                            else:
+                                st.caption("🖼️ Không tải được ảnh")
                             if st.button(
                                 f"Chọn {avatar['name'][:15]}",
                                 key=f"avatar_{avatar['id']}"
@@ -260,13 +449,28 @@ with tab3:
                                 st.session_state.selected_avatar = avatar
                                 st.success(f"✅ Đã chọn: {avatar['name']}")
                     
+                    # Page navigation
+                    page_number = len(st.session_state.avatar_cursors)
+                    page_count = max(1, -(-page['total'] // AVATAR_PAGE_SIZE))
+                    col_prev, col_page, col_next = st.columns([1, 2, 1])
+                    with col_prev:
+                        st.button("⬅️ Trang trước", disabled=page_number == 1,
+                                  on_click=st.session_state.avatar_cursors.pop)
+                    with col_page:
+                        st.caption(f"Trang {page_number}/{page_count} · {page['total']}/{len(avatar_index)} avatars")
+                    with col_next:
+                        st.button("Trang sau ➡️", disabled=page['next_cursor'] is None,
+                                  on_click=st.session_state.avatar_cursors.append, args=(page['next_cursor'],))
+                    
                     # Show selected avatar
                     if st.session_state.selected_avatar:
                         st.divider()
                         st.subheader("Avatar đã chọn:")
                         col1, col2 = st.columns([1, 3])
                         with col1:
-                            st.image(st.session_state.selected_avatar['preview_url'])
+                            selected_image = thumbnails.get(st.session_state.selected_avatar['preview_url'])
+                            if selected_image:
+                                st.image(selected_image)
                         with col2:
                             st.write(f"**Tên:** {st.session_state.selected_avatar['name']}")
                             st.write(f"**ID:** {st.session_state.selected_avatar['id']}")
@@ -278,23 +482,110 @@ with tab3:
                             value=f"Educational Video - {datetime.now().strftime('%Y-%m-%d')}"
                         )
                         
-                        # Create video button
-                        if st.button("🎬 Tạo Video", type="primary"):
-                            with st.spinner("🎬 Đang tạo video... Vui lòng đợi..."):
-                                try:
-                                    video_id = heygen_service.create_video(
-                                        script=st.session_state.processed_script,
-                                        avatar_id=st.session_state.selected_avatar['id'],
-                                        title=video_title
-                                    )
-                                    st.session_state.video_id = video_id
-                                    st.session_state.video_status = "processing"
-                                    st.success(f"✅ Video đang được tạo! ID: {video_id}")
-                                    st.info("➡️ Chuyển sang Bước 4 để theo dõi tiến trình")
-                                    time.sleep(2)
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"❌ Lỗi: {str(e)}")
+                        # Voice (default: the avatar's own voice)
+                        voice_id = None
+                        if st.checkbox("🎙️ Chọn giọng đọc khác"):
+                            voice_index = heygen_service.get_voice_index()
+                            col_voice_search, col_language, col_voice_gender = st.columns([2, 1, 1])
+                            with col_voice_search:
+                                voice_query = st.text_input("🔎 Tìm giọng theo tên", key="voice_query")
+                            with col_language:
+                                languages = [value for value, _ in voice_index.facet_values("language")]
+                                voice_language = st.selectbox("Ngôn ngữ", ["Tất cả"] + languages, key="voice_language")
+                            with col_voice_gender:
+                                voice_genders = [value for value, _ in voice_index.facet_values("gender")]
+                                voice_gender = st.selectbox("Giới tính", ["Tất cả"] + voice_genders, key="voice_gender")
+                            voices = voice_index.page(voice_query, {
+                                "language": None if voice_language == "Tất cả" else voice_language,
+                                "gender": None if voice_gender == "Tất cả" else voice_gender,
+                            }, limit=VOICE_OPTIONS_LIMIT)
+                            if voices['items']:
+                                voice_options = {
+                                    f"{voice['name']} ({voice.get('language') or '?'}, {voice.get('gender') or '?'})": voice['id']
+                                    for voice in voices['items']
+                                }
+                                voice_id = voice_options[st.selectbox(
+                                    f"Giọng đọc ({voices['total']} kết quả)", list(voice_options)
+                                )]
+                            else:
+                                st.info("Không có giọng nào khớp bộ lọc")
+                        
+                        # Same script, avatar and voice already submitted (possibly by another session)
+                        existing_job = heygen_service.job_store.find_by_script(
+                            st.session_state.processed_script, st.session_state.selected_avatar['id'], voice_id
+                        )
+                        if existing_job:
+                            st.info(
+                                f"ℹ️ Script này đã được tạo video với avatar này lúc "
+                                f"{existing_job['created_at'].strftime('%Y-%m-%d %H:%M')} "
+                                f"(trạng thái: {existing_job['status']})"
+                            )
+                            if st.button("📂 Mở video đã có"):
+                                st.session_state.video_id = existing_job['video_id']
+                                st.session_state.video_status = None
+                                st.session_state.scene_job = None
+                                st.success("➡️ Chuyển sang Bước 4 để xem video")
+                        
+                        priority = st.selectbox(
+                            "Mức ưu tiên:",
+                            RENDER_PRIORITIES,
+                            index=RENDER_PRIORITIES.index("normal"),
+                            format_func=lambda value: PRIORITY_LABELS.get(value, value),
+                        )
+                        
+                        by_scene = st.checkbox(
+                            "🧩 Render theo cảnh (sửa script rồi tạo lại chỉ render các cảnh đã thay đổi)",
+                            help="Mỗi cảnh được lưu lại sau khi render; video được ghép trên máy bằng ffmpeg."
+                        )
+                        if by_scene and not shutil.which("ffmpeg"):
+                            st.warning("⚠️ Cần cài ffmpeg để ghép các cảnh thành một video")
+                        
+                        # Create video button (the render queue submits it when a slot is free)
+                        create_clicked = st.button("🎬 Tạo Video", type="primary")
+                        if create_clicked and by_scene:
+                            try:
+                                from scene_video import SceneVideoJob
+                                scene_job = SceneVideoJob(
+                                    heygen_service,
+                                    st.session_state.processed_script,
+                                    st.session_state.selected_avatar['id'],
+                                    voice_id=voice_id,
+                                    title=video_title,
+                                    scene_cache=get_scene_cache(),
+                                    scheduler=get_render_scheduler(),
+                                    user=st.session_state.user_id,
+                                    priority=priority,
+                                )
+                                scene_job.submit()
+                                st.session_state.scene_job = scene_job
+                                st.session_state.scene_video_path = None
+                                st.session_state.render_ticket = None
+                                st.session_state.video_id = None
+                                st.session_state.video_status = None
+                                summary = scene_job.status()
+                                reused = summary['cached'] + summary['reused']
+                                st.success(f"✅ {summary['total'] - reused}/{summary['total']} cảnh cần render "
+                                           f"({reused} cảnh dùng lại từ lần trước)")
+                                st.info("➡️ Chuyển sang Bước 4 để theo dõi tiến trình")
+                            except Exception as e:
+                                st.error(f"❌ Lỗi: {str(e)}")
+                        elif create_clicked:
+                            try:
+                                st.session_state.render_ticket = get_render_scheduler().submit(
+                                    script=st.session_state.processed_script,
+                                    avatar_id=st.session_state.selected_avatar['id'],
+                                    voice_id=voice_id,
+                                    title=video_title,
+                                    user=st.session_state.user_id,
+                                    priority=priority,
+                                )
+                                st.session_state.scene_job = None
+                                st.session_state.video_id = None
+                                st.session_state.video_status = None
+                                st.success("✅ Video đã vào hàng đợi render!")
+                                st.info("➡️ Chuyển sang Bước 4 để theo dõi tiến trình")
+                            except Exception as e:
+                                st.error(f"❌ Lỗi: {str(e)}")
                 
                 else:
                     st.warning("Không tìm thấy avatar nào")
@@ -302,88 +593,240 @@ with tab3:
             except Exception as e:
                 st.error(f"❌ Lỗi khi tải avatars: {str(e)}")
 
-# ==================== TAB 4: PREVIEW & DOWNLOAD ====================
-with tab4:
-    st.header("📺 Bước 4: Preview & Download Video")
+def format_wait(seconds: float) -> str:
+    """Rough human-readable duration"""
+    if seconds < 60:
+        return "dưới 1 phút"
+    return f"khoảng {int(seconds // 60) + 1} phút"
+
+def show_queue_status():
+    """
+    Queue section of the Preview tab (run as a fragment until the video is submitted)
+    """
+    scheduler = get_render_scheduler()
+    ticket = scheduler.status(st.session_state.render_ticket)
+    if ticket is None:
+        # The app restarted and the in-memory queue is gone
+        st.warning("⚠️ Không còn thấy video trong hàng đợi, vui lòng tạo lại ở Bước 3")
+        st.session_state.render_ticket = None
+        return
     
-    if not st.session_state.video_id:
-        st.warning("⚠️ Vui lòng tạo video ở Bước 3 trước!")
+    if ticket['video_id']:
+        # Submitted: one full run hands over to the video status section
+        st.session_state.video_id = ticket['video_id']
+        st.session_state.video_status = {"status": "pending"}
+        st.session_state.render_ticket = None
+        st.rerun()
+    
+    if ticket['state'] == "queued":
+        place = "tiếp theo" if ticket['position'] == 0 else f"{ticket['position']} video đứng trước"
+        st.warning(f"🕒 Đang chờ render ({PRIORITY_LABELS.get(ticket['priority'], ticket['priority'])}): {place}")
+        st.info(f"⏱️ Bắt đầu render sau {format_wait(ticket['eta_start'])} · "
+                f"dự kiến xong sau {format_wait(ticket['eta_done'])}")
+        if st.button("✖️ Hủy khỏi hàng đợi"):
+            scheduler.cancel(st.session_state.render_ticket)
+            st.session_state.render_ticket = None
+            st.rerun()
+    elif ticket['state'] == "submitting":
+        st.info("🚀 Đang gửi video tới HeyGen...")
     else:
-        st.info(f"🎬 Video ID: {st.session_state.video_id}")
-        
-        # Check video status
-        if st.button("🔄 Kiểm tra trạng thái video"):
-            with st.spinner("Đang kiểm tra..."):
+        st.error(f"❌ Gửi video thất bại: {ticket['error'] or ticket['state']}")
+        if st.button("🔄 Thử lại", key="retry_queue"):
+            st.session_state.render_ticket = None
+            st.rerun()
+
+def show_scene_status(refreshing: bool):
+    """
+    Progress of a scene-by-scene render, then the assembled video (run as a fragment)
+    """
+    scene_job = st.session_state.scene_job
+    summary = scene_job.status()
+    
+    if summary['status'] in ("completed", "failed") and refreshing:
+        # Finished while refreshing on a timer: one full run switches the timer off
+        st.rerun()
+    
+    reused = summary['cached'] + summary['reused']
+    st.progress(summary['completed'] / summary['total'],
+                text=f"🧩 {summary['completed']}/{summary['total']} cảnh đã xong")
+    st.caption(f"♻️ {reused} cảnh dùng lại từ lần render trước · "
+               f"🎬 {summary['total'] - reused} cảnh render mới")
+    
+    if summary['status'] in ("pending", "processing"):
+        st.info(f"🔄 Trạng thái tự cập nhật mỗi {VIDEO_POLL_INTERVAL} giây...")
+        if summary['missing']:
+            # Their cached clips were evicted by another render
+            st.warning(f"⚠️ {summary['missing']} cảnh không còn trong cache và cần render lại")
+            if st.button("🔁 Render lại các cảnh bị thiếu"):
+                scene_job.submit()
+                st.rerun()
+    
+    elif summary['status'] == "failed":
+        st.error("❌ Một số cảnh render thất bại!")
+        for scene in summary['scenes']:
+            if scene['status'] == "failed":
+                st.error(f"Cảnh {scene['index'] + 1}: {scene['error'] or 'Unknown error'}")
+        if st.button("🔁 Render lại các cảnh lỗi"):
+            scene_job.retry_failed()
+            st.rerun()
+    
+    else:
+        if not st.session_state.scene_video_path:
+            safe_title = re.sub(r"[^\w\-]+", "_", scene_job.title).strip("_") or "video"
+            output_path = os.path.join(PIPELINE_OUTPUT_FOLDER, f"{safe_title}_{int(time.time())}.mp4")
+            os.makedirs(PIPELINE_OUTPUT_FOLDER, exist_ok=True)
+            with st.spinner("📥 Đang tải và ghép các cảnh..."):
                 try:
-                    status_data = heygen_service.get_video_status(st.session_state.video_id)
-                    st.session_state.video_status = status_data
-                    st.rerun()
+                    st.session_state.scene_video_path = scene_job.download(output_path)
                 except Exception as e:
                     st.error(f"❌ Lỗi: {str(e)}")
+                    return
         
-        # Auto-polling
-        if st.session_state.video_status:
-            status = st.session_state.video_status.get('status')
-            
-            if status == "processing" or status == "pending":
-                st.warning(f"⏳ Video đang được xử lý: {status}")
-                st.info("🔄 Tự động kiểm tra sau 10 giây...")
-                
-                # Progress bar
-                progress_bar = st.progress(0)
-                for i in range(10):
-                    time.sleep(1)
-                    progress_bar.progress((i + 1) * 10)
-                
-                # Auto refresh
+        st.success("✅ Video đã hoàn thành!")
+        st.subheader("🎥 Xem Video")
+        st.video(st.session_state.scene_video_path)
+        
+        st.divider()
+        col1, col2 = st.columns(2)
+        with col1:
+            with open(st.session_state.scene_video_path, 'rb') as f:
+                st.download_button("📥 Tải Video", f, file_name=os.path.basename(st.session_state.scene_video_path),
+                                   mime="video/mp4")
+        with col2:
+            if st.button("🔄 Tạo Video Mới", key="new_after_scenes"):
+                st.session_state.trace_id = new_trace_id()
+                st.session_state.scene_job = None
+                st.session_state.scene_video_path = None
+                st.session_state.selected_avatar = None
+                st.success("✅ Đã reset! Bắt đầu lại từ Bước 1")
                 st.rerun()
+
+def show_video_status(refreshing: bool):
+    """
+    Status section of the Preview tab (run as a fragment)
+    
+    Reads the status shared by the poller and webhook from the job store, so a
+    timed refresh costs one in-memory lookup and redraws only this section.
+    """
+    heygen_service = require_service(get_heygen_service)
+    latest_status = heygen_service.job_store.get(st.session_state.video_id)
+    if latest_status:
+        st.session_state.video_status = latest_status
+    
+    # Check video status (the button only re-runs this section)
+    if st.button("🔄 Kiểm tra trạng thái video"):
+        with st.spinner("Đang kiểm tra..."):
+            try:
+                status_data = heygen_service.get_video_status(st.session_state.video_id)
+                heygen_service.job_store.update(st.session_state.video_id, status_data, source="manual")
+                st.session_state.video_status = status_data
+            except Exception as e:
+                st.error(f"❌ Lỗi: {str(e)}")
+    
+    status = st.session_state.video_status.get('status') if st.session_state.video_status else None
+    
+    if status in ("completed", "failed") and refreshing:
+        # Finished while refreshing on a timer: one full run switches the timer off
+        st.rerun()
+    
+    if status in (None, "processing", "pending"):
+        st.warning(f"⏳ Video đang được xử lý: {status or 'pending'}")
+        st.info(f"🔄 Trạng thái tự cập nhật mỗi {VIDEO_POLL_INTERVAL} giây...")
+    
+    elif status == "completed":
+        st.success("✅ Video đã hoàn thành!")
+        
+        video_url = st.session_state.video_status.get('video_url')
+        thumbnail_url = st.session_state.video_status.get('thumbnail_url')
+        duration = st.session_state.video_status.get('duration')
+        
+        # Show thumbnail
+        if thumbnail_url:
+            st.image(thumbnail_url, caption="Video Thumbnail", use_column_width=True)
+        
+        # Video info
+        if duration:
+            st.write(f"⏱️ **Thời lượng:** {duration} giây")
+        
+        # Video player
+        if video_url:
+            st.subheader("🎥 Xem Video")
+            st.video(video_url)
             
-            elif status == "completed":
-                st.success("✅ Video đã hoàn thành!")
-                
-                video_url = st.session_state.video_status.get('video_url')
-                thumbnail_url = st.session_state.video_status.get('thumbnail_url')
-                duration = st.session_state.video_status.get('duration')
-                
-                # Show thumbnail
-                if thumbnail_url:
-                    st.image(thumbnail_url, caption="Video Thumbnail", use_column_width=True)
-                
-                # Video info
-                if duration:
-                    st.write(f"⏱️ **Thời lượng:** {duration} giây")
-                
-                # Video player
-                if video_url:
-                    st.subheader("🎥 Xem Video")
-                    st.video(video_url)
-                    
-                    # Download button
-                    st.divider()
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.link_button("📥 Tải Video", video_url)
-                    with col2:
-                        if st.button("🔄 Tạo Video Mới"):
-                            # Reset session state
-                            st.session_state.video_id = None
-                            st.session_state.video_status = None
-                            st.session_state.processed_script = None
-                            st.session_state.selected_avatar = None
-                            st.success("✅ Đã reset! Bắt đầu lại từ Bước 1")
-                            st.rerun()
-            
-            elif status == "failed":
-                st.error("❌ Tạo video thất bại!")
-                error_msg = st.session_state.video_status.get('error', 'Unknown error')
-                st.error(f"Chi tiết lỗi: {error_msg}")
-                
-                if st.button("🔄 Thử lại"):
+            # Download button
+            st.divider()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.link_button("📥 Tải Video", video_url)
+            with col2:
+                if st.button("🔄 Tạo Video Mới"):
+                    # Reset session state
+                    st.session_state.trace_id = new_trace_id()
                     st.session_state.video_id = None
                     st.session_state.video_status = None
+                    st.session_state.processed_script = None
+                    st.session_state.selected_avatar = None
+                    st.success("✅ Đã reset! Bắt đầu lại từ Bước 1")
                     st.rerun()
+    
+    elif status == "failed":
+        st.error("❌ Tạo video thất bại!")
+        error_msg = st.session_state.video_status.get('error', 'Unknown error')
+        st.error(f"Chi tiết lỗi: {error_msg}")
+        
+        if st.button("🔄 Thử lại"):
+            st.session_state.trace_id = new_trace_id()
+            st.session_state.video_id = None
+            st.session_state.video_status = None
+            st.rerun()
+
+# ==================== TAB 4: PREVIEW & DOWNLOAD ====================
+with tab4:
+    st.header("📺 Bước 4: Preview & Download Video")
+    
+    # Jobs are stored durably, so any session can reopen earlier videos
+    if st.checkbox("📂 Mở lại video đã tạo"):
+        recent_jobs = require_service(get_heygen_service).job_store.list_jobs(limit=20)
+        if recent_jobs:
+            job_ids = {
+                f"{job['created_at'].strftime('%Y-%m-%d %H:%M')} · {job['title'] or '-'} · "
+                f"{job['status']} · {job['video_id']}": job['video_id']
+                for job in recent_jobs
+            }
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                reopen_label = st.selectbox("Video", list(job_ids), label_visibility="collapsed")
+            with col2:
+                if st.button("Mở", use_container_width=True):
+                    st.session_state.video_id = job_ids[reopen_label]
+                    st.session_state.video_status = None
+                    st.session_state.scene_job = None
+                    st.rerun()
+        else:
+            st.info("Chưa có video nào")
+    
+    if st.session_state.scene_job and not st.session_state.video_id:
+        # Scenes render as separate videos; only the progress section re-runs on a timer
+        rendering = st.session_state.scene_job.status()['status'] in ("pending", "processing")
+        st.fragment(run_every=VIDEO_POLL_INTERVAL if rendering else None)(show_scene_status)(rendering)
+    elif st.session_state.render_ticket and not st.session_state.video_id:
+        # Waiting for a render slot: only the queue section re-runs on a timer
+        st.fragment(run_every=VIDEO_POLL_INTERVAL)(show_queue_status)()
+    elif not st.session_state.video_id:
+        st.warning("⚠️ Vui lòng tạo video ở Bước 3 trước!")
+    else:
+        st.info(f"🎬 Video ID: {st.session_state.video_id}")
+        heygen_service = require_service(get_heygen_service)
+        
+        # Background poller tracks the video (no-op if already tracked or finished)
+        heygen_service.poller.track(st.session_state.video_id)
+        
+        # While the video renders, only the status section re-runs on a timer
+        rendering = not heygen_service.job_store.is_finished(st.session_state.video_id)
+        st.fragment(run_every=VIDEO_POLL_INTERVAL if rendering else None)(show_video_status)(rendering)
 
 # Footer
+registry.observe("streamlit.rerun", time.perf_counter() - rerun_started)
 st.divider()
 st.markdown("""
 <div style='text-align: center; color: #666;'>
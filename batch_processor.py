@@ -0,0 +1,268 @@
+"""
+Batch Processor
+Runs a Gemini operation over every script in a folder with a bounded
+worker pool, saving results through FileService and reporting per file
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from config import BATCH_MAX_WORKERS, BATCH_RATE_LIMIT_WAIT, BATCH_MANIFEST_PATH
+
+# Operation -> suffix appended to the output filename
+OPERATION_SUFFIXES = {
+    "enhance": "enhanced",
+    "generate": "generated",
+    "summarize": "summary",
+}
+
+
+def run_operation(gemini_service, operation: str, content: str,
+                  use_cache: bool = True, max_wait: float = BATCH_RATE_LIMIT_WAIT) -> str:
+    """
+    Run one Gemini operation on script content
+
+    Args:
+        gemini_service: GeminiService used for processing
+        operation: "enhance", "generate" or "summarize"
+        content: Script content
+        use_cache: Set False to bypass the Gemini response cache
+        max_wait: Seconds the call may wait for a rate limit slot
+
+    Returns:
+        Processed text
+    """
+    if operation == "enhance":
+        return gemini_service.enhance_script(content, use_cache=use_cache, max_wait=max_wait)
+    elif operation == "generate":
+        return gemini_service.generate_educational_content(content, use_cache=use_cache, max_wait=max_wait)
+    elif operation == "summarize":
+        return gemini_service.summarize_script(content, use_cache=use_cache, max_wait=max_wait)
+    raise ValueError(f"Operation không hợp lệ: {operation}")
+
+
+def output_names(file_paths: List[str], operation: Optional[str] = None) -> Dict[str, str]:
+    """
+    Output filename (without extension) for each script of a run
+
+    The source extension is kept ("bai1.docx" -> "bai1_docx_enhanced") so
+    bai1.txt and bai1.docx do not overwrite each other; scripts from different
+    folders with the same name also get a short hash of their path.
+
+    Args:
+        file_paths: Scripts of the run
+        operation: Operation whose suffix ends the name (None = no suffix)
+
+    Returns:
+        Dictionary of file path -> output name
+    """
+    names = {}
+    for path in file_paths:
+        stem, extension = os.path.splitext(os.path.basename(path))
+        names[path] = f"{stem}_{extension.lstrip('.').lower()}"
+
+    counts: Dict[str, int] = {}
+    for name in names.values():
+        counts[name] = counts.get(name, 0) + 1
+    for path, name in names.items():
+        if counts[name] > 1:
+            digest = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+            names[path] = f"{name}_{digest}"
+
+    if operation is not None:
+        names = {path: f"{name}_{OPERATION_SUFFIXES[operation]}" for path, name in names.items()}
+    return names
+
+
+class OutputManifest:
+    def __init__(self, path: str = BATCH_MANIFEST_PATH):
+        """
+        Record of the scripts written by batch runs, so later runs over the
+        same folder skip them instead of guessing from their names
+
+        Args:
+            path: JSON file holding the recorded paths
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._paths: Optional[set] = None
+
+    def _load(self):
+        """Read the manifest once (caller holds the lock)"""
+        if self._paths is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._paths = set(json.load(f))
+            except (OSError, ValueError):
+                self._paths = set()
+
+    def add(self, file_path: str):
+        """Record an output script"""
+        with self._lock:
+            self._load()
+            self._paths.add(os.path.abspath(file_path))
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(sorted(self._paths), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def __contains__(self, file_path: str) -> bool:
+        with self._lock:
+            self._load()
+            return os.path.abspath(file_path) in self._paths
+
+
+class BatchProcessor:
+    def __init__(self,
+                 gemini_service,
+                 file_service,
+                 max_workers: int = BATCH_MAX_WORKERS,
+                 max_wait: float = BATCH_RATE_LIMIT_WAIT,
+                 manifest: Optional[OutputManifest] = None):
+        """
+        Initialize batch processor
+
+        Args:
+            gemini_service: GeminiService used for processing
+            file_service: FileService used for reading and saving scripts
+            max_workers: Files processed concurrently
+            max_wait: Seconds each call may wait for a rate limit slot
+            manifest: Record of written outputs (a default one is used if not provided)
+        """
+        self.gemini_service = gemini_service
+        self.file_service = file_service
+        self.max_workers = max_workers
+        self.max_wait = max_wait
+        self.manifest = manifest or OutputManifest()
+
+    def _run_operation(self, operation: str, content: str, use_cache: bool) -> str:
+        """Run one Gemini operation on script content"""
+        return run_operation(self.gemini_service, operation, content, use_cache, self.max_wait)
+
+    def _process_file(self, file_path: str, output_name: str, operation: str,
+                      output_format: str, use_cache: bool) -> Dict:
+        """Read, process and save one script"""
+        start = time.time()
+        result = {
+            "file": os.path.basename(file_path),
+            "status": "ok",
+            "output_path": None,
+            "error": None,
+        }
+        try:
+            content = self.file_service.read_file(file_path)
+            if not content.strip():
+                raise ValueError("File rỗng")
+
+            processed = self._run_operation(operation, content, use_cache)
+
+            result["output_path"] = self.file_service.save_script(processed, output_name, output_format)
+            self.manifest.add(result["output_path"])
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+
+        result["seconds"] = round(time.time() - start, 2)
+        return result
+
+    def process_files(self,
+                      file_paths: List[str],
+                      operation: str = "enhance",
+                      output_format: str = "txt",
+                      use_cache: bool = True,
+                      progress_callback: Optional[Callable[[Dict, int, int], None]] = None) -> List[Dict]:
+        """
+        Process a list of scripts concurrently
+
+        Args:
+            file_paths: Scripts to process
+            operation: "enhance", "generate" or "summarize"
+            output_format: Output format ('txt' or 'docx')
+            use_cache: Set False to bypass the Gemini response cache
+            progress_callback: Called with (result, done_count, total) after each file
+
+        Returns:
+            Per-file status report in input order
+        """
+        if operation not in OPERATION_SUFFIXES:
+            raise ValueError(f"Operation phải là một trong: {', '.join(OPERATION_SUFFIXES)}")
+
+        file_paths = list(dict.fromkeys(file_paths))
+        names = output_names(file_paths, operation)
+        results: Dict[str, Dict] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch") as executor:
+            futures = {
+                executor.submit(self._process_file, path, names[path], operation, output_format, use_cache): path
+                for path in file_paths
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress_callback:
+                    progress_callback(results[futures[future]], len(results), len(file_paths))
+
+        return [results[path] for path in file_paths]
+
+    def process_folder(self,
+                       folder: Optional[str] = None,
+                       operation: str = "enhance",
+                       output_format: str = "txt",
+                       use_cache: bool = True,
+                       progress_callback: Optional[Callable[[Dict, int, int], None]] = None) -> List[Dict]:
+        """
+        Process every script in a folder (outputs of earlier batches are skipped)
+
+        Args:
+            folder: Folder to process (defaults to Script Folder)
+            operation: "enhance", "generate" or "summarize"
+            output_format: Output format ('txt' or 'docx')
+            use_cache: Set False to bypass the Gemini response cache
+            progress_callback: Called with (result, done_count, total) after each file
+
+        Returns:
+            Per-file status report
+        """
+        file_paths = [
+            script['path'] for script in self.file_service.list_scripts(folder)
+            if script['path'] not in self.manifest
+        ]
+        return self.process_files(file_paths, operation, output_format, use_cache, progress_callback)
+
+
+def format_report(results: List[Dict]) -> str:
+    """Render a per-file status report as plain text"""
+    lines = []
+    for result in results:
+        mark = "✅" if result["status"] == "ok" else "❌"
+        detail = result["output_path"] if result["status"] == "ok" else result["error"]
+        lines.append(f"{mark} {result['file']} ({result['seconds']}s) -> {detail}")
+
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    lines.append(f"Tổng: {succeeded}/{len(results)} file thành công")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from gemini_service import GeminiService
+    from file_service import FileService
+
+    parser = argparse.ArgumentParser(description="Xử lý hàng loạt scripts với Gemini AI")
+    parser.add_argument("folder", nargs="?", help="Thư mục chứa scripts (mặc định: Script Folder)")
+    parser.add_argument("--operation", choices=list(OPERATION_SUFFIXES), default="enhance")
+    parser.add_argument("--format", choices=["txt", "docx"], default="txt")
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS)
+    parser.add_argument("--no-cache", action="store_true", help="Bỏ qua cache kết quả Gemini")
+    args = parser.parse_args()
+
+    processor = BatchProcessor(GeminiService(), FileService(), max_workers=args.workers)
+    report = processor.process_folder(
+        args.folder, args.operation, args.format, use_cache=not args.no_cache,
+        progress_callback=lambda result, done, total: print(f"[{done}/{total}] {result['file']}: {result['status']}"),
+    )
+    print(format_report(report))
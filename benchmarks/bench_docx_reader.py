@@ -0,0 +1,84 @@
+"""
+Benchmark: streaming docx_reader vs python-docx on large documents
+
+Generates synthetic manuals (paragraphs, hyperlinks, line breaks and tables)
+and compares wall time and peak Python memory of both extraction paths.
+
+Usage:
+    python benchmarks/bench_docx_reader.py [--pages 100 300] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx_reader import read_docx_text, _read_docx_fallback
+
+PARAGRAPHS_PER_PAGE = 12
+SENTENCE = "Bài học hôm nay giới thiệu cách tạo video giáo dục với avatar AI, từng bước một. "
+
+
+def build_document(path: str, pages: int):
+    """Write a synthetic manual of roughly the given number of pages"""
+    doc = Document()
+    for page in range(pages):
+        doc.add_heading(f"Chương {page + 1}", level=1)
+        for i in range(PARAGRAPHS_PER_PAGE):
+            paragraph = doc.add_paragraph(SENTENCE * 3)
+            run = paragraph.add_run(f"Ghi chú {i}")
+            run.bold = True
+            if i % 4 == 0:
+                run.add_break()
+                paragraph.add_run("\tDòng tiếp theo")
+        if page % 10 == 0:
+            table = doc.add_table(rows=5, cols=3)
+            for cell in table._cells:
+                cell.text = "ô bảng"
+        doc.add_paragraph("")
+    doc.save(path)
+
+
+def measure(function, path: str, repeat: int):
+    """Best wall time over repeat runs and peak traced memory of one run"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(path)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tốc độ đọc .docx")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'pages':>6} {'size':>8} {'python-docx':>14} {'streaming':>14} {'speedup':>8} {'peak MB':>16}")
+        for pages in args.pages:
+            path = os.path.join(work_dir, f"manual_{pages}.docx")
+            build_document(path, pages)
+
+            slow_text, slow_time, slow_peak = measure(_read_docx_fallback, path, args.repeat)
+            fast_text, fast_time, fast_peak = measure(read_docx_text, path, args.repeat)
+            assert fast_text == slow_text, "Output khác nhau giữa hai cách đọc"
+
+            print(f"{pages:>6} {os.path.getsize(path) // 1024:>6}KB "
+                  f"{slow_time * 1000:>12.1f}ms {fast_time * 1000:>12.1f}ms "
+                  f"{slow_time / fast_time:>7.1f}x "
+                  f"{slow_peak / 2**20:>7.1f} -> {fast_peak / 2**20:>5.1f}")
+
+
+if __name__ == "__main__":
+    main()
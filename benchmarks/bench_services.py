@@ -0,0 +1,244 @@
+"""
+Benchmark: service classes and the pipeline against offline stand-ins
+
+Runs HeyGenService, GeminiService and the headless Pipeline against
+FakeHeyGenServer / FakeGeminiModel (no network, no API quota) and reports
+requests/sec, p50/p95 latency and end-to-end jobs/hour. Results can be saved
+as a baseline and compared in CI.
+
+Usage:
+    python benchmarks/bench_services.py [--latency 0.02] [--render-seconds 2] [--jobs 20]
+                                        [--failure-rate 0.05] [--rate-limit-rate 0.05]
+                                        [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeHeyGenServer, FakeGeminiModel
+
+# Fraction a metric may worsen over the baseline before it counts as a regression
+REGRESSION_TOLERANCE = 0.25
+
+# Metrics where a larger value is better; every other metric is a latency
+HIGHER_IS_BETTER = ("rps", "jobs_per_hour", "mb_per_s")
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_load(function: Callable[[int], None], requests: int, concurrency: int) -> Dict:
+    """
+    Call function(i) for i in range(requests) from concurrency threads
+
+    Returns:
+        Dictionary with rps, p50_ms, p95_ms and errors
+    """
+    latencies, errors = [], 0
+
+    def call(i: int):
+        start = time.perf_counter()
+        try:
+            function(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, error in executor.map(call, range(requests)):
+            if error is None:
+                latencies.append(latency)
+            else:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.5) * 1000 if latencies else 0.0,
+        "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def bench_heygen(server: FakeHeyGenServer, args) -> Dict[str, Dict]:
+    """Catalog, submission, status and download throughput of HeyGenService"""
+    from heygen_service import HeyGenService
+    from job_store import JobStore
+
+    heygen = HeyGenService(job_store=JobStore(), base_url=server.url, api_key="offline")
+    results = {
+        "heygen.avatars": run_load(lambda i: heygen.get_avatars(force_refresh=True), args.requests, args.concurrency),
+        "heygen.create_video": run_load(
+            lambda i: heygen.create_video(f"Script {i}", "avatar_0", title=f"Bench {i}"),
+            args.requests, args.concurrency,
+        ),
+    }
+
+    video_id = heygen.create_video("Status probe", "avatar_0")
+    results["heygen.video_status"] = run_load(lambda i: heygen.get_video_status(video_id),
+                                              args.requests, args.concurrency)
+
+    # Downloads of a finished video
+    time.sleep(server.render_seconds)
+    video_url = heygen.get_video_status(video_id)["video_url"]
+    with tempfile.TemporaryDirectory() as work_dir:
+        downloads = max(4, args.requests // 20)
+        result = run_load(
+            lambda i: heygen.download_video(video_url, os.path.join(work_dir, f"video_{i}.mp4")),
+            downloads, args.concurrency,
+        )
+    result["mb_per_s"] = result["rps"] * len(server.video_bytes) / 2**20
+    results["heygen.download"] = result
+
+    # Many sessions watching the same video at once: calls reaching the API
+    before = server.request_counts.get("video_status", 0)
+    burst = args.concurrency * 4
+    result = run_load(lambda i: heygen.get_video_status(video_id), burst, burst)
+    result["upstream_calls"] = server.request_counts.get("video_status", 0) - before
+    results["heygen.status_burst"] = result
+    return results
+
+
+def bench_gemini(args) -> Dict[str, Dict]:
+    """Streaming generation throughput of GeminiService (rate limiter not the bottleneck)"""
+    from gemini_service import GeminiService
+    from rate_limiter import TokenBucket
+
+    gemini = GeminiService(
+        model=FakeGeminiModel(latency=args.gemini_latency, chunks=10,
+                              failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate, seed=1),
+        rate_limiter=TokenBucket("benchmark", capacity=10**9, refill_per_second=10**9, state_path=None),
+    )
+    results = {
+        "gemini.enhance": run_load(lambda i: gemini.enhance_script(f"Script {i}", use_cache=False),
+                                   args.requests, args.concurrency),
+        "gemini.enhance_cached": run_load(lambda i: gemini.enhance_script("Script 0"),
+                                          args.requests, args.concurrency),
+    }
+
+    # A shared lesson requested by many sessions at once (not cached yet)
+    before = gemini.model.calls
+    burst = args.concurrency * 4
+    result = run_load(lambda i: gemini.enhance_script("Shared lesson"), burst, burst)
+    result["upstream_calls"] = gemini.model.calls - before
+    results["gemini.enhance_burst"] = result
+    return results
+
+
+def bench_pipeline(server: FakeHeyGenServer, args) -> Dict[str, Dict]:
+    """End-to-end jobs/hour of the headless pipeline"""
+    from file_service import FileService
+    from gemini_service import GeminiService
+    from heygen_service import HeyGenService
+    from job_store import JobStore
+    from pipeline_cli import Pipeline
+    from rate_limiter import TokenBucket
+    from status_poller import StatusPoller
+
+    heygen = HeyGenService(job_store=JobStore(), base_url=server.url, api_key="offline")
+    # Poll on the fake server's time scale instead of HeyGen's minutes
+    heygen.poller = StatusPoller(heygen.get_video_status, heygen.job_store,
+                                 min_interval=server.render_seconds / 8, max_interval=server.render_seconds,
+                                 expected_duration=server.render_seconds)
+    gemini = GeminiService(
+        model=FakeGeminiModel(latency=args.gemini_latency, chunks=10, seed=2),
+        rate_limiter=TokenBucket("benchmark", capacity=10**9, refill_per_second=10**9, state_path=None),
+    )
+    file_service = FileService()
+    paths = [file_service.save_script(f"Bài giảng số {i}. " * 50, f"bench_{i}") for i in range(args.jobs)]
+
+    result = Pipeline(gemini, heygen, file_service, "avatar_0", output_folder="Videos", use_cache=False).run(paths)
+    heygen.poller.stop()
+
+    succeeded = [item["seconds"] for item in result["items"] if item["error"] is None]
+    return {
+        "pipeline": {
+            "jobs_per_hour": len(succeeded) * 3600 / result["seconds"],
+            "p50_ms": _percentile(succeeded, 0.5) * 1000 if succeeded else 0.0,
+            "p95_ms": _percentile(succeeded, 0.95) * 1000 if succeeded else 0.0,
+            "errors": len(result["items"]) - len(succeeded),
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo hiệu năng services với HeyGen/Gemini giả lập (offline)")
+    parser.add_argument("--requests", type=int, default=200, help="Số request mỗi kịch bản")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=20, help="Số script cho kịch bản pipeline")
+    parser.add_argument("--latency", type=float, default=0.02, help="Độ trễ mỗi request HeyGen (giây)")
+    parser.add_argument("--gemini-latency", type=float, default=0.1, help="Độ trễ mỗi lần gọi Gemini (giây)")
+    parser.add_argument("--render-seconds", type=float, default=2.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--save", help="Lưu kết quả làm baseline (JSON)")
+    parser.add_argument("--compare", help="So sánh với baseline (JSON), exit 1 nếu kém hơn")
+    args = parser.parse_args()
+
+    server = FakeHeyGenServer(latency=args.latency, jitter=args.latency / 2,
+                              failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate,
+                              render_seconds=args.render_seconds, seed=0).start()
+    results = {}
+    # Caches, indexes and outputs go to a scratch folder
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            results.update(bench_heygen(server, args))
+            results.update(bench_gemini(args))
+            results.update(bench_pipeline(server, args))
+        finally:
+            os.chdir(previous_dir)
+            server.stop()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f"{'scenario':<24} {'rps':>9} {'p50':>10} {'p95':>10} {'errors':>7}  extra")
+    for name, metrics in results.items():
+        extra = ""
+        if "jobs_per_hour" in metrics:
+            extra = f"{metrics['jobs_per_hour']:.0f} jobs/h"
+        elif "mb_per_s" in metrics:
+            extra = f"{metrics['mb_per_s']:.1f} MB/s"
+        elif "upstream_calls" in metrics:
+            extra = f"{metrics['upstream_calls']} upstream calls"
+        rps = f"{metrics['rps']:.1f}" if "rps" in metrics else "-"
+        print(f"{name:<24} {rps:>9} {metrics['p50_ms']:>8.1f}ms "
+              f"{metrics['p95_ms']:>8.1f}ms {metrics['errors']:>7}  {extra}")
+
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if metric == "errors" or not previous:
+                continue
+            change = value / previous - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > REGRESSION_TOLERANCE:
+                regressions.append(f"{name}.{metric} ({change:+.0%})")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"Kém hơn baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: cold start of the Streamlit app
+
+Measures, each in a fresh interpreter:
+- import time of app modules and the heavy SDKs behind them
+- time to first render: one full run of app.py (as on opening the page)
+
+Results can be saved as a baseline and later runs compared against it, so
+startup regressions show up.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--save baseline.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_TARGETS = [
+    "streamlit",
+    "config",
+    "file_service",
+    "gemini_service",
+    "heygen_service",
+    "google.generativeai",
+    "docx",
+    "requests",
+]
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+# Runs app.py headlessly the way a browser session would, starting from a cold
+# interpreter; streamlit itself is imported up front (it is already loaded
+# when the server executes the script)
+FIRST_RENDER_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=60)
+start = time.perf_counter()
+app.run()
+elapsed = time.perf_counter() - start
+if app.exception:
+    raise SystemExit("app.py raised: " + str(app.exception[0].value))
+print(elapsed)
+"""
+
+# Fraction a timing may grow over the baseline before it counts as a regression
+REGRESSION_TOLERANCE = 0.25
+
+
+def run_snippet(code: str, work_dir: str) -> float:
+    """Run code in a fresh interpreter and return the seconds it prints"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=work_dir, env=env,
+        capture_output=True, text=True, timeout=300,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def best_of(code: str, work_dir: str, repeat: int) -> float:
+    """Best time over repeat cold runs"""
+    return min(run_snippet(code, work_dir) for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="Lưu kết quả làm baseline (JSON)")
+    parser.add_argument("--compare", help="So sánh với baseline (JSON), exit 1 nếu chậm hơn")
+    args = parser.parse_args()
+
+    results = {}
+    # Run from an empty folder so Script Folder/.cache of the repo are not touched;
+    # placeholder keys let every service initialize without real credentials
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, ".streamlit"))
+        with open(os.path.join(work_dir, ".streamlit", "secrets.toml"), 'w', encoding='utf-8') as f:
+            f.write('GOOGLE_API_KEY = "benchmark"\nHEYGEN_API_KEY = "benchmark"\n')
+
+        for module in IMPORT_TARGETS:
+            try:
+                results[f"import {module}"] = best_of(IMPORT_SNIPPET.format(module=module), work_dir, args.repeat)
+            except RuntimeError as e:
+                print(f"import {module}: {e}")
+
+        app_path = os.path.join(REPO_DIR, "app.py")
+        results["first render"] = best_of(FIRST_RENDER_SNIPPET.format(app_path=app_path), work_dir, args.repeat)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for name, seconds in results.items():
+        line = f"{name:<28} {seconds * 1000:>9.1f}ms"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f"   ({change:+.0%} vs baseline)"
+            if change > REGRESSION_TOLERANCE:
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"Chậm hơn baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
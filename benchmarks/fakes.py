@@ -0,0 +1,331 @@
+"""
+Offline stand-ins for HeyGen and Gemini
+
+FakeHeyGenServer is a local HTTP server speaking the subset of the HeyGen API
+the app uses (/v2/avatars, /v2/voices, /v2/video/generate,
+/v1/video_status.get) and serving the rendered videos with Range support.
+FakeGeminiModel replaces genai.GenerativeModel inside GeminiService.
+
+Both have configurable latency, failure rate and rate-limit (429) rate, so
+performance can be measured without network access or API quota.
+
+Usage:
+    server = FakeHeyGenServer(latency=0.05, render_seconds=2).start()
+    heygen = HeyGenService(base_url=server.url, api_key="offline")
+    gemini = GeminiService(model=FakeGeminiModel(latency=0.2))
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """Threaded server that does not print tracebacks when clients drop connections"""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class FakeFailure:
+    """Latency, failure and rate-limit behaviour shared by the fakes"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Base delay per request (seconds)
+            jitter: Extra uniform random delay up to this many seconds
+            failure_rate: Probability of a server error
+            rate_limit_rate: Probability of a 429 response
+            seed: Random seed for reproducible runs
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Sleep for the configured latency"""
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        time.sleep(self.latency + extra)
+
+    def chance(self, probability: float) -> bool:
+        """Draw an event with the given probability"""
+        with self._lock:
+            return self._random.random() < probability
+
+    def outcome(self) -> Optional[int]:
+        """HTTP status to fail with (429 or 500), or None for success"""
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.failure_rate:
+            return 500
+        return None
+
+
+# ---------- HeyGen ----------
+
+class FakeHeyGenServer:
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 failure_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 render_seconds: float = 2.0,
+                 render_failure_rate: float = 0.0,
+                 video_size: int = 1024 * 1024,
+                 avatar_count: int = 50,
+                 voice_count: int = 50,
+                 seed: Optional[int] = None):
+        """
+        Initialize fake HeyGen API server
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            latency: Base delay per API request (seconds)
+            jitter: Extra random delay per API request (seconds)
+            failure_rate: Probability of HTTP 500 per API request
+            rate_limit_rate: Probability of HTTP 429 per API request
+            render_seconds: Time from submission to a completed video
+            render_failure_rate: Probability that a render ends as failed
+            video_size: Bytes of every rendered video
+            avatar_count: Avatars listed by /v2/avatars
+            voice_count: Voices listed by /v2/voices
+            seed: Random seed for reproducible runs
+        """
+        self.behaviour = FakeFailure(latency, jitter, failure_rate, rate_limit_rate, seed)
+        self.render_seconds = render_seconds
+        self.render_failure_rate = render_failure_rate
+        self.video_bytes = bytes(range(256)) * (video_size // 256) + bytes(video_size % 256)
+        self.avatars = [
+            {"avatar_id": f"avatar_{i}", "avatar_name": f"Avatar {i}",
+             "preview_image_url": f"https://example.invalid/avatar_{i}.png",
+             "gender": "female" if i % 2 else "male", "type": "avatar",
+             "tags": ["NEW"] if i % 5 == 0 else ["AVATAR_IV"], "default_voice_id": f"voice_{i % voice_count}"}
+            for i in range(avatar_count)
+        ]
+        self.voices = [
+            {"voice_id": f"voice_{i}", "name": f"Voice {i}",
+             "language": "Vietnamese" if i % 3 == 0 else "English", "gender": "female" if i % 2 else "male"}
+            for i in range(voice_count)
+        ]
+
+        self._lock = threading.Lock()
+        self.videos: Dict[str, Dict] = {}          # video_id -> {submitted_at, fails, payload}
+        self.request_counts: Dict[str, int] = {}
+
+        self._server = _QuietHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to HeyGenService"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeHeyGenServer":
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-heygen", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def _video_status(self, video_id: str) -> Optional[Dict]:
+        """Status of a submitted video, advancing with time since submission"""
+        with self._lock:
+            video = self.videos.get(video_id)
+        if video is None:
+            return None
+
+        elapsed = time.time() - video["submitted_at"]
+        data = {"video_id": video_id, "status": "pending", "video_url": None,
+                "thumbnail_url": None, "duration": None, "error": None}
+        if elapsed >= self.render_seconds:
+            if video["fails"]:
+                data.update(status="failed", error="Simulated render failure")
+            else:
+                data.update(status="completed", video_url=f"{self.url}/videos/{video_id}.mp4",
+                            thumbnail_url=f"{self.url}/videos/{video_id}.jpg", duration=30.0)
+        elif elapsed >= self.render_seconds / 4:
+            data["status"] = "processing"
+        return data
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled client connections are reused as with the real API
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, code: int, body: Dict):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _api(self, endpoint: str) -> bool:
+                """Apply latency and injected failures; True if the request may proceed"""
+                server._count(endpoint)
+                server.behaviour.delay()
+                failure = server.behaviour.outcome()
+                if failure == 429:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return False
+                if failure:
+                    self._send_json(failure, {"error": {"message": "Simulated server error"}})
+                    return False
+                return True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/v2/avatars":
+                    if self._api("avatars"):
+                        self._send_json(200, {"error": None, "data": {"avatars": server.avatars}})
+                elif parsed.path == "/v2/voices":
+                    if self._api("voices"):
+                        self._send_json(200, {"error": None, "data": {"voices": server.voices}})
+                elif parsed.path == "/v1/video_status.get":
+                    if self._api("video_status"):
+                        video_id = parse_qs(parsed.query).get("video_id", [""])[0]
+                        data = server._video_status(video_id)
+                        if data is None:
+                            self._send_json(404, {"error": {"message": "Video not found"}})
+                        else:
+                            self._send_json(200, {"code": 100, "data": data})
+                elif parsed.path.startswith("/videos/") and parsed.path.endswith(".mp4"):
+                    server._count("video_download")
+                    self._send_video()
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if urlparse(self.path).path != "/v2/video/generate":
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                if not self._api("video_generate"):
+                    return
+
+                video_id = uuid.uuid4().hex
+                fails = server.behaviour.chance(server.render_failure_rate)
+                with server._lock:
+                    server.videos[video_id] = {
+                        "submitted_at": time.time(),
+                        "fails": fails,
+                        "payload": json.loads(body or b"{}"),
+                    }
+                self._send_json(200, {"error": None, "data": {"video_id": video_id}})
+
+            def _send_video(self):
+                """Serve the video body, honouring single Range requests"""
+                content = server.video_bytes
+                match = RANGE_PATTERN.fullmatch(self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else len(content) - 1, len(content) - 1)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+                    content = content[start:end + 1]
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", '"fake-video"')
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        return Handler
+
+
+# ---------- Gemini ----------
+
+class _FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 failure_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 chunks: int = 5,
+                 chunk_delay: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize fake Gemini model (drop-in for genai.GenerativeModel)
+
+        Args:
+            latency: Delay before the first chunk (seconds)
+            jitter: Extra random delay before the first chunk (seconds)
+            failure_rate: Probability that a call raises a server error
+            rate_limit_rate: Probability that a call raises a quota (429) error
+            chunks: Number of streamed chunks per response
+            chunk_delay: Delay between chunks (seconds)
+            seed: Random seed for reproducible runs
+        """
+        self.behaviour = FakeFailure(latency, jitter, failure_rate, rate_limit_rate, seed)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        """Echo a deterministic text derived from the prompt, streamed in chunks"""
+        with self._lock:
+            self.calls += 1
+        self.behaviour.delay()
+        failure = self.behaviour.outcome()
+        if failure == 429:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        if failure:
+            raise Exception("500 An internal error has occurred.")
+
+        text = f"Nội dung được tạo cho prompt dài {len(prompt)} ký tự. " * 20
+        size = max(1, len(text) // self.chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        if not stream:
+            return _FakeChunk(text)
+        return self._stream(pieces)
+
+    def _stream(self, pieces):
+        for piece in pieces:
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield _FakeChunk(piece)
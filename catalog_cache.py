@@ -0,0 +1,143 @@
+"""
+Catalog Cache
+TTL cache with on-disk snapshots for HeyGen avatar/voice catalogs.
+Stale entries are served immediately while a background refresh runs.
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from config import CACHE_FOLDER, CATALOG_CACHE_TTL
+
+
+class CatalogCache:
+    def __init__(self, cache_folder: str = CACHE_FOLDER, ttl: float = CATALOG_CACHE_TTL):
+        """
+        Initialize catalog cache
+
+        Args:
+            cache_folder: Folder holding the on-disk snapshots
+            ttl: Seconds an entry stays fresh
+        """
+        self.cache_folder = cache_folder
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}   # key -> {"fetched_at": float, "items": list}
+        self._refreshing: set = set()
+        self.last_error: Optional[str] = None
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+
+    def _snapshot_path(self, key: str) -> str:
+        """Path of the on-disk snapshot for a key"""
+        return os.path.join(self.cache_folder, f"catalog_{key}.json")
+
+    def _load_snapshot(self, key: str) -> Optional[Dict]:
+        """Load a snapshot from disk, ignoring missing or corrupt files"""
+        try:
+            with open(self._snapshot_path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if isinstance(entry.get("items"), list) and "fetched_at" in entry:
+                return entry
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _save_snapshot(self, key: str, entry: Dict):
+        """Write a compact snapshot atomically"""
+        path = self._snapshot_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _fetch(self, key: str, fetcher: Callable[[], List[Dict]]) -> List[Dict]:
+        """Fetch fresh items and store them in memory and on disk"""
+        items = fetcher()
+        entry = {"fetched_at": time.time(), "items": items}
+        with self._lock:
+            self._entries[key] = entry
+        self._save_snapshot(key, entry)
+        return items
+
+    def _refresh_in_background(self, key: str, fetcher: Callable[[], List[Dict]]):
+        """Start a background refresh unless one is already running for the key"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def worker():
+            try:
+                self._fetch(key, fetcher)
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the stale entry; the next read retries
+                self.last_error = str(e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=worker, name=f"catalog-refresh-{key}", daemon=True).start()
+
+    def get(self, key: str, fetcher: Callable[[], List[Dict]], force_refresh: bool = False) -> List[Dict]:
+        """
+        Get catalog items, fetching only when nothing is cached
+
+        Args:
+            key: Catalog name (e.g. "avatars")
+            fetcher: Function returning fresh items from the API
+            force_refresh: Fetch synchronously even if a cached entry exists
+
+        Returns:
+            List of catalog items
+        """
+        if force_refresh:
+            return self._fetch(key, fetcher)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            entry = self._load_snapshot(key)
+            if entry is None:
+                return self._fetch(key, fetcher)
+            with self._lock:
+                self._entries.setdefault(key, entry)
+
+        # Stale-while-revalidate
+        if time.time() - entry["fetched_at"] > self.ttl:
+            self._refresh_in_background(key, fetcher)
+
+        return entry["items"]
+
+    def invalidate(self, key: Optional[str] = None):
+        """
+        Drop cached entries (memory and disk)
+
+        Args:
+            key: Catalog to drop, or None for all
+        """
+        with self._lock:
+            if key:
+                keys = [key]
+            else:
+                keys = set(self._entries.keys())
+                keys.update(
+                    name[len("catalog_"):-len(".json")]
+                    for name in os.listdir(self.cache_folder)
+                    if name.startswith("catalog_") and name.endswith(".json")
+                )
+            for k in keys:
+                self._entries.pop(k, None)
+        for k in keys:
+            try:
+                os.remove(self._snapshot_path(k))
+            except OSError:
+                pass
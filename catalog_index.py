@@ -0,0 +1,178 @@
+"""
+Catalog Index
+In-memory index over HeyGen avatar/voice catalogs: diacritic-insensitive
+name search (token prefixes), facet filters (gender, language, style) and
+cursor-based pagination, so the UI can browse thousands of entries while
+rendering one page at a time
+"""
+import bisect
+import json
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from script_search import TOKEN_PATTERN, fold_text, query_tokens
+
+DEFAULT_FACETS = ("gender", "language", "style")
+
+SortKey = Tuple[str, str]
+
+
+def _fold(value) -> str:
+    """Folded form of a facet value or name"""
+    return fold_text(unicodedata.normalize("NFC", str(value))).strip()
+
+
+class CatalogIndex:
+    def __init__(self, items: Iterable[Dict], facets: Sequence[str] = DEFAULT_FACETS):
+        """
+        Build the index
+
+        Args:
+            items: Catalog entries with at least id and name (as returned by get_avatars/get_voices)
+            facets: Fields usable as filters; list values (e.g. tags) index every member
+        """
+        self.facets = tuple(facets)
+
+        # Items are kept in name order; a position in self.items is the document id
+        keyed = sorted(((_fold(item.get("name") or ""), str(item.get("id") or "")), item) for item in items)
+        self._keys: List[SortKey] = [key for key, _ in keyed]
+        self.items: List[Dict] = [item for _, item in keyed]
+        self._positions = {item.get("id"): position for position, item in enumerate(self.items)}
+
+        self._postings: Dict[str, Set[int]] = {}
+        self._facet_postings: Dict[str, Dict[str, Set[int]]] = {facet: {} for facet in self.facets}
+        self._facet_labels: Dict[str, Dict[str, str]] = {facet: {} for facet in self.facets}
+        for position, item in enumerate(self.items):
+            for token in set(TOKEN_PATTERN.findall(self._keys[position][0])):
+                self._postings.setdefault(token, set()).add(position)
+            for facet in self.facets:
+                values = item.get(facet)
+                if values is None or values == "":
+                    continue
+                for value in values if isinstance(values, (list, tuple)) else [values]:
+                    folded = _fold(value)
+                    self._facet_postings[facet].setdefault(folded, set()).add(position)
+                    self._facet_labels[facet].setdefault(folded, str(value))
+        # Sorted vocabulary for prefix lookups ("ann" finds "anna", "annie")
+        self._vocabulary = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, item_id: str) -> Optional[Dict]:
+        """Entry with the given id, or None"""
+        position = self._positions.get(item_id)
+        return self.items[position] if position is not None else None
+
+    def facet_values(self, facet: str) -> List[Tuple[str, int]]:
+        """
+        Values of a facet with their entry counts
+
+        Returns:
+            List of (value, count), most common first
+        """
+        postings = self._facet_postings.get(facet, {})
+        labels = self._facet_labels.get(facet, {})
+        return sorted(((labels[value], len(positions)) for value, positions in postings.items()),
+                      key=lambda pair: (-pair[1], pair[0]))
+
+    # ---------- Matching ----------
+
+    def _token_matches(self, prefix: str) -> Set[int]:
+        """Positions of entries with a name token starting with prefix"""
+        matches: Set[int] = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches |= self._postings[token]
+        return matches
+
+    def match(self, query: str = "", filters: Optional[Dict[str, Optional[str]]] = None) -> List[int]:
+        """
+        Positions (in name order) of entries matching a search query and facet filters
+
+        Args:
+            query: Words that must all prefix a name token (accents and case ignored)
+            filters: Facet -> required value (None or "" means any)
+
+        Returns:
+            Sorted list of positions
+        """
+        candidates: Optional[Set[int]] = None
+        for facet, value in (filters or {}).items():
+            if value is None or value == "":
+                continue
+            if facet not in self._facet_postings:
+                raise ValueError(f"Không thể lọc theo '{facet}'")
+            positions = self._facet_postings[facet].get(_fold(value), set())
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return []
+
+        # Rarest token first keeps the intersections small
+        token_sets = sorted((self._token_matches(token) for token in query_tokens(query)), key=len)
+        for positions in token_sets:
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return []
+
+        if candidates is None:
+            return list(range(len(self.items)))
+        return sorted(candidates)
+
+    # ---------- Pagination ----------
+
+    @staticmethod
+    def encode_cursor(key: SortKey) -> str:
+        """Opaque cursor pointing just after an entry"""
+        return json.dumps(list(key), ensure_ascii=False)
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> SortKey:
+        """Sort key stored in a cursor"""
+        try:
+            name, item_id = json.loads(cursor)
+            return str(name), str(item_id)
+        except (TypeError, ValueError):
+            raise ValueError("Cursor không hợp lệ")
+
+    def page(self,
+             query: str = "",
+             filters: Optional[Dict[str, Optional[str]]] = None,
+             cursor: Optional[str] = None,
+             limit: int = 12) -> Dict:
+        """
+        One page of matching entries in name order
+
+        The cursor holds the sort key of the last entry shown, so pages stay
+        consistent when the catalog is refreshed between two requests.
+
+        Args:
+            query: Search words (see match)
+            filters: Facet filters (see match)
+            cursor: next_cursor of the previous page, or None for the first page
+            limit: Entries per page
+
+        Returns:
+            Dictionary with items, total (all matches) and next_cursor (None on the last page)
+        """
+        positions = self.match(query, filters)
+        start = self._first_after(positions, self.decode_cursor(cursor)) if cursor else 0
+        selected = positions[start:start + limit]
+        has_more = start + limit < len(positions)
+        return {
+            "items": [self.items[position] for position in selected],
+            "total": len(positions),
+            "next_cursor": self.encode_cursor(self._keys[selected[-1]]) if selected and has_more else None,
+        }
+
+    def _first_after(self, positions: List[int], after: SortKey) -> int:
+        """Index in positions of the first entry sorting after the given key"""
+        low, high = 0, len(positions)
+        while low < high:
+            middle = (low + high) // 2
+            if self._keys[positions[middle]] <= after:
+                low = middle + 1
+            else:
+                high = middle
+        return low
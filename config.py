@@ -2,10 +2,14 @@
 Configuration file for API keys and settings
 """
 import os
+import sys
 
 # Try to load from Streamlit secrets first (for Streamlit Cloud)
 # Fall back to environment variables (for local development)
 try:
+    if "streamlit" not in sys.modules:
+        # Headless entry points (CLI, batch) skip the slow Streamlit import
+        raise ImportError("Not running under Streamlit")
     import streamlit as st
     GOOGLE_API_KEY = st.secrets.get("GOOGLE_API_KEY", os.getenv("GOOGLE_API_KEY"))
     HEYGEN_API_KEY = st.secrets.get("HEYGEN_API_KEY", os.getenv("HEYGEN_API_KEY"))
@@ -31,4 +35,116 @@ SCRIPT_FOLDER = "Script Folder"
 SUPPORTED_FILE_FORMATS = [".docx", ".txt"]
 
 # Video Configuration
-VIDEO_POLL_INTERVAL = 10  # seconds
+VIDEO_POLL_INTERVAL = 10  # seconds between refreshes of the Preview tab status section
+
+# HTTP Transport Configuration
+HTTP_POOL_SIZE = 10          # Max pooled keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = 5     # seconds
+HTTP_READ_TIMEOUT = 30       # seconds
+HTTP_MAX_RETRIES = 3         # Retries for idempotent requests (GET/HEAD)
+HTTP_RETRY_BACKOFF = 0.5     # Backoff factor between retries (seconds)
+
+# Cache Configuration
+CACHE_FOLDER = ".cache"
+CATALOG_CACHE_TTL = 3600     # seconds before avatar/voice catalogs are refreshed
+
+# Avatar Thumbnail Configuration
+THUMBNAIL_SIZE = (320, 320)        # max width/height of grid thumbnails (pixels)
+THUMBNAIL_QUALITY = 85             # JPEG quality of stored thumbnails
+THUMBNAIL_MEMORY_ENTRIES = 200     # thumbnails kept in memory
+THUMBNAIL_MAX_DISK_MB = 30         # size bound of the on-disk tier
+THUMBNAIL_FETCH_WORKERS = 6        # concurrent preview downloads for the page on screen
+THUMBNAIL_PREFETCH_WORKERS = 2     # concurrent background downloads of the next page
+THUMBNAIL_RETRY_AFTER = 300        # seconds before a failed preview is downloaded again
+AVATAR_PAGE_SIZE = 12              # avatars per grid page
+VOICE_OPTIONS_LIMIT = 100          # matching voices listed in the voice picker
+
+# Adaptive Concurrency Configuration (AIMD limit of calls in flight per API)
+HEYGEN_CONCURRENCY = (4, 1, 16)     # initial, min, max concurrent HeyGen API calls
+HEYGEN_LATENCY_TARGET = 3.0         # seconds; slower API responses count as congestion
+GEMINI_CONCURRENCY = (2, 1, 8)      # initial, min, max concurrent Gemini generations
+GEMINI_LATENCY_TARGET = 15.0        # seconds to the first streamed chunk
+CONCURRENCY_BACKOFF_FACTOR = 0.5    # limit multiplier on 429 / 5xx / slow responses
+CONCURRENCY_ACQUIRE_TIMEOUT = 60    # seconds a call may wait for a free slot
+RETRY_MAX_ATTEMPTS = 3              # retries after a 429 (and Gemini 5xx before any output)
+RETRY_BASE_DELAY = 1.0              # seconds before the first retry, doubled each time (jittered)
+RETRY_MAX_DELAY = 30.0              # cap of one retry delay
+CIRCUIT_FAILURE_THRESHOLD = 5       # consecutive 5xx/connection failures that open the circuit
+CIRCUIT_OPEN_SECONDS = 30           # seconds calls fail fast before a probe is let through
+
+# Status Poller Configuration
+VIDEO_POLL_MIN_INTERVAL = 5      # seconds, fastest poll rate (near expected finish)
+VIDEO_POLL_MAX_INTERVAL = 60     # seconds, slowest poll rate (early or long overdue)
+EXPECTED_RENDER_SECONDS = 180    # typical render time used to schedule polls
+STATUS_POLL_WORKERS = 4          # concurrent status requests per poll batch
+
+# Webhook Configuration (optional - polling is used when disabled)
+WEBHOOK_ENABLED = os.getenv("HEYGEN_WEBHOOK_ENABLED", "false").lower() == "true"
+WEBHOOK_HOST = os.getenv("HEYGEN_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("HEYGEN_WEBHOOK_PORT", "8765"))
+WEBHOOK_PATH = "/heygen/webhook"
+WEBHOOK_PUBLIC_URL = os.getenv("HEYGEN_WEBHOOK_PUBLIC_URL")  # URL HeyGen can reach, if behind a proxy
+WEBHOOK_SECRET = os.getenv("HEYGEN_WEBHOOK_SECRET")
+WEBHOOK_FALLBACK_POLL_INTERVAL = 120  # seconds, slow safety-net polling while webhooks are active
+
+# Download Configuration
+DOWNLOAD_SEGMENT_SIZE = 8 * 1024 * 1024   # bytes per concurrent Range segment
+DOWNLOAD_WORKERS = 4                      # concurrent segment downloads
+DOWNLOAD_RETRIES = 3                      # retries per segment after a dropped connection
+
+# Gemini Response Cache Configuration
+GEMINI_CACHE_MEMORY_ENTRIES = 128   # responses kept in the in-memory LRU tier
+GEMINI_CACHE_MAX_DISK_MB = 50       # size bound of the on-disk tier
+
+# Rate Limiter Configuration
+# SQLite file shared by every process using the same API key (None = per-process only)
+RATE_LIMIT_STATE_PATH = os.path.join(CACHE_FOLDER, "rate_limits.db")
+
+# Batch Processing Configuration
+BATCH_MAX_WORKERS = 4          # files processed concurrently
+BATCH_RATE_LIMIT_WAIT = 600    # seconds a batch call may wait for a rate limit slot
+BATCH_MANIFEST_PATH = os.path.join(CACHE_FOLDER, "batch_outputs.json")   # scripts written by batch runs
+
+# Scene Splitting Configuration
+HEYGEN_MAX_INPUT_CHARS = 5000   # HeyGen limit for one video_inputs[].voice.input_text
+SCENE_MAX_CHARS = 1500          # target upper bound per scene when splitting for parallel renders
+SCENE_RENDER_WORKERS = 4        # scenes submitted concurrently in parallel mode
+SCENE_STABLE_MIN_CHARS = 400    # scenes split for the scene cache end at a boundary sentence after this many chars
+SCENE_STABLE_CUT_EVERY = 3      # about one sentence in this many is a boundary
+SCENE_CACHE_MAX_DISK_MB = 2048  # size bound of the rendered scene clips cache
+
+# Script Index Configuration
+SCRIPT_INDEX_PATH = os.path.join(CACHE_FOLDER, "scripts.db")
+SCRIPT_INDEX_RESCAN_INTERVAL = 300   # seconds between full mtime reconciliations
+
+# Full-text Search Configuration
+SEARCH_INDEX_PATH = os.path.join(CACHE_FOLDER, "search.db")
+
+# Pipeline CLI Configuration
+PIPELINE_OUTPUT_FOLDER = "Videos"   # downloaded videos
+PIPELINE_QUEUE_SIZE = 4             # items buffered between two stages
+PIPELINE_PROCESS_WORKERS = 2        # concurrent Gemini calls
+PIPELINE_RENDER_WORKERS = 4         # scripts handed to the render scheduler at the same time
+PIPELINE_DOWNLOAD_WORKERS = 2       # concurrent video downloads
+PIPELINE_RENDER_TIMEOUT = 1800      # seconds to wait for one render
+
+# Render Scheduler Configuration
+RENDER_MAX_CONCURRENT = int(os.getenv("HEYGEN_MAX_CONCURRENT_RENDERS", "3"))   # videos rendering at once (plan cap)
+RENDER_SUBMIT_WORKERS = 2                           # concurrent create_video calls
+RENDER_PRIORITIES = ("urgent", "normal", "bulk")    # priority classes, most urgent first
+RENDER_SLOT_TIMEOUT = PIPELINE_RENDER_TIMEOUT       # seconds before a render that never finished frees its slot
+RENDER_TICKET_RETENTION = 3600                      # seconds finished tickets stay queryable
+RENDER_SYNC_INTERVAL = 5                            # seconds between checks for renders started or finished by other processes
+RENDER_PIPELINE_USER = "pipeline"                  # user the pipeline CLI queues its renders as
+
+# Job Store Configuration
+JOB_STORE_PATH = os.path.join(CACHE_FOLDER, "jobs.db")   # durable record of every submitted video
+JOB_STORE_MEMORY_SIZE = 1000     # statuses kept in memory; older ones are re-read from the database
+JOB_STORE_REFRESH_INTERVAL = VIDEO_POLL_MIN_INTERVAL   # seconds before an unfinished status is re-read (other processes may have changed it)
+JOB_RESUME_MAX_AGE = 48 * 3600   # unfinished jobs younger than this are monitored again on startup
+
+# Metrics Configuration
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))   # Prometheus /metrics endpoint (0 = disabled)
+METRICS_MAX_TRACES = 200            # most recent video journeys kept for the admin panel
+METRICS_MAX_SPANS_PER_TRACE = 500   # spans kept per journey (status polls add up)
@@ -0,0 +1,112 @@
+"""
+Docx Reader
+Streaming text extraction for .docx files: iterparses word/document.xml
+straight from the zip instead of building a python-docx object tree
+"""
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import IO, Iterator, Union
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCUMENT_PART = "word/document.xml"
+
+P = WORD_NS + "p"
+R = WORD_NS + "r"
+HYPERLINK = WORD_NS + "hyperlink"
+T = WORD_NS + "t"
+BR = WORD_NS + "br"
+TYPE = WORD_NS + "type"
+
+# Run children and their text, as python-docx renders Run.text (w:br handled separately)
+RUN_TEXT = {
+    WORD_NS + "tab": "\t",
+    WORD_NS + "ptab": "\t",
+    WORD_NS + "cr": "\n",
+    WORD_NS + "noBreakHyphen": "-",
+}
+
+# Depth of the body's children: w:document > w:body > w:p
+BLOCK_DEPTH = 3
+
+
+def _run_text(run: ET.Element) -> str:
+    """Text of one w:r element"""
+    parts = []
+    for child in run:
+        if child.tag == T:
+            parts.append(child.text or "")
+        elif child.tag == BR:
+            # Line breaks only; page and column breaks have no text
+            if child.get(TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in RUN_TEXT:
+            parts.append(RUN_TEXT[child.tag])
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    """Text of one w:p element (runs and hyperlinks, like python-docx Paragraph.text)"""
+    parts = []
+    for child in paragraph:
+        if child.tag == R:
+            parts.append(_run_text(child))
+        elif child.tag == HYPERLINK:
+            parts.extend(_run_text(run) for run in child if run.tag == R)
+    return "".join(parts)
+
+
+def iter_paragraphs(source: Union[str, IO[bytes]]) -> Iterator[str]:
+    """
+    Yield the text of each body paragraph in document order
+
+    Only top-level paragraphs are returned (tables, headers and footers are
+    skipped, as with python-docx Document.paragraphs). Each body element is
+    dropped once read, so memory stays flat however long the document is.
+
+    Args:
+        source: Path or binary file object of a .docx file
+    """
+    with zipfile.ZipFile(source) as archive, archive.open(DOCUMENT_PART) as document:
+        depth = 0
+        body = None
+        for event, element in ET.iterparse(document, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == BLOCK_DEPTH - 1:
+                    body = element
+                continue
+
+            if depth == BLOCK_DEPTH:
+                if element.tag == P:
+                    yield _paragraph_text(element)
+                body.remove(element)
+            depth -= 1
+
+
+def read_docx_text(source: Union[str, IO[bytes]]) -> str:
+    """
+    Extract the text of a .docx file
+
+    Non-empty paragraphs joined with blank lines. Falls back to python-docx
+    if the fast path cannot read the file.
+
+    Args:
+        source: Path or binary file object of a .docx file
+
+    Returns:
+        Document text
+    """
+    try:
+        return '\n\n'.join(text for text in iter_paragraphs(source) if text.strip())
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return _read_docx_fallback(source)
+
+
+def _read_docx_fallback(source: Union[str, IO[bytes]]) -> str:
+    """Extract text with python-docx (slower, builds the whole document tree)"""
+    from docx import Document
+
+    doc = Document(source)
+    return '\n\n'.join(paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip())
@@ -3,10 +3,13 @@ File Service
 Handles file operations for scripts (.docx and .txt)
 """
 import os
-from docx import Document
 from datetime import datetime
 from typing import Optional
 from config import SCRIPT_FOLDER, SUPPORTED_FILE_FORMATS
+from docx_reader import read_docx_text
+from script_index import ScriptIndex
+from script_search import ScriptSearchIndex
+from metrics import registry
 
 class FileService:
     def __init__(self):
@@ -16,6 +19,10 @@ class FileService:
         # Create Script Folder if it doesn't exist
         if not os.path.exists(self.script_folder):
             os.makedirs(self.script_folder)
+        
+        # Metadata index so listings do not scan the folder on every rerun
+        self.index = ScriptIndex(self.script_folder)
+        self.search_index = ScriptSearchIndex()
     
     def read_file(self, file_path: str) -> str:
         """
@@ -33,10 +40,12 @@ class FileService:
             raise ValueError(f"Định dạng file không được hỗ trợ. Chỉ hỗ trợ: {', '.join(SUPPORTED_FILE_FORMATS)}")
         
         try:
-            if file_ext == '.txt':
-                return self._read_txt(file_path)
-            elif file_ext == '.docx':
-                return self._read_docx(file_path)
+            with registry.span("file.read", format=file_ext.lstrip('.')) as span:
+                span.add_bytes(received=os.path.getsize(file_path))
+                if file_ext == '.txt':
+                    return self._read_txt(file_path)
+                elif file_ext == '.docx':
+                    return self._read_docx(file_path)
         except Exception as e:
             raise Exception(f"Lỗi khi đọc file: {str(e)}")
     
@@ -47,14 +56,7 @@ class FileService:
     
     def _read_docx(self, file_path: str) -> str:
         """Read .docx file"""
-        doc = Document(file_path)
-        content = []
-        
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                content.append(paragraph.text)
-        
-        return '\n\n'.join(content)
+        return read_docx_text(file_path)
     
     def read_uploaded_file(self, uploaded_file) -> str:
         """
@@ -73,15 +75,12 @@ class FileService:
             raise ValueError(f"Định dạng file không được hỗ trợ. Chỉ hỗ trợ: {', '.join(SUPPORTED_FILE_FORMATS)}")
         
         try:
-            if file_ext == '.txt':
-                return uploaded_file.read().decode('utf-8')
-            elif file_ext == '.docx':
-                doc = Document(uploaded_file)
-                content = []
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():
-                        content.append(paragraph.text)
-                return '\n\n'.join(content)
+            with registry.span("file.read_upload", format=file_ext.lstrip('.')) as span:
+                span.add_bytes(received=getattr(uploaded_file, 'size', 0) or 0)
+                if file_ext == '.txt':
+                    return uploaded_file.read().decode('utf-8')
+                elif file_ext == '.docx':
+                    return read_docx_text(uploaded_file)
         except Exception as e:
             raise Exception(f"Lỗi khi đọc file upload: {str(e)}")
     
@@ -112,11 +111,15 @@ class FileService:
         file_path = os.path.join(self.script_folder, f"{filename}.{format}")
         
         try:
-            if format == 'txt':
-                self._save_txt(file_path, content)
-            elif format == 'docx':
-                self._save_docx(file_path, content)
+            with registry.span("file.save", format=format) as span:
+                if format == 'txt':
+                    self._save_txt(file_path, content)
+                elif format == 'docx':
+                    self._save_docx(file_path, content)
+                span.add_bytes(sent=os.path.getsize(file_path))
             
+            self.index.upsert(file_path)
+            self.search_index.add(file_path, content)
             return file_path
         except Exception as e:
             raise Exception(f"Lỗi khi lưu script: {str(e)}")
@@ -128,6 +131,8 @@ class FileService:
     
     def _save_docx(self, file_path: str, content: str):
         """Save content as .docx file"""
+        from docx import Document
+        
         doc = Document()
         
         # Split content into paragraphs
@@ -139,19 +144,38 @@ class FileService:
         
         doc.save(file_path)
     
-    def list_scripts(self) -> list:
+    def list_scripts(self,
+                     folder: Optional[str] = None,
+                     limit: Optional[int] = None,
+                     offset: int = 0,
+                     name_contains: Optional[str] = None,
+                     format: Optional[str] = None,
+                     min_size: Optional[int] = None,
+                     max_size: Optional[int] = None) -> list:
         """
-        List all saved scripts in Script Folder
+        List saved scripts in Script Folder, newest first
         
+        Args:
+            folder: Optional folder to list instead of Script Folder (scanned directly)
+            limit: Maximum number of scripts to return (None for all)
+            offset: Number of scripts to skip (for pagination)
+            name_contains: Only names containing this text
+            format: Only this format ('txt' or 'docx')
+            min_size: Minimum file size in bytes
+            max_size: Maximum file size in bytes
+            
         Returns:
             List of script filenames
         """
         try:
+            if folder is None or os.path.abspath(folder) == os.path.abspath(self.script_folder):
+                return self.index.query(limit, offset, name_contains, format, min_size, max_size)
+            
             files = []
-            for file in os.listdir(self.script_folder):
+            for file in os.listdir(folder):
                 file_ext = os.path.splitext(file)[1].lower()
                 if file_ext in SUPPORTED_FILE_FORMATS:
-                    file_path = os.path.join(self.script_folder, file)
+                    file_path = os.path.join(folder, file)
                     file_stat = os.stat(file_path)
                     files.append({
                         'name': file,
@@ -162,10 +186,41 @@ class FileService:
             
             # Sort by modified date (newest first)
             files.sort(key=lambda x: x['modified'], reverse=True)
-            return files
+            end = offset + limit if limit is not None else None
+            return files[offset:end]
         except Exception as e:
             raise Exception(f"Lỗi khi liệt kê scripts: {str(e)}")
     
+    def count_scripts(self, **filters) -> int:
+        """
+        Count scripts in Script Folder matching the list_scripts filters
+        
+        Returns:
+            Number of matching scripts
+        """
+        return self.index.count(**filters)
+    
+    def search_scripts(self, query: str, limit: int = 10) -> list:
+        """
+        Full-text search over saved scripts (diacritic-insensitive)
+        
+        Args:
+            query: Search text, e.g. "giao duc" also matches "giáo dục"
+            limit: Maximum number of results
+            
+        Returns:
+            List of dictionaries with name, path, score, snippet (Markdown)
+        """
+        try:
+            # Index anything added or edited outside save_script/delete_script; the
+            # signature only changes when the folder scan found such a change
+            signature = self.index.signature()
+            if not self.search_index.is_current(signature):
+                self.search_index.sync(self.list_scripts(), self.read_file, signature=signature)
+            return self.search_index.search(query, limit)
+        except Exception as e:
+            raise Exception(f"Lỗi khi tìm kiếm scripts: {str(e)}")
+    
     def delete_script(self, file_path: str) -> bool:
         """
         Delete a script file
@@ -179,6 +234,8 @@ class FileService:
         try:
             if os.path.exists(file_path):
                 os.remove(file_path)
+                self.index.remove(file_path)
+                self.search_index.remove(file_path)
                 return True
             return False
         except Exception as e:
@@ -1,93 +1,236 @@
 """
 Google Gemini AI Service
 Handles content generation using Google Gemini API
-Version: 1.2 - Added rate limiting to prevent API abuse
+Version: 1.8 - Adaptive concurrency with retries and circuit breaker
 """
-import google.generativeai as genai
-from config import GOOGLE_API_KEY, GEMINI_MODEL
-import streamlit as st
+import threading
 import time
-from datetime import datetime, timedelta
+from typing import Iterator, Optional
+from config import GOOGLE_API_KEY, GEMINI_MODEL, GEMINI_CONCURRENCY, GEMINI_LATENCY_TARGET
+from response_cache import ResponseCache
+from rate_limiter import get_rate_limiter
+from metrics import registry
+from single_flight import SingleFlight
+from adaptive_concurrency import AdaptiveConcurrency, OK, THROTTLED, classify_error
 
 # Rate limiting configuration
 MAX_CALLS_PER_MINUTE = 5  # Maximum API calls per minute
 COOLDOWN_SECONDS = 60     # Cooldown period in seconds
+MAX_WAIT_SECONDS = 15     # How long a call may wait for a free slot before failing
 
 class GeminiService:
-    def __init__(self):
-        """Initialize Gemini AI service"""
-        if not GOOGLE_API_KEY:
+    def __init__(self, model=None, rate_limiter=None, response_cache: Optional[ResponseCache] = None,
+                 concurrency: Optional[AdaptiveConcurrency] = None):
+        """
+        Initialize Gemini AI service
+        
+        Args:
+            model: Optional model object with generate_content (e.g. an offline stand-in);
+                   a Gemini model is created on first use if not provided
+            rate_limiter: Optional TokenBucket (the shared per-key bucket if not provided)
+            response_cache: Optional response cache (created if not provided)
+            concurrency: Optional adaptive limit of concurrent generations (created if not provided)
+        """
+        if model is None and not GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
         
-        genai.configure(api_key=GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        # The SDK is slow to import; it is loaded on the first generation call
+        self._model = model
+        self._model_lock = threading.Lock()
+        self.response_cache = response_cache or ResponseCache()
         
-        # Initialize rate limiting in session state
-        if 'api_call_times' not in st.session_state:
-            st.session_state.api_call_times = []
-        if 'total_api_calls' not in st.session_state:
-            st.session_state.total_api_calls = 0
-    
-    def _check_rate_limit(self) -> tuple[bool, str]:
-        """
-        Check if API call is allowed based on rate limiting
+        # One bucket per API key, shared by every session (and process)
+        self.rate_limiter = rate_limiter or get_rate_limiter(
+            GOOGLE_API_KEY or "offline", MAX_CALLS_PER_MINUTE, COOLDOWN_SECONDS
+        )
         
-        Returns:
-            Tuple of (is_allowed, message)
-        """
-        now = datetime.now()
+        # Concurrent generations adapt to 429s and latency; the bucket above caps the rate
+        self.concurrency = concurrency or AdaptiveConcurrency("Gemini API", *GEMINI_CONCURRENCY,
+                                                              latency_target=GEMINI_LATENCY_TARGET)
         
-        # Remove calls older than 1 minute
-        st.session_state.api_call_times = [
-            t for t in st.session_state.api_call_times 
-            if now - t < timedelta(seconds=COOLDOWN_SECONDS)
-        ]
+        # Identical cacheable requests in flight at the same time share one model call
+        self.flights = SingleFlight("gemini")
         
-        # Check rate limit
-        if len(st.session_state.api_call_times) >= MAX_CALLS_PER_MINUTE:
-            oldest_call = min(st.session_state.api_call_times)
-            wait_time = COOLDOWN_SECONDS - (now - oldest_call).seconds
-            return False, f"⏳ Đã đạt giới hạn {MAX_CALLS_PER_MINUTE} lần/phút. Vui lòng đợi {wait_time} giây."
+        self._stats_lock = threading.Lock()
+        self.total_api_calls = 0
+        self.cache_hits = 0
+    
+    @property
+    def model(self):
+        """Gemini model, created on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=GOOGLE_API_KEY)
+                    self._model = genai.GenerativeModel(GEMINI_MODEL)
+        return self._model
+    
+    def _acquire_rate_limit(self, max_wait: float = MAX_WAIT_SECONDS):
+        """
+        Wait (up to max_wait seconds) for a rate limit slot
         
-        return True, ""
+        Raises:
+            Exception if no slot frees up before the deadline
+        """
+        acquired, wait_time = self.rate_limiter.acquire(timeout=max_wait)
+        if not acquired:
+            raise Exception(f"⏳ Đã đạt giới hạn {MAX_CALLS_PER_MINUTE} lần/phút. Vui lòng đợi {int(wait_time) + 1} giây.")
     
     def _record_api_call(self):
-        """Record an API call for rate limiting"""
-        st.session_state.api_call_times.append(datetime.now())
-        st.session_state.total_api_calls += 1
+        """Record an API call for usage statistics"""
+        with self._stats_lock:
+            self.total_api_calls += 1
     
     def get_usage_stats(self) -> dict:
-        """Get API usage statistics"""
-        now = datetime.now()
-        recent_calls = len([
-            t for t in st.session_state.api_call_times 
-            if now - t < timedelta(seconds=COOLDOWN_SECONDS)
-        ])
+        """Get API usage statistics (shared by all sessions using this API key)"""
+        available = int(self.rate_limiter.available())
         return {
-            "calls_this_minute": recent_calls,
+            "calls_this_minute": MAX_CALLS_PER_MINUTE - available,
             "max_per_minute": MAX_CALLS_PER_MINUTE,
-            "remaining": MAX_CALLS_PER_MINUTE - recent_calls,
-            "total_calls": st.session_state.total_api_calls
+            "remaining": available,
+            "wait_seconds": self.rate_limiter.wait_time(),
+            "total_calls": self.total_api_calls,
+            "cache_hits": self.cache_hits,
+            "shared_calls": self.flights.shared,
+            "concurrency": self.concurrency.snapshot()
         }
     
-    def generate_educational_content(self, script_prompt: str) -> str:
+    def _generate_stream(self, operation: str, prompt: str, error_message: str,
+                         use_cache: bool = True, params: dict = None,
+                         max_wait: float = MAX_WAIT_SECONDS) -> Iterator[str]:
         """
-        Generate educational content from script prompt
+        Stream generated text chunks, serving repeated requests from the response cache
         
         Args:
-            script_prompt: The input script/prompt to process
+            operation: Operation name used in the cache key
+            prompt: Full prompt sent to the model
+            error_message: Prefix of the error raised on failure
+            use_cache: Set False to force a fresh variant (the result still refreshes the cache)
+            params: Generation parameters that affect the output
+            max_wait: Seconds to wait for a rate limit slot before failing
             
-        Returns:
-            Generated educational content as string
+        Yields:
+            Text chunks as they arrive (a cache hit yields the whole text at once)
         """
-        # Check rate limit first
-        is_allowed, message = self._check_rate_limit()
-        if not is_allowed:
-            raise Exception(message)
-        
+        span = registry.start_span(f"gemini.{operation}")
+        received = 0
         try:
-            # Embed system instruction in prompt for compatibility
-            full_prompt = f"""Bạn là một chuyên gia tạo nội dung giáo dục.
+            for chunk in self._generate_chunks(span, operation, prompt, error_message, use_cache, params, max_wait):
+                if not received:
+                    span.set(first_chunk_ms=round(span.elapsed() * 1000, 1))
+                received += len(chunk.encode('utf-8'))
+                yield chunk
+        except GeneratorExit:
+            # The caller stopped reading early
+            span.set(cancelled=True)
+            span.finish()
+            raise
+        except BaseException as e:
+            span.finish(e)
+            raise
+        span.add_bytes(received=received, sent=len(prompt.encode('utf-8')))
+        span.finish()
+    
+    def _generate_chunks(self, span, operation: str, prompt: str, error_message: str,
+                         use_cache: bool, params: dict, max_wait: float) -> Iterator[str]:
+        """Chunks from the cache or the model (see _generate_stream)"""
+        cache_key = ResponseCache.make_key(GEMINI_MODEL, operation, prompt, params)
+        if use_cache:
+            cached = self.response_cache.get(cache_key)
+            # An empty entry (written before empty responses were rejected) is a miss
+            if cached:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                span.set(cache="hit")
+                yield cached
+                return
+        span.set(cache="miss")
+        
+        if use_cache:
+            # Same prompt already being generated for another caller: stream its output
+            yield from self.flights.stream(cache_key, lambda: self._call_model(prompt, error_message, cache_key, max_wait))
+        else:
+            # A fresh variant was asked for, so it is never shared
+            yield from self._call_model(prompt, error_message, cache_key, max_wait)
+    
+    def _call_model(self, prompt: str, error_message: str, cache_key: str, max_wait: float) -> Iterator[str]:
+        """
+        Stream chunks from the model within the adaptive concurrency limit and cache the complete response
+        
+        Rate limited (429) and server errors are retried with jittered backoff as
+        long as nothing has been streamed yet.
+        """
+        chunks = []
+        attempt = 0
+        while True:
+            # Every attempt is a billed API call. Take the rate limit token only once a
+            # concurrency slot is held (and the circuit is closed), so an outage or a
+            # slot timeout does not burn quota without calling the API
+            probe = self.concurrency.acquire(max_wait)
+            try:
+                self._acquire_rate_limit(max_wait)
+            except BaseException:
+                self.concurrency.cancel(probe)
+                raise
+            start = time.perf_counter()
+            first_chunk_latency = None
+            outcome, retry_after, error = OK, None, None
+            try:
+                # Record API call
+                self._record_api_call()
+                
+                response = self.model.generate_content(prompt, stream=True)
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. safety metadata only)
+                        continue
+                    if text:
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.perf_counter() - start
+                        chunks.append(text)
+                        yield text
+            except Exception as e:
+                error = e
+                outcome, retry_after = classify_error(e)
+            finally:
+                # Also runs when the caller stops reading early
+                self.concurrency.release(outcome, first_chunk_latency or time.perf_counter() - start, probe)
+            
+            if error is None:
+                break
+            if outcome != OK and not chunks and attempt < self.concurrency.max_retries:
+                self.concurrency.wait_before_retry(attempt, retry_after)
+                attempt += 1
+                continue
+            if outcome == THROTTLED:
+                raise Exception(f"🚫 Google API rate limit đã đạt. Vui lòng đợi vài phút và thử lại.")
+            raise Exception(f"{error_message}: {str(error)}")
+        
+        if not chunks:
+            # e.g. every chunk blocked by the safety filters
+            raise Exception(f"{error_message}: Gemini không trả về nội dung (có thể bị chặn bởi bộ lọc an toàn)")
+        
+        # Only complete, non-empty responses are cached
+        self.response_cache.set(cache_key, "".join(chunks))
+    
+    def generate_educational_content_stream(self, script_prompt: str, use_cache: bool = True,
+                                            max_wait: float = MAX_WAIT_SECONDS) -> Iterator[str]:
+        """
+        Stream educational content generated from script prompt
+        
+        Args:
+            script_prompt: The input script/prompt to process
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
+            
+        Yields:
+            Generated text chunks
+        """
+        # Embed system instruction in prompt for compatibility
+        full_prompt = f"""Bạn là một chuyên gia tạo nội dung giáo dục.
 Nhiệm vụ của bạn là tạo ra các bài giảng, script video giáo dục chất lượng cao.
 Nội dung phải:
 - Dễ hiểu, rõ ràng
@@ -97,37 +240,24 @@ Nội dung phải:
 - Sử dụng ngôn ngữ thân thiện, dễ tiếp cận
 
 Yêu cầu: {script_prompt}"""
-            
-            # Record API call
-            self._record_api_call()
-            
-            # Generate content
-            response = self.model.generate_content(full_prompt)
-            
-            return response.text
-            
-        except Exception as e:
-            if "rate" in str(e).lower() or "quota" in str(e).lower():
-                raise Exception(f"🚫 Google API rate limit đã đạt. Vui lòng đợi vài phút và thử lại.")
-            raise Exception(f"Lỗi khi tạo nội dung với Gemini AI: {str(e)}")
+        
+        return self._generate_stream("generate", full_prompt, "Lỗi khi tạo nội dung với Gemini AI",
+                                     use_cache, max_wait=max_wait)
     
-    def enhance_script(self, original_script: str) -> str:
+    def enhance_script_stream(self, original_script: str, use_cache: bool = True,
+                              max_wait: float = MAX_WAIT_SECONDS) -> Iterator[str]:
         """
-        Enhance and improve an existing script
+        Stream an enhanced version of an existing script
         
         Args:
             original_script: The original script to enhance
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
             
-        Returns:
-            Enhanced script
+        Yields:
+            Enhanced script chunks
         """
-        # Check rate limit first
-        is_allowed, message = self._check_rate_limit()
-        if not is_allowed:
-            raise Exception(message)
-        
-        try:
-            prompt = f"""Hãy cải thiện và làm script sau đây hay hơn, phù hợp để tạo video giáo dục:
+        prompt = f"""Hãy cải thiện và làm script sau đây hay hơn, phù hợp để tạo video giáo dục:
 
 {original_script}
 
@@ -138,48 +268,75 @@ Yêu cầu:
 - Đảm bảo cấu trúc rõ ràng
 - Độ dài phù hợp để đọc trong video 2-5 phút
 """
-            # Record API call
-            self._record_api_call()
-            
-            response = self.model.generate_content(prompt)
-            return response.text
-            
-        except Exception as e:
-            if "rate" in str(e).lower() or "quota" in str(e).lower():
-                raise Exception(f"🚫 Google API rate limit đã đạt. Vui lòng đợi vài phút và thử lại.")
-            raise Exception(f"Lỗi khi cải thiện script: {str(e)}")
+        return self._generate_stream("enhance", prompt, "Lỗi khi cải thiện script",
+                                     use_cache, max_wait=max_wait)
     
-    def summarize_script(self, script: str, max_length: int = 200) -> str:
+    def summarize_script_stream(self, script: str, max_length: int = 200, use_cache: bool = True,
+                                max_wait: float = MAX_WAIT_SECONDS) -> Iterator[str]:
         """
-        Create a summary of the script
+        Stream a summary of the script
         
         Args:
             script: The script to summarize
             max_length: Maximum length of summary
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
             
-        Returns:
-            Summary text
+        Yields:
+            Summary text chunks
         """
-        # Check rate limit first
-        is_allowed, message = self._check_rate_limit()
-        if not is_allowed:
-            raise Exception(message)
-        
-        try:
-            prompt = f"""Tóm tắt ngắn gọn nội dung script sau trong khoảng {max_length} ký tự:
+        prompt = f"""Tóm tắt ngắn gọn nội dung script sau trong khoảng {max_length} ký tự:
 
 {script}
 """
-            # Record API call
-            self._record_api_call()
+        return self._generate_stream("summarize", prompt, "Lỗi khi tóm tắt script", use_cache,
+                                     params={"max_length": max_length}, max_wait=max_wait)
+    
+    def generate_educational_content(self, script_prompt: str, use_cache: bool = True,
+                                     max_wait: float = MAX_WAIT_SECONDS) -> str:
+        """
+        Generate educational content from script prompt
+        
+        Args:
+            script_prompt: The input script/prompt to process
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
             
-            response = self.model.generate_content(prompt)
-            return response.text
+        Returns:
+            Generated educational content as string
+        """
+        return "".join(self.generate_educational_content_stream(script_prompt, use_cache, max_wait))
+    
+    def enhance_script(self, original_script: str, use_cache: bool = True,
+                       max_wait: float = MAX_WAIT_SECONDS) -> str:
+        """
+        Enhance and improve an existing script
+        
+        Args:
+            original_script: The original script to enhance
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
             
-        except Exception as e:
-            if "rate" in str(e).lower() or "quota" in str(e).lower():
-                raise Exception(f"🚫 Google API rate limit đã đạt. Vui lòng đợi vài phút và thử lại.")
-            raise Exception(f"Lỗi khi tóm tắt script: {str(e)}")
+        Returns:
+            Enhanced script
+        """
+        return "".join(self.enhance_script_stream(original_script, use_cache, max_wait))
+    
+    def summarize_script(self, script: str, max_length: int = 200, use_cache: bool = True,
+                         max_wait: float = MAX_WAIT_SECONDS) -> str:
+        """
+        Create a summary of the script
+        
+        Args:
+            script: The script to summarize
+            max_length: Maximum length of summary
+            use_cache: Set False to bypass the response cache and get a fresh variant
+            max_wait: Seconds to wait for a rate limit slot before failing
+            
+        Returns:
+            Summary text
+        """
+        return "".join(self.summarize_script_stream(script, max_length, use_cache, max_wait))
 
 # Test function
 if __name__ == "__main__":
@@ -2,30 +2,160 @@
 HeyGen API Service
 Handles video generation with avatars using HeyGen API
 """
-import requests
+import os
+import threading
 import time
-from typing import Dict, List, Optional
-from config import HEYGEN_BASE_URL, HEYGEN_HEADERS, VIDEO_POLL_INTERVAL
+import requests
+from typing import Callable, Dict, List, Optional, Tuple
+from config import (
+    HEYGEN_BASE_URL,
+    HEYGEN_HEADERS,
+    HEYGEN_MAX_INPUT_CHARS,
+    JOB_STORE_PATH,
+    JOB_RESUME_MAX_AGE,
+    HEYGEN_CONCURRENCY,
+    HEYGEN_LATENCY_TARGET,
+    WEBHOOK_PUBLIC_URL,
+    WEBHOOK_FALLBACK_POLL_INTERVAL,
+)
+from http_transport import HttpTransport
+from adaptive_concurrency import AdaptiveConcurrency
+from metrics import registry
+from catalog_cache import CatalogCache
+from catalog_index import CatalogIndex
+from single_flight import SingleFlight
+from job_store import JobStore
+from status_poller import StatusPoller
+from video_downloader import VideoDownloader
+from scene_splitter import split_script, estimate_render_seconds
 
 class HeyGenService:
-    def __init__(self):
-        """Initialize HeyGen API service"""
-        self.base_url = HEYGEN_BASE_URL
-        self.headers = HEYGEN_HEADERS
+    def __init__(self,
+                 transport: Optional[HttpTransport] = None,
+                 catalog_cache: Optional[CatalogCache] = None,
+                 job_store: Optional[JobStore] = None,
+                 base_url: str = HEYGEN_BASE_URL,
+                 api_key: Optional[str] = None,
+                 concurrency: Optional[AdaptiveConcurrency] = None):
+        """
+        Initialize HeyGen API service
+        
+        Unfinished jobs recorded by earlier runs are monitored again right away.
+        
+        Args:
+            transport: Optional shared HTTP transport (a pooled one is created if not provided)
+            catalog_cache: Optional avatar/voice catalog cache (created if not provided)
+            job_store: Optional job store (a durable one at JOB_STORE_PATH is created if not provided)
+            base_url: API base URL (e.g. a local stand-in server for benchmarks)
+            api_key: API key overriding HEYGEN_API_KEY
+            concurrency: Optional adaptive limit of concurrent API calls (created if not provided)
+        """
+        self.base_url = base_url
+        self.headers = dict(HEYGEN_HEADERS, **{"X-Api-Key": api_key}) if api_key else HEYGEN_HEADERS
         
         if not self.headers.get("X-Api-Key"):
             raise ValueError("HEYGEN_API_KEY not found in environment variables")
+        
+        self.transport = transport or HttpTransport()
+        # Video downloads go to the CDN and are not limited
+        self.concurrency = concurrency or AdaptiveConcurrency("HeyGen API", *HEYGEN_CONCURRENCY,
+                                                              latency_target=HEYGEN_LATENCY_TARGET)
+        self.catalog_cache = catalog_cache or CatalogCache()
+        self.downloader = VideoDownloader(self.transport)
+        self.job_store = job_store or JobStore(JOB_STORE_PATH)
+        self.poller = StatusPoller(self.get_video_status, self.job_store)
+        # Concurrent identical reads (catalogs, status of one video) share one API call
+        self.flights = SingleFlight("heygen")
+        
+        # Set when the webhook receiver is running
+        self.webhook = None
+        self.callback_url: Optional[str] = None
+        
+        # Search indexes, rebuilt whenever the catalog cache hands out a new list
+        self._index_lock = threading.Lock()
+        self._indexes: Dict[str, Tuple[List[Dict], CatalogIndex]] = {}
+        
+        self.resume_jobs()
     
-    def get_avatars(self) -> List[Dict]:
+    def resume_jobs(self, max_age: float = JOB_RESUME_MAX_AGE) -> List[str]:
         """
-        Get list of available avatars
+        Resume monitoring of unfinished jobs submitted by earlier runs
         
+        Args:
+            max_age: Ignore jobs submitted longer ago than this (seconds)
+            
+        Returns:
+            The video_ids being tracked again
+        """
+        jobs = self.job_store.list_jobs(unfinished=True, since=time.time() - max_age, limit=1000)
+        for job in jobs:
+            # Scheduled from the original submission, not as if the render just started
+            self.poller.track(job["video_id"], job["expected_duration"],
+                              started_at=job["created_at"].timestamp())
+        return [job["video_id"] for job in jobs]
+    
+    def start_webhook_receiver(self, public_url: Optional[str] = WEBHOOK_PUBLIC_URL, **kwargs):
+        """
+        Start the local webhook receiver and demote polling to a slow fallback sweep
+        
+        Without a public URL HeyGen cannot reach the receiver, so no callback_url
+        is sent and polling keeps its normal rate (the receiver still accepts
+        local test callbacks).
+        
+        Args:
+            public_url: Callback URL reachable by HeyGen
+            **kwargs: Passed to WebhookReceiver (secret, host, port, path)
+            
+        Returns:
+            The running WebhookReceiver
+        """
+        from webhook_server import WebhookReceiver
+        
+        if self.webhook is None:
+            self.webhook = WebhookReceiver(self.job_store, **kwargs)
+            self.webhook.start()
+            if public_url:
+                self.callback_url = public_url
+                self.poller.fallback_interval = WEBHOOK_FALLBACK_POLL_INTERVAL
+        return self.webhook
+    
+    def _api_request(self, method: str, path: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Call the HeyGen API within the adaptive concurrency limit
+        
+        429 responses are retried with jittered backoff (safe even for POST: the
+        request was refused); 5xx on GETs are already retried by the transport.
+        
+        Raises:
+            CircuitOpenError while HeyGen is failing, or Exception if still rate limited
+        """
+        response = self.concurrency.call(
+            lambda: self.transport.request(method, f"{self.base_url}{path}", endpoint=endpoint,
+                                           headers=self.headers, **kwargs)
+        )
+        if response.status_code == 429:
+            raise Exception("🚫 HeyGen API rate limit đã đạt. Vui lòng đợi một lát và thử lại.")
+        return response
+    
+    def get_avatars(self, force_refresh: bool = False) -> List[Dict]:
+        """
+        Get list of available avatars (served from the catalog cache)
+        
+        Args:
+            force_refresh: Bypass the cache and fetch from the API
+            
         Returns:
             List of avatar dictionaries with id, name, preview_url
         """
+        with registry.span("heygen.avatars", force_refresh=force_refresh):
+            return self.catalog_cache.get(
+                "avatars", lambda: self.flights.do("avatars", self._fetch_avatars), force_refresh
+            )
+    
+    def _fetch_avatars(self) -> List[Dict]:
+        """Fetch and format the avatar list from the API"""
         try:
-            url = f"{self.base_url}/v2/avatars"
-            response = requests.get(url, headers=self.headers)
+            response = self._api_request("GET", "/v2/avatars", "avatars")
             response.raise_for_status()
             
             data = response.json()
@@ -39,6 +169,8 @@ class HeyGenService:
                     "name": avatar.get("avatar_name"),
                     "preview_url": avatar.get("preview_image_url"),
                     "gender": avatar.get("gender"),
+                    "style": avatar.get("tags") or avatar.get("type"),
+                    "default_voice_id": avatar.get("default_voice_id"),
                 })
             
             return formatted_avatars
@@ -46,16 +178,25 @@ class HeyGenService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Lỗi khi lấy danh sách avatars: {str(e)}")
     
-    def get_voices(self) -> List[Dict]:
+    def get_voices(self, force_refresh: bool = False) -> List[Dict]:
         """
-        Get list of available AI voices
+        Get list of available AI voices (served from the catalog cache)
         
+        Args:
+            force_refresh: Bypass the cache and fetch from the API
+            
         Returns:
             List of voice dictionaries
         """
+        with registry.span("heygen.voices", force_refresh=force_refresh):
+            return self.catalog_cache.get(
+                "voices", lambda: self.flights.do("voices", self._fetch_voices), force_refresh
+            )
+    
+    def _fetch_voices(self) -> List[Dict]:
+        """Fetch and format the voice list from the API"""
         try:
-            url = f"{self.base_url}/v2/voices"
-            response = requests.get(url, headers=self.headers)
+            response = self._api_request("GET", "/v2/voices", "voices")
             response.raise_for_status()
             
             data = response.json()
@@ -76,50 +217,104 @@ class HeyGenService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Lỗi khi lấy danh sách voices: {str(e)}")
     
+    def _catalog_index(self, key: str, items: List[Dict]) -> CatalogIndex:
+        """Index of a catalog list, built once per list handed out by the cache"""
+        with self._index_lock:
+            cached = self._indexes.get(key)
+            if cached is None or cached[0] is not items:
+                cached = self._indexes[key] = (items, CatalogIndex(items))
+            return cached[1]
+    
+    def get_avatar_index(self, force_refresh: bool = False) -> CatalogIndex:
+        """
+        Searchable, filterable index over the avatar catalog
+        
+        Args:
+            force_refresh: Bypass the cache and fetch from the API
+            
+        Returns:
+            CatalogIndex with gender and style facets
+        """
+        return self._catalog_index("avatars", self.get_avatars(force_refresh))
+    
+    def get_voice_index(self, force_refresh: bool = False) -> CatalogIndex:
+        """
+        Searchable, filterable index over the voice catalog
+        
+        Args:
+            force_refresh: Bypass the cache and fetch from the API
+            
+        Returns:
+            CatalogIndex with gender and language facets
+        """
+        return self._catalog_index("voices", self.get_voices(force_refresh))
+    
     def create_video(self, 
                      script: str, 
                      avatar_id: str,
                      voice_id: Optional[str] = None,
-                     title: str = "Educational Video") -> str:
+                     title: str = "Educational Video",
+                     scenes: Optional[List[str]] = None) -> str:
         """
         Create a video with avatar and script
         
+        Scripts longer than HeyGen's per-input limit are split into several scenes
+        (video_inputs) of the same video automatically.
+        
         Args:
             script: The script content for the video
             avatar_id: ID of the avatar to use
             voice_id: Optional voice ID (if not provided, avatar's default voice is used)
             title: Title for the video
+            scenes: Optional pre-split scene texts (overrides automatic splitting)
             
         Returns:
             video_id: The ID of the created video
         """
+        with registry.span("heygen.create_video", avatar_id=avatar_id) as span:
+            video_id = self._create_video(script, avatar_id, voice_id, title, scenes)
+            span.set(video_id=video_id)
+            return video_id
+    
+    def _create_video(self, script: str, avatar_id: str, voice_id: Optional[str],
+                      title: str, scenes: Optional[List[str]]) -> str:
+        """Submit the video (see create_video)"""
         try:
-            url = f"{self.base_url}/v2/video/generate"
+            if scenes is None:
+                scenes = split_script(script, HEYGEN_MAX_INPUT_CHARS) or [script]
             
-            # Prepare video configuration
-            payload = {
-                "video_inputs": [
-                    {
-                        "character": {
-                            "type": "avatar",
-                            "avatar_id": avatar_id,
-                            "avatar_style": "normal"
-                        },
-                        "voice": {
-                            "type": "text",
-                            "input_text": script
-                        }
+            # Prepare video configuration (one video input per scene)
+            video_inputs = []
+            for scene_text in scenes:
+                video_input = {
+                    "character": {
+                        "type": "avatar",
+                        "avatar_id": avatar_id,
+                        "avatar_style": "normal"
+                    },
+                    "voice": {
+                        "type": "text",
+                        "input_text": scene_text
                     }
-                ],
+                }
+                
+                # Add voice if provided
+                if voice_id:
+                    video_input["voice"]["voice_id"] = voice_id
+                
+                video_inputs.append(video_input)
+            
+            payload = {
+                "video_inputs": video_inputs,
                 "title": title,
                 "test": False  # Set to False for production
             }
             
-            # Add voice if provided
-            if voice_id:
-                payload["video_inputs"][0]["voice"]["voice_id"] = voice_id
+            # Ask HeyGen to notify our webhook receiver when rendering ends
+            if self.callback_url:
+                payload["callback_url"] = self.callback_url
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self._api_request("POST", "/v2/video/generate", "video_generate", json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -128,6 +323,10 @@ class HeyGenService:
             if not video_id:
                 raise Exception("Không nhận được video_id từ HeyGen API")
             
+            # Durable record so the job can be resumed and reopened after a restart
+            self.job_store.record_submission(video_id, script, avatar_id, voice_id, title,
+                                             expected_duration=estimate_render_seconds(script))
+            
             return video_id
             
         except requests.exceptions.RequestException as e:
@@ -143,11 +342,19 @@ class HeyGenService:
         Returns:
             Dictionary with status, video_url, thumbnail_url, duration, etc.
         """
+        with registry.span("heygen.video_status", video_id=video_id) as span:
+            # Callers of one flight share the result; each gets its own copy
+            status_data = dict(self.flights.do(("video_status", video_id),
+                                               lambda: self._get_video_status(video_id)))
+            span.set(status=status_data.get("status"))
+            return status_data
+    
+    def _get_video_status(self, video_id: str) -> Dict:
+        """Fetch the status (see get_video_status)"""
         try:
-            url = f"{self.base_url}/v1/video_status.get"
             params = {"video_id": video_id}
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._api_request("GET", "/v1/video_status.get", "video_status", params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -167,7 +374,7 @@ class HeyGenService:
     
     def wait_for_video_completion(self, video_id: str, max_wait_time: int = 600) -> Dict:
         """
-        Wait for video to complete with polling
+        Wait for video to complete (tracked by the shared background poller)
         
         Args:
             video_id: The ID of the video to wait for
@@ -176,50 +383,57 @@ class HeyGenService:
         Returns:
             Final video status dictionary
         """
-        start_time = time.time()
+        self.poller.track(video_id)
+        status_data = self.job_store.wait(video_id, timeout=max_wait_time) or {}
+        status = status_data.get("status")
         
-        while True:
-            # Check if max wait time exceeded
-            if time.time() - start_time > max_wait_time:
-                raise Exception("Timeout: Video generation took too long")
-            
-            # Get current status
-            status_data = self.get_video_status(video_id)
-            status = status_data.get("status")
-            
-            # Check completion status
-            if status == "completed":
-                return status_data
-            elif status == "failed":
-                error_msg = status_data.get("error", "Unknown error")
-                raise Exception(f"Video generation failed: {error_msg}")
-            
-            # Wait before next poll
-            time.sleep(VIDEO_POLL_INTERVAL)
+        # Check completion status
+        if status == "completed":
+            return status_data
+        elif status == "failed":
+            error_msg = status_data.get("error", "Unknown error")
+            raise Exception(f"Video generation failed: {error_msg}")
+        
+        raise Exception("Timeout: Video generation took too long")
     
-    def download_video(self, video_url: str, output_path: str) -> bool:
+    def download_video(self,
+                       video_url: str,
+                       output_path: str,
+                       progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                       expected_sha256: Optional[str] = None,
+                       video_id: Optional[str] = None) -> bool:
         """
-        Download video from URL
+        Download video from URL (parallel Range segments, resumable)
         
         Args:
             video_url: URL of the video to download
             output_path: Local path to save the video
+            progress_callback: Optional callback receiving (bytes_downloaded, total_bytes)
+            expected_sha256: Optional SHA-256 hex digest to verify
+            video_id: Optional ID of the video (links the download to its trace)
             
         Returns:
             True if successful
         """
         try:
-            response = requests.get(video_url, stream=True)
-            response.raise_for_status()
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
+            with registry.span("heygen.download", video_id=video_id) as span:
+                self.downloader.download(video_url, output_path,
+                                         expected_sha256=expected_sha256,
+                                         progress_callback=progress_callback)
+                span.add_bytes(received=os.path.getsize(output_path))
             return True
             
         except Exception as e:
             raise Exception(f"Lỗi khi tải video: {str(e)}")
+    
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        """
+        Get per-endpoint latency counters for HeyGen API calls
+        
+        Returns:
+            Dictionary of endpoint -> {count, errors, avg_ms, max_ms}
+        """
+        return self.transport.get_latency_stats()
 
 # Test function
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+"""
+HTTP Transport
+Shared, thread-safe connection-pooled HTTP transport with timeouts,
+retries on idempotent requests and per-endpoint latency counters
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import registry
+from config import (
+    HTTP_POOL_SIZE,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_RETRY_BACKOFF,
+)
+
+# Only these methods are retried transparently (safe to repeat)
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+def _transferred_bytes(response: Optional[requests.Response]) -> Tuple[int, int]:
+    """(received, sent) body bytes of a response, from headers (streamed bodies are not read)"""
+    if response is None:
+        return 0, 0
+    received = int(response.headers.get("Content-Length") or 0)
+    body = response.request.body if response.request is not None else None
+    return received, len(body) if body else 0
+
+
+class HttpTransport:
+    def __init__(self,
+                 pool_size: int = HTTP_POOL_SIZE,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 retry_backoff: float = HTTP_RETRY_BACKOFF):
+        """
+        Initialize the pooled transport
+
+        Args:
+            pool_size: Maximum number of keep-alive connections kept per host
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait between bytes from the server
+            max_retries: Retries for idempotent requests on connection errors and 5xx
+            retry_backoff: Backoff factor between retries
+        """
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+            # 429s are left to the caller's adaptive concurrency control
+            respect_retry_after_header=False,
+        )
+
+        # One adapter (and therefore one urllib3 connection pool) is shared by
+        # every thread; each thread gets its own lightweight Session on top.
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        self._local = threading.local()
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def _session(self) -> requests.Session:
+        """Get the calling thread's session bound to the shared pool"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method: str, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the shared connection pool
+
+        Args:
+            method: HTTP method
+            url: Full request URL
+            endpoint: Name used for latency counters (defaults to the URL path)
+            **kwargs: Passed through to requests (headers, params, json, stream, ...)
+
+        Returns:
+            requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = endpoint or requests.utils.urlparse(url).path or url
+
+        start = time.perf_counter()
+        failed = False
+        response = None
+        try:
+            response = self._session().request(method, url, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        except requests.exceptions.RequestException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(endpoint, elapsed, failed)
+            registry.observe(f"http.{endpoint}", elapsed, failed, *_transferred_bytes(response))
+
+    def get(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """Send a GET request"""
+        return self.request("GET", url, endpoint=endpoint, **kwargs)
+
+    def head(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """Send a HEAD request"""
+        return self.request("HEAD", url, endpoint=endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """Send a POST request (never retried automatically)"""
+        return self.request("POST", url, endpoint=endpoint, **kwargs)
+
+    def _record(self, endpoint: str, elapsed: float, failed: bool):
+        """Record latency for an endpoint"""
+        elapsed_ms = elapsed * 1000
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, {
+                "count": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+            })
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if failed:
+                stats["errors"] += 1
+
+    def get_latency_stats(self) -> Dict[str, Dict]:
+        """
+        Get per-endpoint latency counters
+
+        Returns:
+            Dictionary of endpoint -> {count, errors, avg_ms, max_ms}
+        """
+        with self._stats_lock:
+            return {
+                endpoint: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "avg_ms": stats["total_ms"] / stats["count"] if stats["count"] else 0.0,
+                    "max_ms": stats["max_ms"],
+                }
+                for endpoint, stats in self._stats.items()
+            }
+
+    def close(self):
+        """Close all pooled connections"""
+        self._adapter.close()
@@ -0,0 +1,403 @@
+"""
+Job Store
+Thread-safe store of the latest status for every video job.
+Written by the status poller and the webhook receiver, read by UI sessions.
+With a database path, every submission and status change is also recorded in
+SQLite so jobs survive restarts and can be listed and reopened from any session;
+only the most recently used statuses are then kept in memory, and unfinished
+ones are re-read now and then to see changes written by other processes.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from config import JOB_STORE_MEMORY_SIZE, JOB_STORE_REFRESH_INTERVAL
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Status fields persisted with each job
+RESULT_FIELDS = ("video_url", "thumbnail_url", "duration", "error")
+
+StatusCallback = Callable[[str, Dict], None]
+
+
+def script_hash(script: str) -> str:
+    """Fingerprint of a script, used to spot re-submissions of the same content"""
+    return hashlib.sha256(script.strip().encode('utf-8')).hexdigest()
+
+
+class JobStore:
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 memory_size: int = JOB_STORE_MEMORY_SIZE,
+                 refresh_interval: float = JOB_STORE_REFRESH_INTERVAL):
+        """
+        Initialize job store
+
+        Args:
+            db_path: SQLite database file for durable job records (None = in memory only)
+            memory_size: Statuses kept in memory with a database (least recently used dropped first)
+            refresh_interval: Seconds after which an unfinished status is re-read from the database
+        """
+        self.memory_size = memory_size
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # video_id -> latest status data, most recently used last
+        self._statuses: "OrderedDict[str, Dict]" = OrderedDict()
+        self._checked_at: Dict[str, float] = {}   # video_id -> last time memory matched the database
+        self._subscribers: Dict[str, List[StatusCallback]] = {}
+
+        self._conn = None
+        if db_path:
+            folder = os.path.dirname(db_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    video_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    avatar_id TEXT,
+                    voice_id TEXT,
+                    script_hash TEXT,
+                    status TEXT,
+                    video_url TEXT,
+                    thumbnail_url TEXT,
+                    duration REAL,
+                    error TEXT,
+                    expected_duration REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_jobs_script ON jobs (script_hash, avatar_id);
+                CREATE TABLE IF NOT EXISTS job_history (
+                    video_id TEXT NOT NULL,
+                    status TEXT,
+                    source TEXT NOT NULL,
+                    recorded_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_history_video ON job_history (video_id, recorded_at);
+            """)
+            # Databases created before expected_duration was recorded
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "expected_duration" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN expected_duration REAL")
+            self._conn.commit()
+
+    # ---------- Persistence (caller holds the lock) ----------
+
+    def _remember(self, video_id: str, status_data: Dict):
+        """Keep a status in memory, dropping the least recently used ones (caller holds the lock)"""
+        self._statuses[video_id] = status_data
+        self._statuses.move_to_end(video_id)
+        self._checked_at[video_id] = time.time()
+        # Without a database the memory is the only record, so nothing is dropped
+        while self._conn is not None and len(self._statuses) > self.memory_size:
+            old_id, _ = self._statuses.popitem(last=False)
+            self._checked_at.pop(old_id, None)
+
+    def _load(self, video_id: str) -> Optional[Dict]:
+        """
+        Latest status from memory, falling back to the database (e.g. after a restart
+        or once dropped from memory); unfinished statuses are re-read after
+        refresh_interval, since the pipeline CLI or a webhook in another process
+        may have written a newer one
+        """
+        status_data = self._statuses.get(video_id)
+        if self._conn is None:
+            return status_data
+        if status_data is not None:
+            self._statuses.move_to_end(video_id)
+            if status_data.get("status") in TERMINAL_STATUSES \
+                    or time.time() - self._checked_at.get(video_id, 0.0) < self.refresh_interval:
+                return status_data
+
+        row = self._conn.execute(
+            f"SELECT status, {', '.join(RESULT_FIELDS)}, updated_at FROM jobs WHERE video_id = ?",
+            (video_id,),
+        ).fetchone()
+        if not row or not row[0]:
+            return status_data
+        if status_data is not None and row[-1] <= status_data.get("updated_at", 0.0):
+            self._checked_at[video_id] = time.time()
+            return status_data
+
+        restored = {"status": row[0], "source": "restore", "updated_at": row[-1]}
+        restored.update({field: value for field, value in zip(RESULT_FIELDS, row[1:-1]) if value is not None})
+        self._remember(video_id, restored)
+        if status_data is not None:
+            # Changed by another process: wake waiters in this one
+            self._changed.notify_all()
+        return restored
+
+    def _persist(self, video_id: str, status_data: Dict, source: str, now: float):
+        """Upsert the job row and append to its status history"""
+        values = [status_data.get(field) for field in RESULT_FIELDS]
+        self._conn.execute(
+            f"""
+            INSERT INTO jobs (video_id, status, {', '.join(RESULT_FIELDS)}, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (video_id) DO UPDATE SET
+                status = excluded.status,
+                {', '.join(f'{field} = COALESCE(excluded.{field}, {field})' for field in RESULT_FIELDS)},
+                updated_at = excluded.updated_at
+            """,
+            (video_id, status_data.get("status"), *values, now, now),
+        )
+        self._conn.execute(
+            "INSERT INTO job_history (video_id, status, source, recorded_at) VALUES (?, ?, ?, ?)",
+            (video_id, status_data.get("status"), source, now),
+        )
+        self._conn.commit()
+
+    # ---------- Updates ----------
+
+    def record_submission(self,
+                          video_id: str,
+                          script: str,
+                          avatar_id: str,
+                          voice_id: Optional[str] = None,
+                          title: Optional[str] = None,
+                          expected_duration: Optional[float] = None):
+        """
+        Record a newly submitted video as pending
+
+        Args:
+            video_id: The ID returned by HeyGen
+            script: Script the video was created from
+            avatar_id: Avatar used
+            voice_id: Voice used (None for the avatar's default)
+            title: Video title
+            expected_duration: Estimated render time in seconds (used when the job is resumed)
+        """
+        now = time.time()
+        with self._lock:
+            if self._load(video_id) is None:
+                self._remember(video_id, {"status": "pending", "source": "submit", "updated_at": now})
+            if self._conn is not None:
+                # A webhook may already have created the row; keep its status
+                self._conn.execute(
+                    """
+                    INSERT INTO jobs (video_id, title, avatar_id, voice_id, script_hash, status,
+                                      expected_duration, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+                    ON CONFLICT (video_id) DO UPDATE SET
+                        title = excluded.title,
+                        avatar_id = excluded.avatar_id,
+                        voice_id = excluded.voice_id,
+                        script_hash = excluded.script_hash,
+                        expected_duration = excluded.expected_duration
+                    """,
+                    (video_id, title, avatar_id, voice_id, script_hash(script), expected_duration, now, now),
+                )
+                self._conn.execute(
+                    "INSERT INTO job_history (video_id, status, source, recorded_at) VALUES (?, 'pending', 'submit', ?)",
+                    (video_id, now),
+                )
+                self._conn.commit()
+
+    def update(self, video_id: str, status_data: Dict, source: str = "poll") -> bool:
+        """
+        Record a new status for a video and wake anyone waiting on it
+
+        Args:
+            video_id: The ID of the video
+            status_data: Status dictionary as returned by get_video_status
+            source: Where the status came from ("poll", "webhook", "manual")
+
+        Returns:
+            True if the status changed
+        """
+        with self._lock:
+            previous = self._load(video_id)
+            if previous and previous.get("status") in TERMINAL_STATUSES \
+                    and status_data.get("status") not in TERMINAL_STATUSES:
+                # A late poll must not roll back a webhook completion
+                return False
+
+            now = time.time()
+            changed = previous is None or previous.get("status") != status_data.get("status")
+            self._remember(video_id, dict(status_data, source=source, updated_at=now))
+            callbacks = list(self._subscribers.get(video_id, [])) if changed else []
+            if changed:
+                if self._conn is not None:
+                    self._persist(video_id, status_data, source, now)
+                self._changed.notify_all()
+
+        self._notify(callbacks, video_id, status_data)
+        return changed
+
+    # ---------- Reads ----------
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        """Get the latest known status of a video"""
+        with self._lock:
+            return self._load(video_id)
+
+    def is_finished(self, video_id: str) -> bool:
+        """Check whether a video reached a terminal status"""
+        status_data = self.get(video_id)
+        return bool(status_data and status_data.get("status") in TERMINAL_STATUSES)
+
+    def subscribe(self, video_id: str, callback: StatusCallback):
+        """
+        Register a callback invoked with (video_id, status_data) on every status change.
+        Called immediately if the video already finished.
+        """
+        with self._lock:
+            self._subscribers.setdefault(video_id, []).append(callback)
+            status_data = self._load(video_id)
+        if status_data and status_data.get("status") in TERMINAL_STATUSES:
+            self._notify([callback], video_id, status_data)
+
+    def unsubscribe(self, video_id: str, callback: StatusCallback):
+        """Remove a callback registered with subscribe()"""
+        with self._lock:
+            callbacks = self._subscribers.get(video_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(video_id, None)
+
+    def wait_for_change(self, video_id: str, known_status: Optional[str], timeout: float) -> Optional[Dict]:
+        """
+        Block until the video's status differs from known_status or the timeout expires
+
+        Returns:
+            Latest status dictionary (may be unchanged on timeout)
+        """
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                status_data = self._load(video_id)
+                current = status_data.get("status") if status_data else None
+                remaining = deadline - time.time()
+                if current != known_status or remaining <= 0:
+                    return status_data
+                # Wake up now and then to see statuses written by other processes
+                self._changed.wait(min(remaining, self.refresh_interval))
+
+    def wait(self, video_id: str, timeout: float) -> Optional[Dict]:
+        """
+        Block until the video completes or fails, or the timeout expires
+
+        Returns:
+            Latest status dictionary
+        """
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                status_data = self._load(video_id)
+                remaining = deadline - time.time()
+                if (status_data and status_data.get("status") in TERMINAL_STATUSES) or remaining <= 0:
+                    return status_data
+                # Wake up now and then to see statuses written by other processes
+                self._changed.wait(min(remaining, self.refresh_interval))
+
+    # ---------- Queries (durable store only) ----------
+
+    @staticmethod
+    def _job_from_row(job: Dict) -> Dict:
+        """Convert the timestamps of a job row to datetimes"""
+        job["created_at"] = datetime.fromtimestamp(job["created_at"])
+        job["updated_at"] = datetime.fromtimestamp(job["updated_at"])
+        return job
+
+    def _query(self, sql: str, params: list) -> List[Dict]:
+        """Run a job query and return dictionaries"""
+        if self._conn is None:
+            return []
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [self._job_from_row(dict(zip(columns, row))) for row in rows]
+
+    def list_jobs(self,
+                  status: Optional[str] = None,
+                  avatar_id: Optional[str] = None,
+                  unfinished: bool = False,
+                  since: Optional[float] = None,
+                  limit: int = 50,
+                  offset: int = 0) -> List[Dict]:
+        """
+        Newest-first page of recorded jobs
+
+        Args:
+            status: Only jobs with this status
+            avatar_id: Only jobs using this avatar
+            unfinished: Only jobs that have not completed or failed yet
+            since: Only jobs created after this timestamp
+            limit: Maximum rows
+            offset: Rows to skip
+
+        Returns:
+            List of job dictionaries (video_id, title, avatar_id, voice_id, script_hash,
+            status, video_url, thumbnail_url, duration, error, expected_duration, created_at, updated_at)
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if avatar_id:
+            clauses.append("avatar_id = ?")
+            params.append(avatar_id)
+        if unfinished:
+            clauses.append(f"status NOT IN ({', '.join('?' for _ in TERMINAL_STATUSES)})")
+            params.extend(TERMINAL_STATUSES)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM jobs{where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                           params + [limit, offset])
+
+    def find_by_script(self, script: str, avatar_id: str, voice_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Latest job (not failed) already submitted for the same script, avatar and voice
+
+        Returns:
+            Job dictionary, or None if this combination was never rendered
+        """
+        jobs = self._query(
+            "SELECT * FROM jobs WHERE script_hash = ? AND avatar_id = ? AND voice_id IS ? "
+            "AND status != 'failed' ORDER BY created_at DESC LIMIT 1",
+            [script_hash(script), avatar_id, voice_id],
+        )
+        return jobs[0] if jobs else None
+
+    def history(self, video_id: str) -> List[Dict]:
+        """
+        Status history of a job, oldest first
+
+        Returns:
+            List of dictionaries with status, source, recorded_at
+        """
+        if self._conn is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, source, recorded_at FROM job_history WHERE video_id = ? ORDER BY recorded_at",
+                (video_id,),
+            ).fetchall()
+        return [
+            {"status": status, "source": source, "recorded_at": datetime.fromtimestamp(recorded_at)}
+            for status, source, recorded_at in rows
+        ]
+
+    @staticmethod
+    def _notify(callbacks: List[StatusCallback], video_id: str, status_data: Dict):
+        """Invoke subscriber callbacks, isolating their failures"""
+        for callback in callbacks:
+            try:
+                callback(video_id, status_data)
+            except Exception:
+                pass
@@ -0,0 +1,296 @@
+"""
+Metrics
+In-process instrumentation: latency histograms, error and byte counters per
+operation, and trace spans linking one video's journey (upload -> Gemini ->
+HeyGen render -> download). Exported in Prometheus text format from an
+optional local endpoint and shown in the sidebar admin panel.
+"""
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+from config import METRICS_MAX_TRACES, METRICS_MAX_SPANS_PER_TRACE
+
+# Histogram bucket upper bounds in seconds (external calls range from ms to minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_PREFIX = "agentmia"
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    """Random trace id"""
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    def __init__(self, registry: "MetricsRegistry", name: str, trace_id: Optional[str], attributes: Dict):
+        """One timed operation (use MetricsRegistry.span or start_span)"""
+        self.registry = registry
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.seconds: Optional[float] = None
+        self._start = time.perf_counter()
+
+    def elapsed(self) -> float:
+        """Seconds since the span started"""
+        return time.perf_counter() - self._start
+
+    def set(self, **attributes):
+        """Add attributes (a video_id links the span's trace to that video)"""
+        self.attributes.update(attributes)
+
+    def add_bytes(self, received: int = 0, sent: int = 0):
+        """Count transferred bytes"""
+        self.bytes_in += received
+        self.bytes_out += sent
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Stop the clock and record the span (idempotent)"""
+        if self.seconds is not None:
+            return
+        self.seconds = time.perf_counter() - self._start
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+        self.registry._record_span(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "ms": round((self.seconds or 0) * 1000, 1),
+            "error": self.error,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "attributes": dict(self.attributes),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, max_traces: int = METRICS_MAX_TRACES, max_spans: int = METRICS_MAX_SPANS_PER_TRACE):
+        """
+        Initialize registry
+
+        Args:
+            max_traces: Most recent traces kept
+            max_spans: Spans kept per trace (oldest dropped first)
+        """
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict] = {}
+        self._traces: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._video_traces: Dict[str, str] = {}
+
+    # ---------- Recording ----------
+
+    def observe(self, operation: str, seconds: float, error: bool = False,
+                bytes_in: int = 0, bytes_out: int = 0):
+        """Record one completed operation"""
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    "count": 0, "errors": 0, "sum": 0.0, "max": 0.0,
+                    "buckets": [0] * len(LATENCY_BUCKETS), "bytes_in": 0, "bytes_out": 0,
+                }
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            if error:
+                stats["errors"] += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][i] += 1
+                    break
+
+    def start_span(self, name: str, trace_id: Optional[str] = None, **attributes) -> Span:
+        """
+        Start a span; call finish() on it (for generators and callbacks)
+
+        The trace is, in order: trace_id, the active trace of the calling
+        context, or the trace linked to the span's video_id attribute.
+        """
+        trace_id = trace_id or _current_trace.get()
+        if trace_id is None and attributes.get("video_id"):
+            with self._lock:
+                trace_id = self._video_traces.get(attributes["video_id"])
+        return Span(self, name, trace_id, attributes)
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes) -> Iterator[Span]:
+        """Time a block as one span; an exception marks it as an error and is re-raised"""
+        span = self.start_span(name, trace_id, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(e)
+            raise
+        span.finish()
+
+    def _record_span(self, span: Span):
+        """Feed a finished span into the histograms and its trace"""
+        self.observe(span.name, span.seconds, span.error is not None, span.bytes_in, span.bytes_out)
+        if span.trace_id is None:
+            return
+        with self._lock:
+            video_id = span.attributes.get("video_id")
+            if video_id:
+                self._video_traces[video_id] = span.trace_id
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    _, dropped = self._traces.popitem(last=False)
+                    for dropped_video in {s["attributes"].get("video_id") for s in dropped} - {None}:
+                        self._video_traces.pop(dropped_video, None)
+            else:
+                self._traces.move_to_end(span.trace_id)
+            spans.append(span.to_dict())
+            if len(spans) > self.max_spans:
+                del spans[0]
+
+    # ---------- Trace context ----------
+
+    @staticmethod
+    def set_trace(trace_id: Optional[str]):
+        """Make trace_id the active trace of the calling thread / context"""
+        _current_trace.set(trace_id)
+
+    @staticmethod
+    def current_trace() -> Optional[str]:
+        """Active trace of the calling context"""
+        return _current_trace.get()
+
+    def link_video(self, video_id: str, trace_id: str):
+        """Attach later spans about video_id (polls, webhooks) to trace_id"""
+        with self._lock:
+            self._video_traces[video_id] = trace_id
+
+    # ---------- Reading ----------
+
+    @staticmethod
+    def _quantile(stats: Dict, fraction: float) -> float:
+        """Estimate a latency quantile from the histogram buckets (seconds)"""
+        rank = fraction * stats["count"]
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, stats["max"])
+            seen += count
+            lower = bound
+        return stats["max"]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Per-operation summary
+
+        Returns:
+            Dictionary of operation -> {count, errors, avg_ms, p50_ms, p95_ms, max_ms, bytes_in, bytes_out}
+        """
+        with self._lock:
+            operations = {name: dict(stats, buckets=list(stats["buckets"])) for name, stats in self._operations.items()}
+        return {
+            name: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["sum"] / stats["count"] * 1000, 1) if stats["count"] else 0.0,
+                "p50_ms": round(self._quantile(stats, 0.5) * 1000, 1),
+                "p95_ms": round(self._quantile(stats, 0.95) * 1000, 1),
+                "max_ms": round(stats["max"] * 1000, 1),
+                "bytes_in": stats["bytes_in"],
+                "bytes_out": stats["bytes_out"],
+            }
+            for name, stats in sorted(operations.items())
+        }
+
+    def get_trace(self, trace_id: str) -> List[Dict]:
+        """Spans of one trace in completion order"""
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def recent_traces(self, limit: int = 20) -> Dict[str, List[Dict]]:
+        """Most recently active traces, newest first"""
+        with self._lock:
+            trace_ids = list(self._traces)[-limit:]
+            return {trace_id: list(self._traces[trace_id]) for trace_id in reversed(trace_ids)}
+
+    def render_prometheus(self) -> str:
+        """All operation metrics in Prometheus text exposition format"""
+        with self._lock:
+            operations = {name: dict(stats, buckets=list(stats["buckets"])) for name, stats in self._operations.items()}
+
+        duration = f"{METRIC_PREFIX}_operation_duration_seconds"
+        errors = f"{METRIC_PREFIX}_operation_errors_total"
+        transferred = f"{METRIC_PREFIX}_operation_bytes_total"
+        lines = [
+            f"# HELP {duration} Latency of external calls and file operations",
+            f"# TYPE {duration} histogram",
+        ]
+        for name, stats in sorted(operations.items()):
+            label = f'operation="{name}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+                cumulative += count
+                lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {stats["count"]}')
+            lines.append(f"{duration}_sum{{{label}}} {stats['sum']:.6f}")
+            lines.append(f"{duration}_count{{{label}}} {stats['count']}")
+
+        lines += [f"# HELP {errors} Failed operations", f"# TYPE {errors} counter"]
+        lines += [f'{errors}{{operation="{name}"}} {stats["errors"]}' for name, stats in sorted(operations.items())]
+
+        lines += [f"# HELP {transferred} Bytes received and sent", f"# TYPE {transferred} counter"]
+        for name, stats in sorted(operations.items()):
+            lines.append(f'{transferred}{{operation="{name}",direction="in"}} {stats["bytes_in"]}')
+            lines.append(f'{transferred}{{operation="{name}",direction="out"}} {stats["bytes_out"]}')
+        return "\n".join(lines) + "\n"
+
+    # ---------- Export ----------
+
+    def start_server(self, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+        """
+        Serve /metrics (Prometheus text) from a background thread
+
+        Returns:
+            The running server (call shutdown() to stop)
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+# Process-wide registry used by every service
+registry = MetricsRegistry()
@@ -0,0 +1,337 @@
+"""
+Pipeline CLI
+Headless script -> Gemini -> HeyGen -> download production over many scripts.
+Stages run in their own worker threads connected by bounded queues, so Gemini
+work on the next scripts overlaps HeyGen rendering of the previous ones.
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from config import (
+    BATCH_RATE_LIMIT_WAIT,
+    PIPELINE_OUTPUT_FOLDER,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_PROCESS_WORKERS,
+    PIPELINE_RENDER_WORKERS,
+    PIPELINE_DOWNLOAD_WORKERS,
+    PIPELINE_RENDER_TIMEOUT,
+    RENDER_PIPELINE_USER,
+    SUPPORTED_FILE_FORMATS,
+    METRICS_HOST,
+    METRICS_PORT,
+)
+from batch_processor import OPERATION_SUFFIXES, OutputManifest, output_names, run_operation
+from render_scheduler import RenderScheduler
+from metrics import registry, new_trace_id
+
+STAGES = ["read", "process", "render", "download"]
+
+# Tells a stage worker that no more items will arrive
+_DONE = object()
+
+
+class Pipeline:
+    def __init__(self,
+                 gemini_service,
+                 heygen_service,
+                 file_service,
+                 avatar_id: str,
+                 voice_id: Optional[str] = None,
+                 operation: Optional[str] = "enhance",
+                 output_folder: str = PIPELINE_OUTPUT_FOLDER,
+                 save_format: Optional[str] = None,
+                 use_cache: bool = True,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 process_workers: int = PIPELINE_PROCESS_WORKERS,
+                 render_workers: int = PIPELINE_RENDER_WORKERS,
+                 download_workers: int = PIPELINE_DOWNLOAD_WORKERS,
+                 render_timeout: float = PIPELINE_RENDER_TIMEOUT,
+                 manifest: Optional[OutputManifest] = None,
+                 scheduler: Optional[RenderScheduler] = None,
+                 priority: str = "bulk"):
+        """
+        Initialize pipeline
+
+        Args:
+            gemini_service: GeminiService used for processing (unused if operation is None)
+            heygen_service: HeyGenService used for rendering and downloading
+            file_service: FileService used for reading (and saving) scripts
+            avatar_id: Avatar of every video
+            voice_id: Optional voice of every video
+            operation: "enhance", "generate", "summarize" or None to render scripts as they are
+            output_folder: Folder receiving the videos
+            save_format: Also save processed scripts in this format ('txt' or 'docx')
+            use_cache: Set False to bypass the Gemini response cache
+            queue_size: Items buffered between two stages
+            process_workers: Concurrent Gemini calls
+            render_workers: Scripts handed to the render scheduler at the same time
+            download_workers: Concurrent downloads
+            render_timeout: Seconds to wait for a render slot, then again for the render
+            manifest: Record of saved scripts, shared with batch_processor (a default one is used if not provided)
+            scheduler: RenderScheduler the videos are queued in (created if not provided); it
+                shares the account's render cap with the app through the job store
+            priority: Priority class of the pipeline's videos
+        """
+        if operation is not None and operation not in OPERATION_SUFFIXES:
+            raise ValueError(f"Operation phải là một trong: {', '.join(OPERATION_SUFFIXES)}")
+
+        self.gemini_service = gemini_service
+        self.heygen_service = heygen_service
+        self.file_service = file_service
+        self.avatar_id = avatar_id
+        self.voice_id = voice_id
+        self.operation = operation
+        self.output_folder = output_folder
+        self.save_format = save_format
+        self.use_cache = use_cache
+        self.queue_size = queue_size
+        self.workers = {
+            "read": 1,
+            "process": process_workers,
+            "render": render_workers,
+            "download": download_workers,
+        }
+        self.render_timeout = render_timeout
+        self.manifest = manifest or OutputManifest()
+        self.scheduler = scheduler or RenderScheduler(heygen_service)
+        self.priority = priority
+
+    # ---------- Stages ----------
+
+    def _read(self, item: Dict):
+        """Read the script"""
+        item["script"] = self.file_service.read_file(item["path"])
+        if not item["script"].strip():
+            raise ValueError("File rỗng")
+
+    def _process(self, item: Dict):
+        """Run the Gemini operation (and save the result if requested)"""
+        if self.operation is None:
+            return
+        item["script"] = run_operation(self.gemini_service, self.operation, item["script"],
+                                       self.use_cache, BATCH_RATE_LIMIT_WAIT)
+        if self.save_format:
+            item["script_path"] = self.file_service.save_script(
+                item["script"], f"{item['output_name']}_{OPERATION_SUFFIXES[self.operation]}", self.save_format
+            )
+            self.manifest.add(item["script_path"])
+
+    def _render(self, item: Dict):
+        """Queue the video for a render slot and wait until HeyGen has rendered it"""
+        ticket_id = self.scheduler.submit(item["script"], self.avatar_id, self.voice_id, item["name"],
+                                          user=RENDER_PIPELINE_USER, priority=self.priority)
+        ticket = self.scheduler.wait_submitted(ticket_id, self.render_timeout)
+        if ticket is None or not ticket["video_id"]:
+            if self.scheduler.cancel(ticket_id):
+                raise Exception("Hết thời gian chờ slot render")
+            raise Exception((ticket or {}).get("error") or "HeyGen không nhận video")
+        video_id = ticket["video_id"]
+        item["video_id"] = video_id
+        status_data = self.heygen_service.wait_for_video_completion(video_id, self.render_timeout)
+        item["video_url"] = status_data.get("video_url")
+        if not item["video_url"]:
+            raise Exception("HeyGen không trả về video_url")
+
+    def _download(self, item: Dict):
+        """Download the rendered video"""
+        output_path = os.path.join(self.output_folder, f"{item['output_name']}.mp4")
+        self.heygen_service.download_video(item["video_url"], output_path, video_id=item["video_id"])
+        item["output_path"] = output_path
+
+    def _stage_worker(self, stage: str, inbox: queue.Queue, outbox: queue.Queue):
+        """Take items from inbox, run the stage on them and pass them on (failed items skip ahead)"""
+        handler = getattr(self, f"_{stage}")
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            if item["error"] is None:
+                # Spans recorded by the services join this script's trace
+                registry.set_trace(item["trace_id"])
+                start = time.time()
+                try:
+                    handler(item)
+                except Exception as e:
+                    item["error"] = f"{stage}: {str(e)}"
+                item["timings"][stage] = time.time() - start
+            outbox.put(item)
+
+    # ---------- Run ----------
+
+    def run(self,
+            file_paths: List[str],
+            progress_callback: Optional[Callable[[Dict, int, int], None]] = None) -> Dict:
+        """
+        Produce one video per script
+
+        Args:
+            file_paths: Scripts to turn into videos
+            progress_callback: Called with (item, done_count, total) as each script finishes
+
+        Returns:
+            Dictionary with items (per-script results in input order) and seconds (wall time)
+        """
+        if not os.path.exists(self.output_folder):
+            os.makedirs(self.output_folder)
+
+        # bai1.txt and bai1.docx must not overwrite each other's video
+        names = output_names(file_paths)
+        items = [
+            {
+                "index": index,
+                "path": path,
+                "name": os.path.splitext(os.path.basename(path))[0],
+                "output_name": names[path],
+                "video_id": None,
+                "output_path": None,
+                "error": None,
+                "timings": {},
+                "trace_id": new_trace_id(),
+            }
+            for index, path in enumerate(file_paths)
+        ]
+
+        # source -> read -> process -> render -> download -> finished
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES]
+        finished = queue.Queue()
+        outboxes = queues[1:] + [finished]
+
+        threads = {}
+        for stage, inbox, outbox in zip(STAGES, queues, outboxes):
+            threads[stage] = [
+                threading.Thread(target=self._stage_worker, args=(stage, inbox, outbox),
+                                 name=f"pipeline-{stage}-{i}", daemon=True)
+                for i in range(self.workers[stage])
+            ]
+            for thread in threads[stage]:
+                thread.start()
+
+        def feed():
+            for item in items:
+                item["started"] = time.time()
+                queues[0].put(item)
+            # Shut stages down in order: a stage ends once the previous one has drained
+            for stage, inbox in zip(STAGES, queues):
+                for _ in threads[stage]:
+                    inbox.put(_DONE)
+                for thread in threads[stage]:
+                    thread.join()
+            finished.put(_DONE)
+
+        start = time.time()
+        threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+
+        done = 0
+        while True:
+            item = finished.get()
+            if item is _DONE:
+                break
+            item["seconds"] = time.time() - item.pop("started")
+            item.pop("script", None)
+            done += 1
+            if progress_callback:
+                progress_callback(item, done, len(items))
+
+        return {"items": items, "seconds": time.time() - start}
+
+
+def collect_scripts(paths: List[str], file_service) -> List[str]:
+    """Expand folders into the scripts they contain; files are kept as given"""
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths.extend(script['path'] for script in reversed(file_service.list_scripts(path)))
+        elif os.path.splitext(path)[1].lower() in SUPPORTED_FILE_FORMATS:
+            file_paths.append(path)
+        else:
+            raise ValueError(f"Không phải script hoặc thư mục: {path}")
+    return file_paths
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def format_summary(result: Dict) -> str:
+    """Render throughput and per-stage latency of a pipeline run as plain text"""
+    items = result["items"]
+    succeeded = [item for item in items if item["error"] is None]
+    lines = []
+    for item in items:
+        if item["error"] is None:
+            lines.append(f"✅ {item['name']} ({item['seconds']:.0f}s) -> {item['output_path']}")
+        else:
+            lines.append(f"❌ {item['name']} ({item['seconds']:.0f}s) -> {item['error']}")
+
+    lines.append("")
+    lines.append(f"Tổng: {len(succeeded)}/{len(items)} video thành công trong {result['seconds']:.0f}s")
+    if result["seconds"] > 0:
+        lines.append(f"Throughput: {len(succeeded) * 3600 / result['seconds']:.1f} video/giờ")
+
+    lines.append(f"{'stage':<10} {'avg':>8} {'p50':>8} {'p95':>8} {'max':>8}")
+    for stage in STAGES + ["total"]:
+        if stage == "total":
+            values = [item["seconds"] for item in succeeded]
+        else:
+            values = [item["timings"][stage] for item in items if stage in item["timings"]]
+        if values:
+            lines.append(f"{stage:<10} {sum(values) / len(values):>7.1f}s {_percentile(values, 0.5):>7.1f}s "
+                         f"{_percentile(values, 0.95):>7.1f}s {max(values):>7.1f}s")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from gemini_service import GeminiService
+    from heygen_service import HeyGenService
+    from file_service import FileService
+
+    parser = argparse.ArgumentParser(description="Tạo video hàng loạt: script -> Gemini -> HeyGen -> tải về")
+    parser.add_argument("paths", nargs="+", help="Các file script hoặc thư mục chứa scripts")
+    parser.add_argument("--avatar", required=True, help="Avatar ID")
+    parser.add_argument("--voice", help="Voice ID (mặc định: giọng của avatar)")
+    parser.add_argument("--operation", choices=list(OPERATION_SUFFIXES) + ["none"], default="enhance")
+    parser.add_argument("--output", default=PIPELINE_OUTPUT_FOLDER, help="Thư mục lưu video")
+    parser.add_argument("--save-format", choices=["txt", "docx"], help="Lưu cả script đã xử lý")
+    parser.add_argument("--no-cache", action="store_true", help="Bỏ qua cache kết quả Gemini")
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--process-workers", type=int, default=PIPELINE_PROCESS_WORKERS)
+    parser.add_argument("--render-workers", type=int, default=PIPELINE_RENDER_WORKERS)
+    parser.add_argument("--download-workers", type=int, default=PIPELINE_DOWNLOAD_WORKERS)
+    parser.add_argument("--render-timeout", type=float, default=PIPELINE_RENDER_TIMEOUT)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Mở endpoint Prometheus /metrics trên cổng này (0 = tắt)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        registry.start_server(METRICS_HOST, args.metrics_port)
+
+    operation = None if args.operation == "none" else args.operation
+    file_service = FileService()
+    pipeline = Pipeline(
+        GeminiService() if operation else None,
+        HeyGenService(),
+        file_service,
+        avatar_id=args.avatar,
+        voice_id=args.voice,
+        operation=operation,
+        output_folder=args.output,
+        save_format=args.save_format,
+        use_cache=not args.no_cache,
+        queue_size=args.queue_size,
+        process_workers=args.process_workers,
+        render_workers=args.render_workers,
+        download_workers=args.download_workers,
+        render_timeout=args.render_timeout,
+    )
+    result = pipeline.run(
+        collect_scripts(args.paths, file_service),
+        progress_callback=lambda item, done, total: print(
+            f"[{done}/{total}] {item['name']}: {'ok' if item['error'] is None else item['error']}"
+        ),
+    )
+    print(format_summary(result))
@@ -0,0 +1,165 @@
+"""
+Rate Limiter
+O(1) token-bucket limiter keyed by API key, shared by every session in the
+process and optionally across processes through a SQLite state file
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import RATE_LIMIT_STATE_PATH
+
+
+class TokenBucket:
+    def __init__(self,
+                 key: str,
+                 capacity: float,
+                 refill_per_second: float,
+                 state_path: Optional[str] = RATE_LIMIT_STATE_PATH):
+        """
+        Initialize token bucket
+
+        Args:
+            key: Bucket identifier (already hashed, never a raw API key)
+            capacity: Maximum burst size
+            refill_per_second: Tokens added per second
+            state_path: SQLite file for cross-process state, or None for in-process only
+        """
+        self.key = key
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated_at = time.time()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if state_path:
+            folder = os.path.dirname(state_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self._conn = sqlite3.connect(state_path, timeout=5, isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _refill(self, tokens: float, updated_at: float, now: float) -> float:
+        """Tokens available at `now`"""
+        return min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+
+    def _take(self, tokens: float, consume: bool) -> Tuple[bool, float, float]:
+        """
+        Refill, then optionally consume tokens
+
+        Without consume nothing is written: the refill is only computed, so
+        read-only queries never take the cross-process write lock.
+
+        Returns:
+            Tuple of (acquired, seconds_until_available, tokens_left)
+        """
+        with self._lock:
+            now = time.time()
+            if not consume:
+                acquired = False
+                if self._conn is None:
+                    available = self._refill(self._tokens, self._updated_at, now)
+                else:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM buckets WHERE key = ?", (self.key,)
+                    ).fetchone()
+                    available = self._refill(row[0], row[1], now) if row else self.capacity
+            elif self._conn is None:
+                available = self._refill(self._tokens, self._updated_at, now)
+                acquired = available >= tokens
+                if acquired:
+                    available -= tokens
+                self._tokens, self._updated_at = available, now
+            else:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM buckets WHERE key = ?", (self.key,)
+                    ).fetchone()
+                    available = self._refill(row[0], row[1], now) if row else self.capacity
+                    acquired = available >= tokens
+                    if acquired:
+                        available -= tokens
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                        (self.key, available, now),
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        wait = 0.0 if acquired or available >= tokens else (tokens - available) / self.refill_per_second
+        return acquired, wait, available
+
+    def try_acquire(self, tokens: float = 1) -> Tuple[bool, float]:
+        """
+        Take tokens without blocking
+
+        Returns:
+            Tuple of (acquired, seconds to wait before retrying)
+        """
+        acquired, wait, _ = self._take(tokens, consume=True)
+        return acquired, wait
+
+    def acquire(self, timeout: float = 0, tokens: float = 1) -> Tuple[bool, float]:
+        """
+        Take tokens, waiting up to `timeout` seconds for them to refill
+
+        Returns:
+            Tuple of (acquired, estimated seconds until tokens are available)
+        """
+        deadline = time.time() + timeout
+        while True:
+            acquired, wait = self.try_acquire(tokens)
+            if acquired:
+                return True, 0.0
+            remaining = deadline - time.time()
+            if wait > remaining:
+                # Would still be empty at the deadline: fail now instead of sleeping
+                return False, wait
+            time.sleep(wait)
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` are available"""
+        return self._take(tokens, consume=False)[1]
+
+    def available(self) -> float:
+        """Tokens currently available"""
+        return self._take(0, consume=False)[2]
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str, capacity: float, period_seconds: float,
+                     state_path: Optional[str] = RATE_LIMIT_STATE_PATH) -> TokenBucket:
+    """
+    Get the process-wide bucket for an API key
+
+    Args:
+        api_key: API key the quota belongs to
+        capacity: Calls allowed per period (also the burst size)
+        period_seconds: Length of the period in seconds
+        state_path: SQLite file for cross-process state, or None
+
+    Returns:
+        Shared TokenBucket
+    """
+    key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(key, capacity, capacity / period_seconds, state_path)
+            _buckets[key] = bucket
+        return bucket
@@ -0,0 +1,339 @@
+"""
+Render Scheduler
+Priority queue in front of HeyGen rendering: videos wait in priority classes
+(round-robin between users within a class) and a small worker pool submits
+them with create_video as soon as one of the account's render slots frees up.
+A slot stays taken from submission until the job store records the video as
+completed or failed, so the number of videos rendering never exceeds the cap.
+Unfinished renders the shared job store knows about but this scheduler did not
+submit (earlier runs, the pipeline CLI, other app processes) hold a slot too.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from config import (
+    EXPECTED_RENDER_SECONDS,
+    RENDER_MAX_CONCURRENT,
+    RENDER_SUBMIT_WORKERS,
+    RENDER_PRIORITIES,
+    RENDER_SLOT_TIMEOUT,
+    RENDER_SYNC_INTERVAL,
+    RENDER_TICKET_RETENTION,
+)
+from job_store import TERMINAL_STATUSES
+from scene_splitter import estimate_render_seconds
+from metrics import registry
+
+# Ticket states, in order
+QUEUED = "queued"           # waiting for a render slot
+SUBMITTING = "submitting"   # slot taken, create_video in progress
+RENDERING = "rendering"     # HeyGen accepted the video (video_id known)
+CANCELLED = "cancelled"     # removed from the queue before submission
+# ... then the video's terminal status ("completed" or "failed")
+
+
+class RenderScheduler:
+    def __init__(self,
+                 heygen_service,
+                 max_renders: int = RENDER_MAX_CONCURRENT,
+                 workers: int = RENDER_SUBMIT_WORKERS,
+                 priorities: Tuple[str, ...] = RENDER_PRIORITIES,
+                 slot_timeout: float = RENDER_SLOT_TIMEOUT,
+                 retention: float = RENDER_TICKET_RETENTION):
+        """
+        Initialize scheduler and start its dispatcher thread
+
+        Args:
+            heygen_service: HeyGenService used to submit and track videos
+            max_renders: Videos allowed to render at the same time (the account's cap)
+            workers: Concurrent create_video calls
+            priorities: Priority classes, most urgent first
+            slot_timeout: Seconds after which a render that never reported back frees its slot
+            retention: Seconds a finished ticket stays available to status()
+        """
+        self.heygen_service = heygen_service
+        self.max_renders = max_renders
+        self.priorities = tuple(priorities)
+        self.slot_timeout = slot_timeout
+        self.retention = retention
+
+        self._changed = threading.Condition()
+        # Priority class -> user -> that user's tickets in submission order;
+        # users are served in turn (the one served last moves to the back)
+        self._queues: Dict[str, "OrderedDict[str, Deque[str]]"] = {
+            priority: OrderedDict() for priority in self.priorities
+        }
+        self._tickets: Dict[str, Dict] = {}
+        self._slots: Dict[str, float] = {}   # ticket_id -> time its slot was taken
+        self._external: Dict[str, float] = {}   # video_id -> submission time, renders submitted elsewhere
+        self._ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-submit")
+
+        threading.Thread(target=self._dispatch_loop, name="render-dispatcher", daemon=True).start()
+
+    # ---------- Queue ----------
+
+    def submit(self,
+               script: str,
+               avatar_id: str,
+               voice_id: Optional[str] = None,
+               title: str = "Educational Video",
+               user: str = "default",
+               priority: str = "normal") -> str:
+        """
+        Queue a video for rendering
+
+        Args:
+            script: The script content for the video
+            avatar_id: ID of the avatar to use
+            voice_id: Optional voice ID (default: the avatar's voice)
+            title: Title for the video
+            user: Who asked for it (users of the same class take turns)
+            priority: One of the priority classes
+
+        Returns:
+            ticket_id: Handle for status() and cancel()
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Mức ưu tiên phải là một trong: {', '.join(self.priorities)}")
+
+        with self._changed:
+            ticket_id = f"r{next(self._ids)}"
+            self._tickets[ticket_id] = {
+                "ticket_id": ticket_id,
+                "state": QUEUED,
+                "priority": priority,
+                "user": user,
+                "title": title,
+                "script": script,
+                "avatar_id": avatar_id,
+                "voice_id": voice_id,
+                "estimate": estimate_render_seconds(script),
+                "trace_id": registry.current_trace(),
+                "queued_at": time.time(),
+                "video_id": None,
+                "error": None,
+            }
+            self._queues[priority].setdefault(user, deque()).append(ticket_id)
+            self._changed.notify_all()
+        return ticket_id
+
+    def cancel(self, ticket_id: str) -> bool:
+        """
+        Remove a ticket that is still waiting
+
+        Returns:
+            True if the ticket was cancelled (False once it has been submitted)
+        """
+        with self._changed:
+            ticket = self._tickets.get(ticket_id)
+            if not ticket or ticket["state"] != QUEUED:
+                return False
+            users = self._queues[ticket["priority"]]
+            users[ticket["user"]].remove(ticket_id)
+            if not users[ticket["user"]]:
+                del users[ticket["user"]]
+            ticket["state"] = CANCELLED
+            ticket["finished_at"] = time.time()
+            ticket.pop("script", None)
+            return True
+
+    def _queue_order(self) -> Iterator[str]:
+        """Waiting tickets in the order they will be dispatched (caller holds the lock)"""
+        for users in self._queues.values():
+            tickets = list(users.values())
+            for turn in range(max((len(queue) for queue in tickets), default=0)):
+                for queue in tickets:
+                    if turn < len(queue):
+                        yield queue[turn]
+
+    def _pop_next(self) -> Optional[Dict]:
+        """Take the next ticket to dispatch (caller holds the lock)"""
+        for users in self._queues.values():
+            if users:
+                user, queue = next(iter(users.items()))
+                ticket_id = queue.popleft()
+                # The user goes to the back of the line, or leaves it
+                del users[user]
+                if queue:
+                    users[user] = queue
+                return self._tickets[ticket_id]
+        return None
+
+    # ---------- Dispatch ----------
+
+    def _dispatch_loop(self):
+        """Hand waiting tickets to the submit workers while render slots are free"""
+        while True:
+            unfinished = self._unfinished_jobs()
+            with self._changed:
+                self._expire_slots()
+                self._prune_tickets()
+                own = {ticket["video_id"] for ticket in self._tickets.values() if ticket["video_id"]}
+                self._external = {video_id: created_at for video_id, created_at in unfinished.items()
+                                  if video_id not in own}
+                while self._rendering() < self.max_renders:
+                    ticket = self._pop_next()
+                    if ticket is None:
+                        break
+                    ticket["state"] = SUBMITTING
+                    self._slots[ticket["ticket_id"]] = time.time()
+                    registry.observe("render.queue_wait", time.time() - ticket["queued_at"])
+                    self._executor.submit(self._submit, ticket)
+                # Woken by submissions and freed slots; the timeout picks up renders
+                # started or finished by other processes, and expired slots
+                self._changed.wait(timeout=RENDER_SYNC_INTERVAL)
+
+    def _unfinished_jobs(self) -> Dict[str, float]:
+        """Unfinished renders in the shared job store: video_id -> submission time"""
+        jobs = self.heygen_service.job_store.list_jobs(
+            unfinished=True, since=time.time() - self.slot_timeout, limit=1000
+        )
+        return {job["video_id"]: job["created_at"].timestamp() for job in jobs}
+
+    def _rendering(self) -> int:
+        """Render slots in use, by this scheduler or elsewhere (caller holds the lock)"""
+        return len(self._slots) + len(self._external)
+
+    def _expire_slots(self):
+        """Free slots of renders that never reported back (caller holds the lock)"""
+        now = time.time()
+        for ticket_id, taken_at in list(self._slots.items()):
+            if now - taken_at > self.slot_timeout:
+                del self._slots[ticket_id]
+                self._tickets[ticket_id].setdefault("finished_at", now)
+
+    def _prune_tickets(self):
+        """Forget tickets that finished more than retention seconds ago (caller holds the lock)"""
+        now = time.time()
+        for ticket_id, ticket in list(self._tickets.items()):
+            if ticket_id not in self._slots and now - ticket.get("finished_at", now) > self.retention:
+                del self._tickets[ticket_id]
+
+    def _release(self, ticket_id: str):
+        """Free a ticket's render slot"""
+        with self._changed:
+            if self._slots.pop(ticket_id, None) is not None:
+                self._changed.notify_all()
+
+    def _submit(self, ticket: Dict):
+        """Submit one video to HeyGen (runs in a submit worker)"""
+        registry.set_trace(ticket["trace_id"])
+        try:
+            video_id = self.heygen_service.create_video(
+                script=ticket["script"],
+                avatar_id=ticket["avatar_id"],
+                voice_id=ticket["voice_id"],
+                title=ticket["title"],
+            )
+        except Exception as e:
+            with self._changed:
+                ticket["state"] = "failed"
+                ticket["error"] = str(e)
+                ticket["finished_at"] = time.time()
+                ticket.pop("script", None)
+                self._changed.notify_all()
+            self._release(ticket["ticket_id"])
+            return
+
+        with self._changed:
+            ticket["video_id"] = video_id
+            ticket["state"] = RENDERING
+            ticket["submitted_at"] = time.time()
+            ticket.pop("script", None)
+            self._changed.notify_all()
+        self.heygen_service.poller.track(video_id, ticket["estimate"])
+        self._watch(ticket)
+
+    def _watch(self, ticket: Dict):
+        """Release the ticket's slot once the poller or the webhook records the final status"""
+        def on_status(video_id: str, status_data: Dict):
+            if status_data.get("status") in TERMINAL_STATUSES:
+                self.heygen_service.job_store.unsubscribe(video_id, on_status)
+                self._on_status(ticket, status_data)
+
+        self.heygen_service.job_store.subscribe(ticket["video_id"], on_status)
+
+    def _on_status(self, ticket: Dict, status_data: Dict):
+        """Job store callback: a finished render gives its slot back"""
+        with self._changed:
+            ticket["state"] = status_data["status"]
+            ticket["finished_at"] = time.time()
+        self._release(ticket["ticket_id"])
+
+    # ---------- Status ----------
+
+    def _estimate_starts(self) -> Dict[str, float]:
+        """Seconds from now until each waiting ticket gets a slot (caller holds the lock)"""
+        now = time.time()
+        # When each slot frees up, assuming renders take about their estimate
+        free_at = [0.0] * max(0, self.max_renders - self._rendering())
+        for ticket_id, taken_at in self._slots.items():
+            free_at.append(max(0.0, taken_at + self._tickets[ticket_id]["estimate"] - now))
+        for created_at in self._external.values():
+            free_at.append(max(0.0, created_at + EXPECTED_RENDER_SECONDS - now))
+        heapq.heapify(free_at)
+
+        starts = {}
+        for ticket_id in self._queue_order():
+            start = heapq.heappop(free_at) if free_at else 0.0
+            starts[ticket_id] = start
+            heapq.heappush(free_at, start + self._tickets[ticket_id]["estimate"])
+        return starts
+
+    def status(self, ticket_id: str) -> Optional[Dict]:
+        """
+        Where a ticket stands
+
+        Returns:
+            Dictionary with state, priority, video_id, error and, while queued,
+            position (0 = next), eta_start and eta_done (seconds from now);
+            None for an unknown ticket
+        """
+        with self._changed:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                return None
+            result = {key: ticket[key] for key in ("ticket_id", "state", "priority", "title",
+                                                   "video_id", "error", "queued_at")}
+            result.update(position=None, eta_start=None, eta_done=None)
+            if ticket["state"] == QUEUED:
+                order: List[str] = list(self._queue_order())
+                start = self._estimate_starts()[ticket_id]
+                result.update(position=order.index(ticket_id), eta_start=start,
+                              eta_done=start + ticket["estimate"])
+            return result
+
+    def wait_submitted(self, ticket_id: str, timeout: float) -> Optional[Dict]:
+        """
+        Block until a ticket has left the queue (submitted, failed or cancelled)
+        or the timeout expires
+
+        Returns:
+            Latest status of the ticket (see status())
+        """
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                ticket = self._tickets.get(ticket_id)
+                remaining = deadline - time.time()
+                if ticket is None or ticket["state"] not in (QUEUED, SUBMITTING) or remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return self.status(ticket_id)
+
+    def snapshot(self) -> Dict:
+        """Cap, renders holding a slot and waiting tickets per priority class"""
+        with self._changed:
+            return {
+                "max_renders": self.max_renders,
+                "rendering": self._rendering(),
+                "queued": {
+                    priority: sum(len(queue) for queue in users.values())
+                    for priority, users in self._queues.items()
+                },
+            }
@@ -0,0 +1,157 @@
+"""
+Response Cache
+Content-addressed cache for Gemini responses: an in-memory LRU tier
+backed by a size-bounded disk tier
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import CACHE_FOLDER, GEMINI_CACHE_MEMORY_ENTRIES, GEMINI_CACHE_MAX_DISK_MB
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize Unicode form and whitespace so trivially different prompts share a key"""
+    text = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class ResponseCache:
+    def __init__(self,
+                 cache_folder: str = os.path.join(CACHE_FOLDER, "gemini"),
+                 memory_entries: int = GEMINI_CACHE_MEMORY_ENTRIES,
+                 max_disk_bytes: int = GEMINI_CACHE_MAX_DISK_MB * 1024 * 1024):
+        """
+        Initialize response cache
+
+        Args:
+            cache_folder: Folder of the disk tier
+            memory_entries: Maximum responses kept in memory
+            max_disk_bytes: Maximum total size of the disk tier
+        """
+        self.cache_folder = cache_folder
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._disk_sizes: Optional[Dict[str, int]] = None   # key -> bytes, loaded lazily
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+
+    @staticmethod
+    def make_key(model: str, operation: str, prompt: str, params: Optional[Dict] = None) -> str:
+        """
+        Build the cache key for a request
+
+        Args:
+            model: Model name
+            operation: Service operation (e.g. "enhance")
+            prompt: Full prompt sent to the model
+            params: Generation parameters affecting the output
+
+        Returns:
+            SHA-256 hex digest
+        """
+        material = json.dumps({
+            "model": model,
+            "operation": operation,
+            "prompt": hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest(),
+            "params": params or {},
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Disk tier path of a key"""
+        return os.path.join(self.cache_folder, f"{key}.txt")
+
+    def _load_disk_index(self):
+        """Scan the disk tier once (caller holds the lock)"""
+        if self._disk_sizes is None:
+            self._disk_sizes = {}
+            for entry in os.scandir(self.cache_folder):
+                if entry.name.endswith(".txt"):
+                    self._disk_sizes[entry.name[:-4]] = entry.stat().st_size
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            path = self._path(key)
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)   # mtime doubles as last-access time for eviction
+        except OSError:
+            return None
+
+        with self._lock:
+            self._remember(key, text)
+        return text
+
+    def set(self, key: str, text: str):
+        """Store a response in both tiers"""
+        data = text.encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self._remember(key, text)
+            self._load_disk_index()
+            self._disk_sizes[key] = len(data)
+            self._evict_disk()
+
+    def _remember(self, key: str, text: str):
+        """Insert into the memory tier (caller holds the lock)"""
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Remove least recently used files until the disk tier fits (caller holds the lock)"""
+        total = sum(self._disk_sizes.values())
+        if total <= self.max_disk_bytes:
+            return
+
+        def last_access(key: str) -> float:
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._disk_sizes, key=last_access):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= self._disk_sizes.pop(key)
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            self._load_disk_index()
+            for key in list(self._disk_sizes):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_sizes = {}
@@ -0,0 +1,164 @@
+"""
+Scene Cache
+Rendered scene clips keyed by (scene text, avatar, voice), so re-rendering an
+edited script only submits the scenes whose text changed. Two tiers: clips
+already downloaded (content-addressed on disk, least recently used evicted
+first) and renders HeyGen already holds, found through the job store.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from config import CACHE_FOLDER, SCENE_CACHE_MAX_DISK_MB, JOB_RESUME_MAX_AGE
+
+
+def normalize_scene(text: str) -> str:
+    """Scene text as spoken: whitespace differences do not change the render"""
+    return " ".join(text.split())
+
+
+class SceneCache:
+    def __init__(self,
+                 job_store=None,
+                 cache_folder: str = os.path.join(CACHE_FOLDER, "scenes"),
+                 max_disk_bytes: int = SCENE_CACHE_MAX_DISK_MB * 1024 * 1024):
+        """
+        Initialize scene cache
+
+        Args:
+            job_store: JobStore of submitted videos (None = downloaded clips only)
+            cache_folder: Folder of the clips
+            max_disk_bytes: Maximum total size of the clips
+        """
+        self.job_store = job_store
+        self.cache_folder = cache_folder
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._disk_sizes: Optional[Dict[str, int]] = None   # key -> bytes, loaded lazily
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+
+    def make_key(self, text: str, avatar_id: str, voice_id: Optional[str] = None) -> str:
+        """Cache key of one scene rendered with an avatar and voice"""
+        material = json.dumps([normalize_scene(text), avatar_id, voice_id or ""], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Path of a cached clip"""
+        return os.path.join(self.cache_folder, f"{key}.mp4")
+
+    def _load_disk_index(self):
+        """Scan the clips once (caller holds the lock)"""
+        if self._disk_sizes is None:
+            self._disk_sizes = {}
+            for entry in os.scandir(self.cache_folder):
+                if entry.name.endswith(".mp4"):
+                    self._disk_sizes[entry.name[:-4]] = entry.stat().st_size
+
+    # ---------- Lookups ----------
+
+    def get_clip(self, key: str) -> Optional[str]:
+        """
+        Path of a downloaded clip
+
+        Returns:
+            Clip path, or None if the scene was never downloaded (or was evicted)
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)   # mtime doubles as last-access time for eviction
+        except OSError:
+            return None
+        return path
+
+    def find_render(self, text: str, avatar_id: str, voice_id: Optional[str] = None) -> Optional[str]:
+        """
+        Video already submitted to HeyGen for the same scene (rendering or completed)
+
+        Returns:
+            video_id, or None if this scene was never submitted (or its render failed)
+        """
+        if self.job_store is None:
+            return None
+        # Scenes are submitted normalized (see SceneVideoJob), so look them up the same way
+        job = self.job_store.find_by_script(normalize_scene(text), avatar_id, voice_id)
+        if not job:
+            return None
+        # Unfinished jobs older than this are no longer monitored and may never finish
+        if job["status"] != "completed" and time.time() - job["created_at"].timestamp() > JOB_RESUME_MAX_AGE:
+            return None
+        return job["video_id"]
+
+    # ---------- Writes ----------
+
+    def put_clip(self, key: str, path: str, keep: Iterable[str] = ()) -> str:
+        """
+        Move a downloaded clip into the cache
+
+        Args:
+            key: Cache key of the scene
+            path: Downloaded clip (moved, not copied)
+            keep: Keys that must not be evicted (e.g. the other scenes of the same video)
+
+        Returns:
+            Path of the cached clip
+        """
+        cached_path = self._path(key)
+        try:
+            os.replace(path, cached_path)
+        except OSError:
+            # Different file system: copy, then drop the original
+            shutil.copyfile(path, f"{cached_path}.tmp")
+            os.replace(f"{cached_path}.tmp", cached_path)
+            os.remove(path)
+
+        with self._lock:
+            self._load_disk_index()
+            self._disk_sizes[key] = os.path.getsize(cached_path)
+            self._evict_disk(set(keep) | {key})
+        return cached_path
+
+    def _evict_disk(self, keep: set):
+        """Remove least recently used clips until the cache fits (caller holds the lock)"""
+        total = sum(self._disk_sizes.values())
+        if total <= self.max_disk_bytes:
+            return
+
+        def last_access(key: str) -> float:
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._disk_sizes, key=last_access):
+            if total <= self.max_disk_bytes:
+                break
+            if key in keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= self._disk_sizes.pop(key)
+
+    def clear(self):
+        """Drop every cached clip"""
+        with self._lock:
+            self._load_disk_index()
+            for key in list(self._disk_sizes):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_sizes = {}
+
+    def stats(self) -> Dict[str, int]:
+        """Number and total size of cached clips"""
+        with self._lock:
+            self._load_disk_index()
+            return {"clips": len(self._disk_sizes), "bytes": sum(self._disk_sizes.values())}
@@ -0,0 +1,143 @@
+"""
+Scene Splitter
+Splits long scripts at paragraph/sentence boundaries into balanced scenes
+"""
+import hashlib
+import math
+import re
+from typing import List, Tuple
+from config import SCENE_MAX_CHARS, SCENE_STABLE_MIN_CHARS, SCENE_STABLE_CUT_EVERY
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+")
+
+# Rough speaking rate used to estimate render time (characters per second)
+SPEAKING_CHARS_PER_SECOND = 15
+RENDER_TIME_FACTOR = 1.5
+MIN_RENDER_SECONDS = 60
+
+
+def _split_long_text(text: str, max_chars: int) -> List[str]:
+    """Split text longer than max_chars at sentence, then word boundaries"""
+    units = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            units.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            units.append(sentence)
+    return units
+
+
+def _split_units(script: str, max_chars: int) -> List[Tuple[str, str]]:
+    """Sentence-level units of a script, each with the separator that followed it"""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", script):
+        pieces = _split_long_text(paragraph.strip(), max_chars)
+        units.extend((piece, " ") for piece in pieces[:-1])
+        if pieces:
+            units.append((pieces[-1], "\n\n"))
+    return units
+
+
+def _is_anchor(text: str, cut_every: int) -> bool:
+    """Whether a sentence's own content makes it a scene boundary (about 1 in cut_every)"""
+    digest = hashlib.sha256(" ".join(text.split()).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], "big") % cut_every == 0
+
+
+def split_script(script: str, max_chars: int = SCENE_MAX_CHARS) -> List[str]:
+    """
+    Split a script into scenes of roughly equal length
+
+    Paragraphs are kept whole when they fit; longer ones are split between sentences.
+
+    Args:
+        script: The full script
+        max_chars: Maximum characters per scene
+
+    Returns:
+        List of scene texts (a single scene if the script already fits)
+    """
+    script = script.strip()
+    if len(script) <= max_chars:
+        return [script] if script else []
+
+    units = _split_units(script, max_chars)
+
+    # Characters not yet closed into a scene, and scenes still to fill
+    remaining = sum(len(text) + len(separator) for text, separator in units)
+    scenes_left = math.ceil(remaining / max_chars)
+
+    scenes = []
+    current = ""
+    for text, separator in units:
+        # Re-balance the target against what is left so the last scene is not a stub
+        target = remaining / max(scenes_left, 1)
+        if current and (len(current) + len(text) > max_chars
+                        or len(current) + len(text) / 2 > target):
+            scenes.append(current.strip())
+            remaining -= len(current)
+            scenes_left = max(scenes_left - 1, math.ceil(remaining / max_chars))
+            current = ""
+        current += text + separator
+    if current.strip():
+        scenes.append(current.strip())
+    return scenes
+
+
+def estimate_render_seconds(text: str) -> float:
+    """Estimate how long HeyGen takes to render a text (used to schedule status polls)"""
+    speaking_seconds = len(text) / SPEAKING_CHARS_PER_SECOND
+    return max(MIN_RENDER_SECONDS, speaking_seconds * RENDER_TIME_FACTOR)
+
+
+def split_script_stable(script: str,
+                        max_chars: int = SCENE_MAX_CHARS,
+                        min_chars: int = SCENE_STABLE_MIN_CHARS,
+                        cut_every: int = SCENE_STABLE_CUT_EVERY) -> List[str]:
+    """
+    Split a script into scenes whose boundaries survive edits elsewhere in the script
+
+    Unlike split_script, which balances scenes over the whole script, a scene
+    ends after a sentence chosen by its own content (once the scene has at
+    least min_chars), or before it would exceed max_chars. Editing one
+    paragraph only changes the scenes around it; the others keep their exact
+    text, so their renders can be reused.
+
+    Args:
+        script: The full script
+        max_chars: Maximum characters per scene
+        min_chars: Minimum characters before a scene may end at a boundary sentence
+        cut_every: About one sentence in cut_every is a boundary
+
+    Returns:
+        List of scene texts
+    """
+    script = script.strip()
+    if not script:
+        return []
+
+    # Scenes keep the separator after their last sentence until the end
+    scenes = []
+    current = ""
+    for text, separator in _split_units(script, max_chars):
+        if current and len(current) + len(text) > max_chars:
+            scenes.append(current)
+            current = ""
+        current += text + separator
+        if len(current) >= min_chars and _is_anchor(text, cut_every):
+            scenes.append(current)
+            current = ""
+    if current:
+        # A short tail joins the previous scene rather than rendering as a stub
+        if scenes and len(current) < min_chars and len(scenes[-1]) + len(current) <= max_chars:
+            scenes[-1] += current
+        else:
+            scenes.append(current)
+    return [scene.strip() for scene in scenes]
@@ -0,0 +1,407 @@
+"""
+Scene Video
+Renders a long script as parallel per-scene HeyGen jobs, tracks them as one
+logical video and reassembles the finished clips locally. With a scene cache,
+scenes rendered before (same text, avatar and voice) are reused, so an edited
+script only renders the scenes that changed.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from config import SCENE_MAX_CHARS, SCENE_RENDER_WORKERS
+from scene_splitter import split_script, split_script_stable, estimate_render_seconds
+from scene_cache import normalize_scene
+
+
+def concat_videos(clip_paths: List[str], output_path: str):
+    """
+    Concatenate clips (same codec/resolution, as HeyGen renders them) without re-encoding
+
+    Args:
+        clip_paths: Clips in playback order
+        output_path: Path of the assembled video
+    """
+    if len(clip_paths) == 1:
+        shutil.copyfile(clip_paths[0], output_path)
+        return
+
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise Exception("Không tìm thấy ffmpeg để ghép các cảnh video")
+
+    with tempfile.NamedTemporaryFile('w', suffix=".txt", delete=False, encoding='utf-8') as f:
+        for path in clip_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        list_path = f.name
+
+    try:
+        result = subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path, "-c", "copy", output_path],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise Exception(f"Lỗi khi ghép video: {result.stderr.strip()}")
+    finally:
+        os.remove(list_path)
+
+
+class SceneVideoJob:
+    def __init__(self,
+                 heygen_service,
+                 script: str,
+                 avatar_id: str,
+                 voice_id: Optional[str] = None,
+                 title: str = "Educational Video",
+                 max_chars: int = SCENE_MAX_CHARS,
+                 max_workers: int = SCENE_RENDER_WORKERS,
+                 scene_cache=None,
+                 scheduler=None,
+                 user: str = "default",
+                 priority: str = "normal"):
+        """
+        Initialize a multi-scene job
+
+        Args:
+            heygen_service: HeyGenService used to render and track scenes
+            script: The full script
+            avatar_id: ID of the avatar to use
+            voice_id: Optional voice ID
+            title: Title of the logical video (scenes get " - Cảnh N")
+            max_chars: Maximum characters per scene
+            max_workers: Scenes submitted concurrently
+            scene_cache: Optional SceneCache; scenes are then split at edit-stable
+                boundaries and cached or already submitted scenes are not rendered again
+            scheduler: Optional RenderScheduler queueing the scenes (default: submit directly)
+            user: Who the scenes are queued for (with a scheduler)
+            priority: Priority class of the scenes (with a scheduler)
+        """
+        self.heygen_service = heygen_service
+        self.avatar_id = avatar_id
+        self.voice_id = voice_id
+        self.title = title
+        self.max_workers = max_workers
+        self.scene_cache = scene_cache
+        self.scheduler = scheduler
+        self.user = user
+        self.priority = priority
+
+        texts = split_script_stable(script, max_chars) if scene_cache else split_script(script, max_chars)
+        self.scenes: List[Dict] = [
+            {"index": i, "text": text, "video_id": None, "ticket": None, "clip_path": None,
+             "key": None, "cached": False, "reused": False, "error": None}
+            for i, text in enumerate(texts)
+        ]
+        self._lock = threading.Lock()
+        if scene_cache:
+            self._reuse_cached()
+
+    def _reuse_cached(self):
+        """Attach downloaded clips and earlier renders of identical scenes"""
+        for scene in self.scenes:
+            scene["key"] = self.scene_cache.make_key(scene["text"], self.avatar_id, self.voice_id)
+            scene["clip_path"] = self.scene_cache.get_clip(scene["key"])
+            if scene["clip_path"]:
+                scene["cached"] = True
+                continue
+            self._reuse_render(scene)
+
+    def _reuse_render(self, scene: Dict) -> bool:
+        """Attach an earlier render of the same scene, if HeyGen has one"""
+        video_id = self.scene_cache.find_render(scene["text"], self.avatar_id, self.voice_id)
+        if not video_id:
+            return False
+        scene["video_id"] = video_id
+        scene["reused"] = True
+        self.heygen_service.poller.track(video_id, estimate_render_seconds(scene["text"]))
+        return True
+
+    def _recover_clip(self, scene: Dict):
+        """
+        Drop a cached clip that is no longer on disk
+
+        Another job filling the cache may have evicted it since this job started;
+        the scene then falls back to its earlier render if HeyGen has one, otherwise
+        it is left unsubmitted for the caller to render again.
+        """
+        if not scene["clip_path"] or self.scene_cache.get_clip(scene["key"]):
+            return
+        with self._lock:
+            scene["clip_path"] = None
+            scene["cached"] = False
+        if not (scene["video_id"] or scene["ticket"]):
+            self._reuse_render(scene)
+
+    def _unsubmitted(self) -> List[Dict]:
+        """Scenes with no clip, render or ticket, after recovering evicted clips"""
+        for scene in self.scenes:
+            self._recover_clip(scene)
+        return [scene for scene in self.scenes
+                if not (scene["video_id"] or scene["ticket"] or scene["clip_path"])]
+
+    def _submit_scene(self, scene: Dict):
+        """Submit one scene as its own HeyGen video and start tracking it"""
+        title = f"{self.title} - Cảnh {scene['index'] + 1}"
+        # The job store records the script as sent; the cache finds it by the normalized text
+        text = normalize_scene(scene["text"]) if self.scene_cache else scene["text"]
+        if self.scheduler is not None:
+            # The scheduler submits it when a render slot frees up (see _resolve_ticket)
+            ticket = self.scheduler.submit(text, self.avatar_id, self.voice_id, title,
+                                           user=self.user, priority=self.priority)
+            with self._lock:
+                scene["ticket"] = ticket
+                scene["error"] = None
+            return
+        try:
+            video_id = self.heygen_service.create_video(
+                script=text,
+                avatar_id=self.avatar_id,
+                voice_id=self.voice_id,
+                title=title,
+                scenes=[text],
+            )
+            with self._lock:
+                scene["video_id"] = video_id
+                scene["error"] = None
+            self.heygen_service.poller.track(video_id, estimate_render_seconds(scene["text"]))
+        except Exception as e:
+            with self._lock:
+                scene["error"] = str(e)
+
+    def _submit(self, scenes: List[Dict]):
+        """Submit scenes concurrently"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scene-submit") as executor:
+            list(executor.map(self._submit_scene, scenes))
+
+    def submit(self) -> List[Dict]:
+        """
+        Submit every scene that has not been submitted (or cached) yet, including
+        scenes whose cached clip was evicted and that HeyGen holds no render of
+
+        Returns:
+            Scene list with video_ids or tickets (or submission errors)
+        """
+        self._submit(self._unsubmitted())
+        return self.scenes
+
+    def _resolve_ticket(self, scene: Dict):
+        """Pick up the video_id (or the error) of a scene queued in the scheduler"""
+        if not scene["ticket"] or scene["video_id"]:
+            return
+        ticket = self.scheduler.status(scene["ticket"])
+        with self._lock:
+            if ticket is None:
+                scene["error"] = "Không còn trong hàng đợi render"
+                scene["ticket"] = None
+            elif ticket["video_id"]:
+                scene["video_id"] = ticket["video_id"]
+            elif ticket["state"] in ("failed", "cancelled"):
+                scene["error"] = ticket["error"] or ticket["state"]
+                scene["ticket"] = None
+
+    def scene_status(self, scene: Dict) -> Optional[str]:
+        """
+        Latest known status of one scene (None = not submitted, e.g. its cached
+        clip was evicted; submit() renders it again)
+        """
+        if scene["clip_path"] and os.path.exists(scene["clip_path"]):
+            return "completed"
+        self._resolve_ticket(scene)
+        if scene["error"] and not scene["video_id"]:
+            return "failed"
+        if scene["ticket"] and not scene["video_id"]:
+            return "pending"
+        if not scene["video_id"]:
+            return None
+        status_data = self.heygen_service.job_store.get(scene["video_id"])
+        return status_data.get("status") if status_data else "pending"
+
+    def retry_failed(self) -> List[Dict]:
+        """
+        Re-render only the scenes that failed (submission or render), and the
+        scenes left unsubmitted by an evicted clip
+
+        Returns:
+            The scenes that were resubmitted
+        """
+        failed = [scene for scene in self.scenes if self.scene_status(scene) == "failed"]
+        for scene in failed:
+            scene["video_id"] = None
+            scene["ticket"] = None
+            scene["reused"] = False
+        failed += [scene for scene in self._unsubmitted() if scene not in failed]
+        self._submit(failed)
+        return failed
+
+    def status(self) -> Dict:
+        """
+        Aggregate status of the logical video
+
+        Returns:
+            Dictionary with status (pending, processing, completed, failed),
+            completed/failed/total counts, cached (downloaded clips) and reused
+            (earlier renders) counts, missing (scenes to submit again, see submit())
+            and per-scene statuses
+        """
+        statuses = [self.scene_status(scene) for scene in self.scenes]
+        completed = statuses.count("completed")
+        failed = statuses.count("failed")
+
+        if completed == len(statuses):
+            overall = "completed"
+        elif failed and completed + failed == len(statuses):
+            overall = "failed"
+        elif completed or any(status == "processing" for status in statuses):
+            overall = "processing"
+        else:
+            overall = "pending"
+
+        scenes = []
+        for scene, status in zip(self.scenes, statuses):
+            error = scene["error"]
+            if scene["video_id"] and status == "failed":
+                error = (self.heygen_service.job_store.get(scene["video_id"]) or {}).get("error")
+            scenes.append({"index": scene["index"], "video_id": scene["video_id"],
+                           "status": status, "error": error,
+                           "cached": scene["cached"], "reused": scene["reused"]})
+
+        return {
+            "status": overall,
+            "completed": completed,
+            "failed": failed,
+            "total": len(statuses),
+            "cached": sum(1 for scene in self.scenes if scene["cached"]),
+            "reused": sum(1 for scene in self.scenes if scene["reused"]),
+            "missing": statuses.count(None),
+            "scenes": scenes,
+        }
+
+    def wait(self, timeout: float = 1800) -> Dict:
+        """
+        Wait until every scene has finished (completed or failed)
+
+        Returns:
+            Aggregate status
+        """
+        deadline = time.time() + timeout
+        for scene in self.scenes:
+            # Queued scenes first wait for the scheduler to submit them
+            while scene["ticket"] and not scene["video_id"] and time.time() < deadline:
+                self._resolve_ticket(scene)
+                if scene["ticket"] and not scene["video_id"]:
+                    time.sleep(1)
+            if scene["video_id"]:
+                self.heygen_service.job_store.wait(scene["video_id"], max(0, deadline - time.time()))
+        return self.status()
+
+    def video_urls(self) -> List[Optional[str]]:
+        """Video URL of each scene in playback order (None while unfinished or when cached)"""
+        urls = []
+        for scene in self.scenes:
+            status_data = self.heygen_service.job_store.get(scene["video_id"]) if scene["video_id"] else None
+            urls.append(status_data.get("video_url") if status_data else None)
+        return urls
+
+    def download(self, output_path: str, work_dir: Optional[str] = None) -> str:
+        """
+        Download every scene clip and assemble them into one video
+
+        Cached clips are pinned into work_dir first (hard link, or copy), so another
+        job evicting them from the cache cannot break the assembly. A scene whose
+        clip was evicted is downloaded again from its earlier render, or submitted
+        again if HeyGen has none (the download then has to wait for it).
+
+        Args:
+            output_path: Path of the assembled video
+            work_dir: Folder for the per-scene clips (defaults next to output_path)
+
+        Returns:
+            output_path
+        """
+        work_dir = work_dir or f"{os.path.splitext(output_path)[0]}_scenes"
+        if not os.path.exists(work_dir):
+            os.makedirs(work_dir)
+        clip_paths = [os.path.join(work_dir, f"scene_{i + 1:03d}.mp4") for i in range(len(self.scenes))]
+
+        if self.scene_cache:
+            for scene, path in zip(self.scenes, clip_paths):
+                if scene["clip_path"] and not self._pin(scene["clip_path"], path):
+                    self._recover_clip(scene)
+
+            unsubmitted = [scene for scene in self.scenes
+                           if not (scene["video_id"] or scene["ticket"] or scene["clip_path"])]
+            if unsubmitted:
+                self._submit(unsubmitted)
+                raise Exception("Một số cảnh đã bị xoá khỏi cache và đang được render lại")
+
+        urls = self.video_urls()
+        if any(url is None and not os.path.exists(path) for url, path in zip(urls, clip_paths)):
+            raise Exception("Chưa có đủ video cho tất cả các cảnh")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scene-download") as executor:
+            futures = [
+                executor.submit(self._download_scene, scene, url, path)
+                for scene, url, path in zip(self.scenes, urls, clip_paths)
+                if not os.path.exists(path)
+            ]
+            for future in futures:
+                future.result()
+
+        if self.scene_cache:
+            # Fresh clips join the cache, where the next render of an edited script finds them
+            keys = [scene["key"] for scene in self.scenes]
+            for scene, path in zip(self.scenes, clip_paths):
+                if not scene["clip_path"] and self._pin(path, f"{path}.cache"):
+                    scene["clip_path"] = self.scene_cache.put_clip(scene["key"], f"{path}.cache", keep=keys)
+
+        concat_videos(clip_paths, output_path)
+
+        if self.scene_cache:
+            # The pinned clips are only links to (or copies of) the cached ones
+            for path in clip_paths:
+                os.remove(path)
+            try:
+                os.rmdir(work_dir)   # only removed once empty
+            except OSError:
+                pass
+        return output_path
+
+    @staticmethod
+    def _pin(source: str, path: str) -> bool:
+        """
+        Hard-link (or copy, across file systems) a clip to path
+
+        Returns:
+            False if the source no longer exists
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        try:
+            os.link(source, path)
+        except FileNotFoundError:
+            return False
+        except OSError:
+            try:
+                shutil.copyfile(source, path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _download_scene(self, scene: Dict, url: str, path: str):
+        """Download one clip; an expired URL (e.g. of a reused older render) is refreshed once"""
+        try:
+            self.heygen_service.download_video(url, path)
+        except Exception:
+            if not scene["reused"]:
+                raise
+            status_data = self.heygen_service.get_video_status(scene["video_id"])
+            if not status_data.get("video_url"):
+                raise
+            self.heygen_service.job_store.update(scene["video_id"], status_data, source="manual")
+            self.heygen_service.download_video(status_data["video_url"], path)
@@ -0,0 +1,220 @@
+"""
+Script Index
+Persistent SQLite metadata index for Script Folder, kept up to date by
+FileService and reconciled incrementally by mtime
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from config import SCRIPT_INDEX_PATH, SCRIPT_INDEX_RESCAN_INTERVAL, SUPPORTED_FILE_FORMATS
+
+
+class ScriptIndex:
+    def __init__(self,
+                 script_folder: str,
+                 db_path: str = SCRIPT_INDEX_PATH,
+                 rescan_interval: float = SCRIPT_INDEX_RESCAN_INTERVAL):
+        """
+        Initialize script index
+
+        Args:
+            script_folder: Folder being indexed
+            db_path: SQLite database file
+            rescan_interval: Seconds after which files are re-stat'ed even if the folder looks unchanged
+        """
+        self.script_folder = os.path.abspath(script_folder)
+        self._display_folder = script_folder   # paths are returned as FileService builds them
+        self.db_path = db_path
+        self.rescan_interval = rescan_interval
+
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self._lock = threading.Lock()
+        self._changes = 0   # reconciliations that found the folder changed
+        self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scripts (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                format TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scripts_folder_mtime ON scripts (folder, mtime DESC);
+            CREATE INDEX IF NOT EXISTS idx_scripts_folder_format ON scripts (folder, format, mtime DESC);
+            CREATE TABLE IF NOT EXISTS folders (
+                folder TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                scanned_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    # ---------- Updates ----------
+
+    def _upsert_row(self, path: str, stat: os.stat_result):
+        """Insert or update one file (caller holds the lock)"""
+        name = os.path.basename(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO scripts (path, folder, name, format, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, self.script_folder, name, os.path.splitext(name)[1].lower().lstrip('.'),
+             stat.st_size, stat.st_mtime),
+        )
+
+    def upsert(self, file_path: str):
+        """Record a saved file"""
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self.remove(file_path)
+        with self._lock:
+            self._upsert_row(path, stat)
+            self._conn.commit()
+
+    def remove(self, file_path: str):
+        """Forget a deleted file"""
+        with self._lock:
+            self._conn.execute("DELETE FROM scripts WHERE path = ?", (os.path.abspath(file_path),))
+            self._conn.commit()
+
+    def reconcile(self, force: bool = False):
+        """
+        Bring the index in line with the folder
+
+        The folder is only scanned when its mtime changed (files added/removed/renamed)
+        or the rescan interval elapsed (files edited in place); otherwise this is one query.
+        Only files whose size or mtime changed are rewritten.
+        """
+        try:
+            folder_mtime = os.stat(self.script_folder).st_mtime
+        except OSError:
+            return
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime, scanned_at FROM folders WHERE folder = ?", (self.script_folder,)
+            ).fetchone()
+            if not force and row and row[0] == folder_mtime and now - row[1] < self.rescan_interval:
+                return
+
+            known = {
+                path: (size, mtime) for path, size, mtime in self._conn.execute(
+                    "SELECT path, size, mtime FROM scripts WHERE folder = ?", (self.script_folder,)
+                )
+            }
+            seen = set()
+            changed = False
+            for entry in os.scandir(self.script_folder):
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in SUPPORTED_FILE_FORMATS:
+                    continue
+                path = os.path.abspath(entry.path)
+                seen.add(path)
+                stat = entry.stat()
+                if known.get(path) != (stat.st_size, stat.st_mtime):
+                    self._upsert_row(path, stat)
+                    changed = True
+
+            removed = [(path,) for path in known if path not in seen]
+            if removed:
+                self._conn.executemany("DELETE FROM scripts WHERE path = ?", removed)
+            if removed or changed:
+                self._changes += 1
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO folders (folder, mtime, scanned_at) VALUES (?, ?, ?)",
+                (self.script_folder, folder_mtime, now),
+            )
+            self._conn.commit()
+
+    # ---------- Queries ----------
+
+    @staticmethod
+    def _filters(name_contains: Optional[str], format: Optional[str],
+                 min_size: Optional[int], max_size: Optional[int]):
+        """Build the WHERE clause shared by query and count"""
+        clauses, params = [], []
+        if name_contains:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            escaped = name_contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if format:
+            clauses.append("format = ?")
+            params.append(format.lower().lstrip('.'))
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("size <= ?")
+            params.append(max_size)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    def query(self,
+              limit: Optional[int] = None,
+              offset: int = 0,
+              name_contains: Optional[str] = None,
+              format: Optional[str] = None,
+              min_size: Optional[int] = None,
+              max_size: Optional[int] = None) -> List[Dict]:
+        """
+        Newest-first page of scripts
+
+        Args:
+            limit: Maximum rows (None for all)
+            offset: Rows to skip
+            name_contains: Case-insensitive substring of the file name
+            format: 'txt' or 'docx'
+            min_size: Minimum size in bytes
+            max_size: Maximum size in bytes
+
+        Returns:
+            List of dictionaries with name, path, size, modified
+        """
+        self.reconcile()
+        where, params = self._filters(name_contains, format, min_size, max_size)
+        sql = f"SELECT name, size, mtime FROM scripts WHERE folder = ?{where} ORDER BY mtime DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(
+                sql, [self.script_folder, *params, -1 if limit is None else limit, offset]
+            ).fetchall()
+
+        return [
+            {
+                'name': name,
+                'path': os.path.join(self._display_folder, name),
+                'size': size,
+                'modified': datetime.fromtimestamp(mtime),
+            }
+            for name, size, mtime in rows
+        ]
+
+    def count(self,
+              name_contains: Optional[str] = None,
+              format: Optional[str] = None,
+              min_size: Optional[int] = None,
+              max_size: Optional[int] = None) -> int:
+        """Number of scripts matching the filters"""
+        self.reconcile()
+        where, params = self._filters(name_contains, format, min_size, max_size)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM scripts WHERE folder = ?{where}", [self.script_folder, *params]
+            ).fetchone()[0]
+
+    def signature(self) -> int:
+        """
+        Cheap fingerprint of the folder contents: a counter that increases whenever
+        reconcile() finds files added, removed, renamed or edited outside upsert/remove
+
+        Changes made through upsert/remove do not count (their callers update the
+        search index themselves), and no rows are read when nothing changed.
+        """
+        self.reconcile()
+        return self._changes
@@ -0,0 +1,211 @@
+"""
+Script Search
+Full-text inverted index (SQLite FTS5) over saved scripts with
+diacritic-insensitive Vietnamese matching and ranked snippets
+"""
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional
+from config import SEARCH_INDEX_PATH
+
+SNIPPET_BEFORE = 60
+SNIPPET_AFTER = 160
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _fold_char(char: str) -> str:
+    """Fold one character to its lowercase base letter (ấ -> a, Đ -> d)"""
+    if char in "đĐ":
+        return "d"
+    base = unicodedata.normalize("NFD", char)[0]
+    return base.lower() if len(base.lower()) == 1 else char
+
+
+def fold_text(text: str) -> str:
+    """
+    Remove Vietnamese diacritics and lowercase, one output character per input character
+
+    The 1:1 mapping lets match offsets found in folded text be reused on the original.
+    Input is expected in NFC form.
+    """
+    return "".join(_fold_char(char) if ord(char) > 127 else char.lower() for char in text)
+
+
+def query_tokens(query: str) -> List[str]:
+    """Folded search tokens of a user query"""
+    return TOKEN_PATTERN.findall(fold_text(unicodedata.normalize("NFC", query)))
+
+
+class ScriptSearchIndex:
+    def __init__(self, db_path: str = SEARCH_INDEX_PATH):
+        """
+        Initialize search index
+
+        Args:
+            db_path: SQLite database file
+        """
+        folder = os.path.dirname(db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS script_fts USING fts5(
+                path UNINDEXED,
+                name,
+                body,
+                content UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE TABLE IF NOT EXISTS script_docs (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                mtime REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._signature = None
+
+    # ---------- Updates ----------
+
+    def add(self, file_path: str, content: str, mtime: Optional[float] = None):
+        """
+        Index (or re-index) one script
+
+        Args:
+            file_path: Path of the script
+            content: Text content of the script
+            mtime: File mtime (read from disk if not provided)
+        """
+        path = os.path.abspath(file_path)
+        if mtime is None:
+            mtime = os.path.getmtime(path)
+        content = unicodedata.normalize("NFC", content)
+        name = os.path.basename(path)
+
+        with self._lock:
+            # script_docs.id doubles as the FTS rowid so updates never scan the FTS table
+            row = self._conn.execute("SELECT id FROM script_docs WHERE path = ?", (path,)).fetchone()
+            if row:
+                doc_id = row[0]
+                self._conn.execute("DELETE FROM script_fts WHERE rowid = ?", (doc_id,))
+                self._conn.execute("UPDATE script_docs SET mtime = ? WHERE id = ?", (mtime, doc_id))
+            else:
+                doc_id = self._conn.execute(
+                    "INSERT INTO script_docs (path, mtime) VALUES (?, ?)", (path, mtime)
+                ).lastrowid
+            self._conn.execute(
+                "INSERT INTO script_fts (rowid, path, name, body, content) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, path, fold_text(os.path.splitext(name)[0]), fold_text(content), content),
+            )
+            self._conn.commit()
+
+    def remove(self, file_path: str):
+        """Drop one script from the index"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM script_docs WHERE path = ?", (path,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM script_fts WHERE rowid = ?", (row[0],))
+                self._conn.execute("DELETE FROM script_docs WHERE id = ?", (row[0],))
+                self._conn.commit()
+
+    def is_current(self, signature: Optional[int]) -> bool:
+        """Check whether the last sync() was made with this listing signature"""
+        return signature is not None and signature == self._signature
+
+    def sync(self, scripts: List[Dict], read_file: Callable[[str], str], signature: Optional[int] = None):
+        """
+        Index new/changed scripts and drop deleted ones
+
+        Args:
+            scripts: Current script listing (dictionaries with path and modified)
+            read_file: Function returning the text of a script
+            signature: Cheap fingerprint of the listing; the sync is skipped when unchanged
+        """
+        if self.is_current(signature):
+            return
+
+        with self._lock:
+            indexed = dict(self._conn.execute("SELECT path, mtime FROM script_docs").fetchall())
+
+        current = set()
+        for script in scripts:
+            path = os.path.abspath(script['path'])
+            current.add(path)
+            mtime = script['modified'].timestamp()
+            if indexed.get(path) != mtime:
+                try:
+                    self.add(path, read_file(script['path']), mtime)
+                except Exception:
+                    # Unreadable file: skip it, the next sync retries
+                    continue
+
+        for path in indexed:
+            if path not in current:
+                self.remove(path)
+
+        self._signature = signature
+
+    # ---------- Search ----------
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Ranked search (BM25) with highlighted snippets
+
+        Args:
+            query: Search text, with or without diacritics ("giao duc" matches "giáo dục")
+            limit: Maximum number of results
+
+        Returns:
+            List of dictionaries with name, path, score, snippet
+        """
+        tokens = query_tokens(query)
+        if not tokens:
+            return []
+
+        # Every token must match, the last one as a prefix (search-as-you-type)
+        terms = [f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, content, bm25(script_fts, 0.0, 5.0, 1.0) AS score FROM script_fts "
+                "WHERE script_fts MATCH ? ORDER BY score LIMIT ?",
+                (" AND ".join(terms), limit),
+            ).fetchall()
+
+        return [
+            {
+                'name': os.path.basename(path),
+                'path': path,
+                'score': -score,
+                'snippet': make_snippet(content, tokens),
+            }
+            for path, content, score in rows
+        ]
+
+
+def make_snippet(content: str, tokens: List[str]) -> str:
+    """Extract the text around the first match and bold every matched word (Markdown)"""
+    folded = fold_text(content)
+    pattern = re.compile(r"\b(" + "|".join(re.escape(token) for token in tokens) + r")\w*")
+
+    first = pattern.search(folded)
+    if not first:
+        return content[:SNIPPET_BEFORE + SNIPPET_AFTER].replace("\n", " ")
+
+    start = max(0, first.start() - SNIPPET_BEFORE)
+    end = min(len(content), first.start() + SNIPPET_AFTER)
+
+    parts, cursor = [], start
+    for match in pattern.finditer(folded, start, end):
+        parts.append(content[cursor:match.start()])
+        parts.append(f"**{content[match.start():match.end()]}**")
+        cursor = match.end()
+    parts.append(content[cursor:end])
+
+    snippet = "".join(parts).replace("\n", " ")
+    return f"{'…' if start > 0 else ''}{snippet}{'…' if end < len(content) else ''}"
@@ -0,0 +1,147 @@
+"""
+Single Flight
+Coalesces concurrent identical requests: while a call for a key is in
+flight, later callers with the same key wait for it and receive its result
+(or its exception) instead of issuing their own upstream call. Nothing is
+kept once the flight lands; caching is left to the callers.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+
+class _Flight:
+    """One in-flight call and everything its waiters need"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        # Streams only: chunks produced so far, guarded by the condition
+        self.chunks: List[Any] = []
+        self.changed = threading.Condition()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        Initialize a single-flight group
+
+        Args:
+            name: Group name (used for the stream producer threads)
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._streams: Dict[Hashable, _Flight] = {}
+        self.calls = 0     # upstream calls made
+        self.shared = 0    # requests answered by another caller's call
+
+    def _join(self, flights: Dict[Hashable, _Flight], key: Hashable):
+        """Return (flight, is_leader), registering a new flight if none is in the air"""
+        with self._lock:
+            flight = flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return flight, False
+            flight = flights[key] = _Flight()
+            self.calls += 1
+            return flight, True
+
+    def _land(self, flights: Dict[Hashable, _Flight], key: Hashable, flight: _Flight):
+        """Forget a finished flight so the next request goes upstream again"""
+        with self._lock:
+            if flights.get(key) is flight:
+                del flights[key]
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        """
+        Call function once for all concurrent callers with the same key
+
+        Args:
+            key: Identity of the request (e.g. ("video_status", video_id))
+            function: The upstream call
+
+        Returns:
+            The function's result (the same object for every caller of the flight)
+
+        Raises:
+            Whatever the function raised, in every caller of the flight
+        """
+        flight, leader = self._join(self._flights, key)
+        if leader:
+            try:
+                flight.result = function()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                self._land(self._flights, key, flight)
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key: Hashable, function: Callable[[], Iterable[Any]]) -> Iterator[Any]:
+        """
+        Share one upstream stream among all concurrent callers with the same key
+
+        The stream is consumed by a background thread into a buffer, so every
+        caller receives all chunks from the start (late joiners catch up) and
+        one caller stopping early does not cut the others off.
+
+        Args:
+            key: Identity of the request
+            function: Returns the upstream iterable (called once per flight)
+
+        Yields:
+            The upstream chunks in order
+
+        Raises:
+            Whatever the upstream raised, after the chunks produced before the failure
+        """
+        flight, leader = self._join(self._streams, key)
+        if leader:
+            threading.Thread(target=self._produce, args=(key, flight, function),
+                             name=f"singleflight-{self.name}", daemon=True).start()
+
+        position = 0
+        while True:
+            with flight.changed:
+                while position >= len(flight.chunks) and not flight.done.is_set():
+                    flight.changed.wait()
+                chunks = flight.chunks[position:]
+                finished = flight.done.is_set()
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if finished and position >= len(flight.chunks):
+                break
+
+        if flight.error is not None:
+            raise flight.error
+
+    def _produce(self, key: Hashable, flight: _Flight, function: Callable[[], Iterable[Any]]):
+        """Consume the upstream stream into the flight's buffer"""
+        try:
+            for chunk in function():
+                with flight.changed:
+                    flight.chunks.append(chunk)
+                    flight.changed.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            self._land(self._streams, key, flight)
+            with flight.changed:
+                flight.done.set()
+                flight.changed.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """Upstream calls made, requests served by another caller's call, and flights in the air"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._flights) + len(self._streams),
+            }
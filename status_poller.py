@@ -0,0 +1,184 @@
+"""
+Status Poller
+One background thread that tracks every in-flight HeyGen video,
+polls their status in deduplicated batches with adaptive intervals
+and writes changes into the shared job store
+"""
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from config import (
+    VIDEO_POLL_MIN_INTERVAL,
+    VIDEO_POLL_MAX_INTERVAL,
+    EXPECTED_RENDER_SECONDS,
+    STATUS_POLL_WORKERS,
+)
+from job_store import JobStore
+
+
+class StatusPoller:
+    def __init__(self,
+                 fetch_status: Callable[[str], Dict],
+                 job_store: Optional[JobStore] = None,
+                 min_interval: float = VIDEO_POLL_MIN_INTERVAL,
+                 max_interval: float = VIDEO_POLL_MAX_INTERVAL,
+                 expected_duration: float = EXPECTED_RENDER_SECONDS,
+                 max_workers: int = STATUS_POLL_WORKERS):
+        """
+        Initialize status poller
+
+        Args:
+            fetch_status: Function returning the status dictionary for a video_id
+            job_store: Store receiving status updates (created if not provided)
+            min_interval: Shortest delay between two polls of one video
+            max_interval: Longest delay between two polls of one video
+            expected_duration: Default expected render time in seconds
+            max_workers: Concurrent status requests per batch
+        """
+        self.fetch_status = fetch_status
+        self.job_store = job_store or JobStore()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.expected_duration = expected_duration
+        self.max_workers = max_workers
+
+        # When set (e.g. webhooks are active) every video is polled at this slow fixed rate
+        self.fallback_interval: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._jobs: Dict[str, Dict] = {}         # video_id -> tracking info
+        self._schedule: List = []                # heap of (due_time, video_id)
+
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopped = False
+
+    # ---------- Public API ----------
+
+    def track(self, video_id: str, expected_duration: Optional[float] = None,
+              started_at: Optional[float] = None):
+        """
+        Start tracking a video (no-op if already tracked or finished)
+
+        Args:
+            video_id: The ID of the video to track
+            expected_duration: Expected render time in seconds for this video
+            started_at: When the render was submitted (default: now), e.g. for jobs resumed after a restart
+        """
+        if self.job_store.is_finished(video_id):
+            return
+
+        with self._lock:
+            if video_id in self._jobs:
+                return
+
+            now = time.time()
+            self._jobs[video_id] = {
+                "started_at": started_at or now,
+                "expected_duration": expected_duration or self.expected_duration,
+            }
+            # First poll right away so the UI gets a real status quickly,
+            # unless webhooks will deliver it
+            first_due = now + self.fallback_interval if self.fallback_interval else now
+            heapq.heappush(self._schedule, (first_due, video_id))
+            self._ensure_started()
+            self._wakeup.notify_all()
+
+    def untrack(self, video_id: str):
+        """Stop tracking a video"""
+        with self._lock:
+            self._jobs.pop(video_id, None)
+
+    def is_tracking(self, video_id: str) -> bool:
+        """Check whether a video is currently tracked"""
+        with self._lock:
+            return video_id in self._jobs
+
+    def stop(self):
+        """Stop the background thread"""
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    # ---------- Scheduling ----------
+
+    def _next_interval(self, job: Dict, now: float) -> float:
+        """
+        Poll rarely while the render is far from done, often near the expected finish,
+        then back off again the longer the video is overdue
+        """
+        if self.fallback_interval:
+            return self.fallback_interval
+
+        elapsed = now - job["started_at"]
+        expected = job["expected_duration"]
+        remaining = expected - elapsed
+
+        if remaining > 0:
+            interval = remaining / 2
+        else:
+            overdue = -remaining
+            interval = self.min_interval * (1 + overdue / max(expected, 1))
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _ensure_started(self):
+        """Start the background thread (caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="status-poll")
+            self._thread = threading.Thread(target=self._run, name="status-poller", daemon=True)
+            self._thread.start()
+
+    def _take_due_batch(self) -> List[str]:
+        """Wait for the next due videos and pop them from the schedule (deduplicated)"""
+        with self._lock:
+            while not self._stopped:
+                now = time.time()
+                if self._schedule and self._schedule[0][0] <= now:
+                    batch = []
+                    while self._schedule and self._schedule[0][0] <= now:
+                        _, video_id = heapq.heappop(self._schedule)
+                        if video_id in self._jobs and video_id not in batch:
+                            batch.append(video_id)
+                    if batch:
+                        return batch
+                    continue
+                timeout = self._schedule[0][0] - now if self._schedule else None
+                self._wakeup.wait(timeout)
+            return []
+
+    def _run(self):
+        """Background loop: poll each due batch concurrently, then reschedule"""
+        while True:
+            batch = self._take_due_batch()
+            if not batch:
+                return
+
+            # Skip videos finished in the meantime (e.g. by a webhook)
+            pending = [video_id for video_id in batch if not self.job_store.is_finished(video_id)]
+
+            futures = {video_id: self._executor.submit(self.fetch_status, video_id) for video_id in pending}
+            for video_id, future in futures.items():
+                try:
+                    self.job_store.update(video_id, future.result(), source="poll")
+                except Exception:
+                    # Transient error: keep tracking, retry on the next schedule
+                    pass
+
+            now = time.time()
+            with self._lock:
+                for video_id in batch:
+                    job = self._jobs.get(video_id)
+                    if job is None:
+                        continue
+                    if self.job_store.is_finished(video_id):
+                        self._jobs.pop(video_id, None)
+                        continue
+                    heapq.heappush(self._schedule, (now + self._next_interval(job, now), video_id))
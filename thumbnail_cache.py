@@ -0,0 +1,298 @@
+"""
+Thumbnail Cache
+Avatar preview images downloaded once, downscaled to grid size and kept
+content-addressed on disk (size-bounded, least recently used evicted first)
+with a small in-memory tier, so the UI renders them from local bytes
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from config import (
+    CACHE_FOLDER,
+    THUMBNAIL_SIZE,
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_MEMORY_ENTRIES,
+    THUMBNAIL_MAX_DISK_MB,
+    THUMBNAIL_FETCH_WORKERS,
+    THUMBNAIL_PREFETCH_WORKERS,
+    THUMBNAIL_RETRY_AFTER,
+)
+from http_transport import HttpTransport
+from metrics import registry
+
+
+def downscale(data: bytes, size: Tuple[int, int] = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """
+    Shrink an image to fit within size and re-encode it as JPEG
+
+    Args:
+        data: Original image bytes
+        size: Maximum (width, height)
+        quality: JPEG quality
+
+    Returns:
+        Thumbnail bytes (the original bytes if Pillow is not installed)
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", size)   # lets JPEG decoding skip most of the full-size pixels
+        image.thumbnail(size)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    def __init__(self,
+                 transport: Optional[HttpTransport] = None,
+                 cache_folder: str = os.path.join(CACHE_FOLDER, "thumbnails"),
+                 size: Tuple[int, int] = THUMBNAIL_SIZE,
+                 memory_entries: int = THUMBNAIL_MEMORY_ENTRIES,
+                 max_disk_bytes: int = THUMBNAIL_MAX_DISK_MB * 1024 * 1024,
+                 workers: int = THUMBNAIL_FETCH_WORKERS,
+                 prefetch_workers: int = THUMBNAIL_PREFETCH_WORKERS,
+                 retry_after: float = THUMBNAIL_RETRY_AFTER):
+        """
+        Initialize thumbnail cache
+
+        Args:
+            transport: Shared HTTP transport (a pooled one is created if not provided)
+            cache_folder: Folder of the disk tier
+            size: Maximum (width, height) of a thumbnail
+            memory_entries: Thumbnails kept in memory
+            max_disk_bytes: Maximum total size of the disk tier
+            workers: Concurrent preview downloads for get_many
+            prefetch_workers: Concurrent background downloads (kept apart so they never delay get_many)
+            retry_after: Seconds before a preview that failed to download is tried again
+        """
+        self.transport = transport or HttpTransport()
+        self.cache_folder = cache_folder
+        self.size = size
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk_sizes: Optional[Dict[str, int]] = None   # key -> bytes, loaded lazily
+        self._failed: Dict[str, float] = {}                 # key -> time of the failed download
+        self._queued: set = set()                           # keys waiting for a prefetch worker
+        self._inflight: Dict[str, threading.Event] = {}     # key -> set when its download ends
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_workers,
+                                                     thread_name_prefix="thumbnail-prefetch")
+
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+
+    def make_key(self, url: str) -> str:
+        """Cache key of a preview URL at this cache's thumbnail size"""
+        material = f"{self.size[0]}x{self.size[1]}:{url}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Disk tier path of a key"""
+        return os.path.join(self.cache_folder, f"{key}.jpg")
+
+    def _load_disk_index(self):
+        """Scan the disk tier once (caller holds the lock)"""
+        if self._disk_sizes is None:
+            self._disk_sizes = {}
+            for entry in os.scandir(self.cache_folder):
+                if entry.name.endswith(".jpg"):
+                    self._disk_sizes[entry.name[:-4]] = entry.stat().st_size
+
+    # ---------- Reads ----------
+
+    def get_cached(self, url: str) -> Optional[bytes]:
+        """Thumbnail from memory or disk, without downloading"""
+        key = self.make_key(url)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            path = self._path(key)
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)   # mtime doubles as last-access time for eviction
+        except OSError:
+            return None
+
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    def get(self, url: Optional[str]) -> Optional[bytes]:
+        """
+        Get the thumbnail of a preview image, downloading it on first use
+
+        Args:
+            url: Preview image URL
+
+        Returns:
+            Thumbnail bytes, or None if the image could not be fetched
+        """
+        if not url:
+            return None
+        data = self.get_cached(url)
+        if data is not None:
+            return data
+
+        key = self.make_key(url)
+        with self._lock:
+            failed_at = self._failed.get(key)
+            if failed_at is not None and time.time() - failed_at < self.retry_after:
+                return None
+            # A prefetch still waiting for a worker is taken over (it then does nothing)
+            self._queued.discard(key)
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = threading.Event()
+
+        if event is not None:
+            # Already downloading (e.g. prefetched): share that download
+            event.wait()
+            return self.get_cached(url)
+        return self._download(url, key)
+
+    def _download(self, url: str, key: str) -> Optional[bytes]:
+        """Download one thumbnail this thread registered in _inflight"""
+        data = None
+        try:
+            data = self._fetch(url)
+            self._store(key, data)
+        except Exception:
+            with self._lock:
+                self._failed[key] = time.time()
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key)
+            event.set()
+        return data
+
+    def get_many(self, urls: Iterable[Optional[str]]) -> Dict[str, Optional[bytes]]:
+        """
+        Thumbnails of several preview images, downloading the missing ones concurrently
+
+        Returns:
+            Dictionary of URL -> thumbnail bytes (None where the download failed)
+        """
+        urls = list(dict.fromkeys(url for url in urls if url))
+        results = {url: self.get_cached(url) for url in urls}
+        missing = [url for url, data in results.items() if data is None]
+        for url, data in zip(missing, self._executor.map(self.get, missing)):
+            results[url] = data
+        return results
+
+    def prefetch(self, urls: Iterable[Optional[str]]):
+        """
+        Download thumbnails in the background (e.g. the next grid page) without waiting
+
+        Prefetches run on their own workers, so they never delay get_many for the page
+        on screen; get() takes over a prefetch that has not started yet.
+        """
+        for url in urls:
+            if not url:
+                continue
+            key = self.make_key(url)
+            with self._lock:
+                if key in self._memory or key in self._queued or key in self._inflight:
+                    continue
+                self._queued.add(key)
+            self._prefetch_executor.submit(self._prefetch_one, url, key)
+
+    def _prefetch_one(self, url: str, key: str):
+        """Background download of one thumbnail"""
+        with self._lock:
+            if key not in self._queued:
+                return   # taken over by get()
+            self._queued.discard(key)
+        self.get(url)
+
+    # ---------- Writes ----------
+
+    def _fetch(self, url: str) -> bytes:
+        """Download a preview image and downscale it"""
+        with registry.span("thumbnail.fetch") as span:
+            response = self.transport.get(url, endpoint="thumbnail")
+            response.raise_for_status()
+            span.add_bytes(received=len(response.content))
+            return downscale(response.content, self.size)
+
+    def _store(self, key: str, data: bytes):
+        """Store a thumbnail in both tiers"""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self._failed.pop(key, None)
+            self._remember(key, data)
+            self._load_disk_index()
+            self._disk_sizes[key] = len(data)
+            self._evict_disk()
+
+    def _remember(self, key: str, data: bytes):
+        """Insert into the memory tier (caller holds the lock)"""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Remove least recently used files until the disk tier fits (caller holds the lock)"""
+        total = sum(self._disk_sizes.values())
+        if total <= self.max_disk_bytes:
+            return
+
+        def last_access(key: str) -> float:
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._disk_sizes, key=last_access):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            total -= self._disk_sizes.pop(key)
+
+    def clear(self):
+        """Drop every cached thumbnail"""
+        with self._lock:
+            self._memory.clear()
+            self._failed.clear()
+            self._load_disk_index()
+            for key in list(self._disk_sizes):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_sizes = {}
+
@@ -0,0 +1,249 @@
+"""
+Video Downloader
+Parallel, resumable downloads using HTTP Range segments written into a
+preallocated file, with size/hash verification and progress reporting
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from config import DOWNLOAD_SEGMENT_SIZE, DOWNLOAD_WORKERS, DOWNLOAD_RETRIES
+from http_transport import HttpTransport
+
+CHUNK_SIZE = 256 * 1024
+STATE_SAVE_INTERVAL = 4 * 1024 * 1024   # persist resume state every N bytes per segment
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class VideoDownloader:
+    def __init__(self,
+                 transport: Optional[HttpTransport] = None,
+                 segment_size: int = DOWNLOAD_SEGMENT_SIZE,
+                 max_workers: int = DOWNLOAD_WORKERS,
+                 retries: int = DOWNLOAD_RETRIES):
+        """
+        Initialize downloader
+
+        Args:
+            transport: Shared HTTP transport (a pooled one is created if not provided)
+            segment_size: Bytes per Range segment
+            max_workers: Concurrent segment downloads
+            retries: Retries per segment after a failure
+        """
+        self.transport = transport or HttpTransport()
+        self.segment_size = segment_size
+        self.max_workers = max_workers
+        self.retries = retries
+
+    def download(self,
+                 url: str,
+                 output_path: str,
+                 expected_sha256: Optional[str] = None,
+                 progress_callback: Optional[ProgressCallback] = None) -> str:
+        """
+        Download a file, resuming a previous partial download when possible
+
+        Args:
+            url: URL of the file
+            output_path: Local path to save the file
+            expected_sha256: Optional hex digest to verify after download
+            progress_callback: Called with (bytes_downloaded, total_bytes or None)
+
+        Returns:
+            output_path
+        """
+        part_path = f"{output_path}.part"
+        state_path = f"{output_path}.part.json"
+
+        # Probe with a 1-byte Range GET (HEAD is often rejected by signed CDN URLs)
+        probe = self.transport.get(url, endpoint="video_download", stream=True,
+                                   headers={"Range": "bytes=0-0"})
+        try:
+            probe.raise_for_status()
+            total = _parse_total_size(probe)
+            supports_ranges = probe.status_code == 206 and total is not None
+            validator = probe.headers.get("ETag") or probe.headers.get("Last-Modified")
+
+            if not supports_ranges:
+                # Server ignored the Range header: the probe is already the full body
+                self._write_stream(probe, part_path, 0, total, progress_callback)
+        finally:
+            probe.close()
+
+        if supports_ranges:
+            state, resumed = self._load_state(state_path, part_path, total, validator)
+            if total > self.segment_size:
+                self._download_segments(url, part_path, state_path, state, resumed, progress_callback)
+            else:
+                self._download_single(url, part_path, state_path, state, resumed, progress_callback)
+
+        self._verify(part_path, total, expected_sha256)
+        os.replace(part_path, output_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return output_path
+
+    # ---------- Resume state ----------
+
+    def _load_state(self, state_path: str, part_path: str, total: int, validator: Optional[str]):
+        """
+        Load resume state if it belongs to the same remote file, else start fresh
+
+        Returns:
+            Tuple of (state, resumed)
+        """
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("total") == total and state.get("validator") == validator \
+                    and state.get("segment_size") == self.segment_size \
+                    and os.path.exists(part_path):
+                state["done"] = {int(k): v for k, v in state.get("done", {}).items()}
+                return state, True
+        except (OSError, ValueError):
+            pass
+        return {"total": total, "validator": validator, "segment_size": self.segment_size, "done": {}}, False
+
+    @staticmethod
+    def _save_state(state_path: str, state: Dict):
+        """Persist resume state atomically"""
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    # ---------- Download strategies ----------
+
+    def _download_segments(self, url: str, part_path: str, state_path: str, state: Dict,
+                           resumed: bool, progress_callback: Optional[ProgressCallback]):
+        """Download concurrent Range segments into a preallocated file"""
+        total = state["total"]
+        segment_count = (total + self.segment_size - 1) // self.segment_size
+
+        # Preallocate so every segment can be written at its own offset
+        mode = 'r+b' if resumed else 'wb'
+        with open(part_path, mode) as f:
+            f.truncate(total)
+
+        lock = threading.Lock()
+        downloaded = [sum(state["done"].values())]
+        if progress_callback:
+            progress_callback(downloaded[0], total)
+
+        def commit(index: int, written: int):
+            # Only bytes already flushed to disk are recorded as done
+            with lock:
+                state["done"][index] = state["done"].get(index, 0) + written
+                self._save_state(state_path, state)
+
+        def fetch_segment(index: int):
+            seg_start = index * self.segment_size
+            seg_end = min(total, seg_start + self.segment_size) - 1
+            last_error = None
+
+            for _ in range(self.retries + 1):
+                with lock:
+                    start = seg_start + state["done"].get(index, 0)
+                if start > seg_end:
+                    return
+                try:
+                    with self.transport.get(url, endpoint="video_download", stream=True,
+                                            headers={"Range": f"bytes={start}-{seg_end}"}) as response:
+                        if response.status_code != 206:
+                            raise Exception(f"Server không hỗ trợ Range (HTTP {response.status_code})")
+                        with open(part_path, 'r+b') as f:
+                            f.seek(start)
+                            written = 0
+                            try:
+                                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                    if not chunk:
+                                        continue
+                                    f.write(chunk)
+                                    written += len(chunk)
+                                    with lock:
+                                        downloaded[0] += len(chunk)
+                                        current = downloaded[0]
+                                    if progress_callback:
+                                        progress_callback(current, total)
+                                    if written >= STATE_SAVE_INTERVAL:
+                                        f.flush()
+                                        commit(index, written)
+                                        written = 0
+                            finally:
+                                f.flush()
+                                commit(index, written)
+                except Exception as e:
+                    # Dropped connection: retry from the last written byte
+                    last_error = e
+            with lock:
+                complete = seg_start + state["done"].get(index, 0) > seg_end
+            if not complete:
+                raise Exception(f"Segment {index} thất bại: {last_error}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="download") as executor:
+            futures = [executor.submit(fetch_segment, i) for i in range(segment_count)]
+            for future in futures:
+                future.result()
+
+    def _download_single(self, url: str, part_path: str, state_path: str, state: Dict,
+                         resumed: bool, progress_callback: Optional[ProgressCallback]):
+        """Single-stream download, resuming from the end of the partial file"""
+        total = state["total"]
+        offset = min(os.path.getsize(part_path), total) if resumed else 0
+        self._save_state(state_path, state)
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self.transport.get(url, endpoint="video_download", stream=True, headers=headers) as response:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                offset = 0
+            self._write_stream(response, part_path, offset, total, progress_callback)
+
+    @staticmethod
+    def _write_stream(response, part_path: str, offset: int, total: Optional[int],
+                      progress_callback: Optional[ProgressCallback]):
+        """Write a response body into the part file starting at offset"""
+        mode = 'r+b' if offset else 'wb'
+        downloaded = offset
+        with open(part_path, mode) as f:
+            f.seek(offset)
+            f.truncate()
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                downloaded += len(chunk)
+                if progress_callback:
+                    progress_callback(downloaded, total)
+
+    # ---------- Verification ----------
+
+    @staticmethod
+    def _verify(part_path: str, total: Optional[int], expected_sha256: Optional[str]):
+        """Check the downloaded file against the expected size and hash"""
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            raise Exception(f"Kích thước file không khớp: {size} / {total} bytes")
+
+        if expected_sha256:
+            digest = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            if digest.hexdigest().lower() != expected_sha256.lower():
+                raise Exception("Checksum SHA-256 không khớp, file bị lỗi")
+
+
+def _parse_total_size(response) -> Optional[int]:
+    """Total file size from Content-Range (206) or Content-Length (200)"""
+    content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+    if match:
+        return int(match.group(1))
+    if response.status_code == 200 and response.headers.get("Content-Length"):
+        return int(response.headers["Content-Length"])
+    return None
@@ -0,0 +1,209 @@
+"""
+Webhook Server
+Optional local HTTP endpoint receiving HeyGen video completion/failure
+callbacks, verifying their signature and writing them into the job store
+"""
+import hashlib
+import hmac
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from config import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+from job_store import JobStore
+from metrics import registry
+
+SIGNATURE_HEADER = "Signature"
+MAX_BODY_BYTES = 1024 * 1024
+
+# HeyGen event type -> job status
+EVENT_STATUSES = {
+    "avatar_video.success": "completed",
+    "avatar_video.fail": "failed",
+}
+
+
+def sign_payload(body: bytes, secret: str) -> str:
+    """Compute the HMAC-SHA256 hex signature HeyGen sends with each callback"""
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def parse_event(payload: Dict) -> Optional[Tuple[str, Dict]]:
+    """
+    Convert a HeyGen webhook payload into (video_id, status_data)
+
+    Returns:
+        None for events that are not video completions/failures
+    """
+    status = EVENT_STATUSES.get(payload.get("event_type"))
+    event_data = payload.get("event_data") or {}
+    video_id = event_data.get("video_id")
+    if not status or not video_id:
+        return None
+
+    return video_id, {
+        "status": status,
+        "video_url": event_data.get("url"),
+        "thumbnail_url": event_data.get("thumbnail_url"),
+        "duration": event_data.get("duration"),
+        "error": event_data.get("msg") if status == "failed" else None,
+        "callback_id": event_data.get("callback_id"),
+    }
+
+
+class WebhookReceiver:
+    def __init__(self,
+                 job_store: JobStore,
+                 secret: Optional[str] = WEBHOOK_SECRET,
+                 host: str = WEBHOOK_HOST,
+                 port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH):
+        """
+        Initialize webhook receiver
+
+        Args:
+            job_store: Store receiving the verified status updates
+            secret: Webhook endpoint secret used to verify signatures
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            path: URL path of the callback endpoint
+        """
+        if not secret:
+            raise ValueError("HEYGEN_WEBHOOK_SECRET not found in environment variables")
+
+        self.job_store = job_store
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Local URL of the callback endpoint"""
+        host = "127.0.0.1" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}{self.path}"
+
+    def verify(self, body: bytes, signature: Optional[str]) -> bool:
+        """Check a callback signature in constant time"""
+        if not signature:
+            return False
+        return hmac.compare_digest(sign_payload(body, self.secret), signature)
+
+    def handle(self, body: bytes, signature: Optional[str]) -> int:
+        """
+        Verify and apply one callback
+
+        Returns:
+            HTTP status code to answer with
+        """
+        if not self.verify(body, signature):
+            return 401
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            return 400
+
+        event = parse_event(payload)
+        if event:
+            video_id, status_data = event
+            with registry.span("heygen.webhook", video_id=video_id, status=status_data.get("status")) as span:
+                span.add_bytes(received=len(body))
+                self.job_store.update(video_id, status_data, source="webhook")
+        return 200
+
+    def start(self):
+        """Start serving in a background thread"""
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?")[0] != receiver.path:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    self.send_response(413)
+                    self.end_headers()
+                    return
+                body = self.rfile.read(length)
+                self.send_response(receiver.handle(body, self.headers.get(SIGNATURE_HEADER)))
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="heygen-webhook", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def send_test_callback(url: str,
+                       video_id: str,
+                       secret: str,
+                       status: str = "completed",
+                       video_url: Optional[str] = None,
+                       error: Optional[str] = None) -> int:
+    """
+    Local stand-in for HeyGen: POST a signed fake callback to a receiver
+
+    Args:
+        url: Callback endpoint URL
+        video_id: Video the event refers to
+        secret: Secret used to sign the payload
+        status: "completed" or "failed"
+        video_url: Video URL reported on success
+        error: Error message reported on failure
+
+    Returns:
+        HTTP status code returned by the receiver
+    """
+    if status == "completed":
+        payload = {
+            "event_type": "avatar_video.success",
+            "event_data": {"video_id": video_id, "url": video_url or f"https://example.com/{video_id}.mp4"},
+        }
+    else:
+        payload = {
+            "event_type": "avatar_video.fail",
+            "event_data": {"video_id": video_id, "msg": error or "Render failed"},
+        }
+
+    body = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        SIGNATURE_HEADER: sign_payload(body, secret),
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+# Test function
+if __name__ == "__main__":
+    store = JobStore()
+    receiver = WebhookReceiver(store, secret="local-test-secret", host="127.0.0.1", port=0)
+    receiver.start()
+
+    code = send_test_callback(receiver.url, "test_video", "local-test-secret")
+    print(f"Callback answered {code}, stored status: {store.get('test_video')}")
+
+    code = send_test_callback(receiver.url, "test_video_2", "wrong-secret")
+    print(f"Bad signature answered {code}")
+    receiver.stop()